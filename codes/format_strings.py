@@ -6,9 +6,12 @@ f332 = " {:4d}{:2d} {:12.5f} {:12.5f}\n"
 f333 = " {:12.5f} {:12.5f} {:12.5f}\n"
 f443 = " {:4d} {:12.5f} {:12.5f} {:12.5f}\n"
 f444 = " {:12.5f} {:12.5f} {:12.5f} {:12.5f}\n"
+f445 = " {:8d} {:6d} {:6d}\n"
 f551 = "  {:1d} {:12.5f} {:12.5f} {:12.5f} {:12.5f}\n"
 f555 = " {:12.5f} {:12.5f} {:12.5f} {:12.5f} {:12.5f}\n"
 f556 = " {:4d} {:12.5f} {:12.5f} {:12.5f} {:12.5f}\n"
+f557 = " {:12.5f}"
+f558 = " {:12.5f} {:12.5f}"
 f666 = " {:12.5f} {:12.5f} {:12.5f} {:12.5f} {:12.5f} {:12.5f}\n"
 f777 = " {:12.5f} {:12.5f} {:12.5f} {:12.5f} {:12.5f} {:12.5f} {:12.5f}\n"
 f101 = " f    = {:8.2f} n     = {:5d} a   = {:5.4f}\n"
@@ -20,12 +23,25 @@ f1104= "dz = {:8.2f} tcor= {:5.3f} scor= {:8.2f}"
 f105 = " w_0  = {:8.2f} nalp = {:5d}\n"
 f106 = " delx = {:8.2f} nalp = {:5d}\n"
 f107 = " delx = {:8.2f} nheat = {:5d}\n"
+f108 = " nch  = {:8d} nwork = {:5d}\n"
+f109 = " delx = {:8.4f} acc   = {:8.4f}\n"
+f110 = " delxp= {:8.4f}\n"
+f111 = " dtmd = {:8.4f} nmd   = {:5d} acc = {:8.4f}\n"
+f112 = " npair= {:8d} acc   = {:8.6f}\n"
+f113 = " nf   = {:8d} fmin  = {:5.2f} nsw = {:5d}\n"
+f114 = " {:5s}: every {:6d} sweeps{}\n"
+f115 = " tau  = {:8.2f} (action, equilibration sweeps)\n"
+f116 = " tau_int {:5s}= {:10.3f} ± {:8.3f} W = {:5d} N/2tau = {:10.1f}{}\n"
+f117 = " tau_int in sweeps, {:d} measurements\n"
+f118 = " nwarm= {:8d} nwork = {:5d}\n"
 f201 = " f    = {:8.2f} n    = {:8d} a   = {:8.4f}\n"
 f202 = " nmc  = {:8d} neq  = {:8d}\n"
 f203 = " np   = {:8d} nc   = {:8d}\n"
 f204 = " delx = {:8.2f} icold= {:8d} ncool= {:8d}\n"
 f205 = " S_0  = {:8.2f} dE   = {:8.2f} dE*L = {:8.2f}\n"
 f206 = " S_0  = {:8.2f} dE_2 = {:8.2f} dE2*L={:8.2f}\n"
+f207 = " nclog= {:8d} dsin = {:8.3f}\n"
+f208 = " ntsm = {:8d} htop = {:8.3f}\n"
 f301 = " f = {:8.5f} s0(num) = {:8.2f} s(ana) = {:8.2f}\n"
 f601 = " f   = {:12.4f} ndim = {:5d}\n"
 f602 = " t_m = {:12.4f} ntau = {:5d}\n"
@@ -52,6 +68,10 @@ f817 = " seff = {:12.5f} ins = {:12.5f} vac = {:12.5f}\n"
 f818 = " seff = {:12.5f} ± {:12.5f}\n"
 f819 = " dens = {:12.5f} gaus = {:12.5f}\n"
 f820 = " dens = {:12.5f} ± {:12.5f}\n"
+f821 = " f      = {:12.5f} swap = {:12.5f}\n"
+f822 = " nin    = {:12.5f} ± {:12.5f}\n"
+f823 = " ncool  = {:12.5f} ± {:12.5f}\n"
+f824 = " ntop   = {:12.5f} ± {:12.5f}\n"
 f901 = "  n       E_n         |c_n|^2\n"
 f902 = "         x          psi(x)     psi(x)^2\n"
 f903 = "         t         x(0)x(t)     1 state     3 states\n"
@@ -62,6 +82,7 @@ f907 = "         t      x^2(0)x^2(t)    1 state     3 states\n"
 f908 = "   t            x^2(0)x^2(t)\n"
 f909 = "         t      x^3(0)x^3(t)    1 state     3 states\n"
 f910 = "   t            x^3(0)x^3(t)\n"
+f911 = "       f          e_0        de_0       <x^2>       d<x^2>       nin        dnin\n"
 f9901 = " stot   = {:12.5f} ± {:12.5f}\n"
 f9902 = " s/nin  = {:12.5f} ± {:12.5f}\n"
 f9903 = " s0     = {:12.5f}\n"
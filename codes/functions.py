@@ -1,4 +1,5 @@
 import numpy as np
+import format_strings as fs
 #------------------------------------------------------------------------------
 #   Definition of functions needed
 #------------------------------------------------------------------------------
@@ -21,6 +22,256 @@ def histogramarray(a, amin, st, m, hist):
     hist[int(j)-1] += 1
     return
 
+#------------------------------------------------------------------------------
+#     same as histogramarray for all values in the array a (any shape)
+#------------------------------------------------------------------------------
+def histogramarrays(a, amin, st, m, hist):
+    j = np.clip((np.asarray(a) - amin)/st + 1.000001, 1, m)
+    hist += np.bincount(j.astype(int).ravel()-1, minlength=m)[:m]
+    return
+
+#------------------------------------------------------------------------------
+#   histogram accumulator
+#------------------------------------------------------------------------------
+#   h = Histogram(amin, st, m) holds the m bins of width st starting at amin.
+#   h.add(a) includes all values of the array a (a configuration, a batch of
+#   configurations or a single number), values outside the range go to the
+#   first or last bin as in histogramarray. Histograms of different replicas
+#   are merged with h1 + h2, h.reset() empties the bins after equilibration
+#   and h.write(file) writes the table (bin position, entries).
+#   Input:
+#       amin    minimum value in histogram
+#       st      bin width
+#       m       number of bins
+#------------------------------------------------------------------------------
+class Histogram:
+    def __init__(self, amin, st, m):
+        self.amin = amin
+        self.st   = st
+        self.m    = m
+        self.hist = np.zeros(m)
+
+    def add(self, a):
+        histogramarrays(a, self.amin, self.st, self.m, self.hist)
+
+    def reset(self):
+        self.hist[:] = 0.0
+
+    def __add__(self, other):
+        h = Histogram(self.amin, self.st, self.m)
+        h.hist = self.hist + other.hist
+        return h
+
+    #--------------------------------------------------------------------------
+    #   write (x_i, h_i), x_i = amin + (i+shift)*st, i.e. shift = 0.5 for the
+    #   centre and 1 for the upper edge of the bin. With norm=True the
+    #   entries are normalized to a probability density.
+    #--------------------------------------------------------------------------
+    def write(self, file, shift=0.5, norm=False):
+        h = self.hist
+        if norm:
+            h = h/sum(h*self.st)
+        for i in range(self.m):
+            xx = self.amin + (i+shift)*self.st
+            file.write(fs.f222.format(xx, h[i]))
+
+#------------------------------------------------------------------------------
+#   accumulator for average and error
+#------------------------------------------------------------------------------
+#   s = Accumulator(shape) holds the number of measurements s.n, the running
+#   average s.mean and the sum of squared deviations s.m2 of a number
+#   (shape ()) or an array of numbers (e.g. shape (n_p,) for a correlation
+#   function). s.add(y) includes one measurement y, s.add(y, axis) all
+#   measurements along the given axes of y (the chains, sources, lattice
+#   sites, ...). Batches are combined with the pairwise update of Chan et
+#   al., one measurement at a time this is Welford's update. Unlike sums of
+#   y and y**2 there is no cancellation in the error, whatever the size of
+#   the average. Accumulators of different replicas (or of a continued run)
+#   are merged with s1 + s2 and s.disp() gives average and error as disp().
+#   Input:
+#       shape   shape of one measurement
+#------------------------------------------------------------------------------
+class Accumulator:
+    def __init__(self, shape=()):
+        self.n    = 0
+        self.mean = np.zeros(shape)
+        self.m2   = np.zeros(shape)
+
+    def add(self, y, axis=None):
+        y = np.asarray(y, dtype=float)
+        if axis is None:
+            self.merge(1, y, 0.0)
+            return
+        ym = np.add.reduce(y, axis=axis, keepdims=True)
+        nb = y.size//ym.size
+        ym = ym/nb
+        d  = y - ym
+        m2 = np.add.reduce(d*d, axis=axis)
+        self.merge(nb, ym.reshape(m2.shape), m2)
+
+    #--------------------------------------------------------------------------
+    #   include nb measurements with average mb and squared deviations m2b
+    #--------------------------------------------------------------------------
+    def merge(self, nb, mb, m2b):
+        if nb == 0:
+            return
+        n         = self.n + nb
+        d         = mb - self.mean
+        self.mean = self.mean + d*(nb/n)
+        self.m2   = self.m2 + m2b + d*d*(self.n*nb/n)
+        self.n    = n
+
+    def reset(self):
+        self.n    = 0
+        self.mean = np.zeros_like(self.mean)
+        self.m2   = np.zeros_like(self.m2)
+
+    def __add__(self, other):
+        s = Accumulator(np.shape(self.mean))
+        s.merge(self.n, self.mean, self.m2)
+        s.merge(other.n, other.mean, other.m2)
+        return s
+
+    def disp(self):
+        if self.n < 1:
+            raise ValueError("Number of measurements must be at least 1")
+        return self.mean, np.sqrt(self.m2)/self.n
+
+#------------------------------------------------------------------------------
+#   accumulator with blocking and jackknife errors for a Monte Carlo series
+#------------------------------------------------------------------------------
+#   b = Blocking(shape) is used like Accumulator, but b.add(y, axis) is one
+#   step of the Markov chain: y is averaged over the given axes (chains,
+#   sources, ...) and included as one measurement. Successive measurements
+#   are correlated, so the error of the average is found by the blocking
+#   method of Flyvbjerg and Petersen without storing the series: level k
+#   accumulates the averages of blocks of 2^k measurements, a block waits
+#   in b.hold[k] until its partner arrives. The error of level k is
+#   sqrt(m2/(n(n-1))) of its n blocks, b.disp() returns the first level
+#   (with at least nmin blocks) where it stops growing beyond the error of
+#   the error, i.e. where the blocks are independent.
+#   For functions of the averages (log derivatives, energies, ...) the
+#   series is also kept in at most nbin bins, two neighbouring bins are
+#   added up when there are more, and b.jackknife(func) returns func of
+#   the averages and its jackknife error. Memory: log2(N) levels and nbin
+#   bins. b1 + b2 merges independent runs (replicas), blocks waiting for
+#   a partner are only counted on the lower levels.
+#   Input:
+#       shape   shape of one measurement
+#       nbin    maximal number of jackknife bins
+#------------------------------------------------------------------------------
+class Blocking:
+    nmin = 16
+
+    def __init__(self, shape=(), nbin=64):
+        self.shape  = np.zeros(shape).shape
+        self.nbin   = nbin
+        self.levels = []
+        self.hold   = []
+        self.bins   = []
+        self.cnts   = []
+        self.blen   = 1
+        self.bsum   = np.zeros(shape)
+        self.bcnt   = 0
+
+    @property
+    def n(self):
+        return self.levels[0].n if self.levels else 0
+
+    @property
+    def mean(self):
+        return self.levels[0].mean if self.levels else np.zeros(self.shape)
+
+    def add(self, y, axis=None):
+        y = np.asarray(y, dtype=float)
+        if axis is not None:
+            y = np.mean(y, axis=axis)
+        self.bsum = self.bsum + y
+        self.bcnt += 1
+        if self.bcnt == self.blen:
+            self.bins.append(self.bsum)
+            self.cnts.append(self.bcnt)
+            self.bsum = np.zeros(self.shape)
+            self.bcnt = 0
+            if len(self.bins) > self.nbin:
+                self.rebin()
+        k = 0
+        while True:
+            if k == len(self.levels):
+                self.levels.append(Accumulator(self.shape))
+                self.hold.append(None)
+            self.levels[k].merge(1, y, 0.0)
+            if self.hold[k] is None:
+                self.hold[k] = y
+                return
+            y = 0.5*(self.hold[k] + y)
+            self.hold[k] = None
+            k += 1
+
+    #--------------------------------------------------------------------------
+    #   add up neighbouring bins until there are at most nbin
+    #--------------------------------------------------------------------------
+    def rebin(self):
+        while len(self.bins) > self.nbin:
+            m = len(self.bins)//2*2
+            self.bins = ([self.bins[j] + self.bins[j+1]
+                          for j in range(0, m, 2)] + self.bins[m:])
+            self.cnts = ([self.cnts[j] + self.cnts[j+1]
+                          for j in range(0, m, 2)] + self.cnts[m:])
+            self.blen *= 2
+
+    def __add__(self, other):
+        b = Blocking(self.shape, self.nbin)
+        nl = max(len(self.levels), len(other.levels))
+        for k in range(nl):
+            s = Accumulator(self.shape)
+            for c in (self, other):
+                if k < len(c.levels):
+                    s = s + c.levels[k]
+            b.levels.append(s)
+            b.hold.append(None)
+        for c in (self, other):
+            b.bins = b.bins + c.bins + ([c.bsum] if c.bcnt > 0 else [])
+            b.cnts = b.cnts + c.cnts + ([c.bcnt] if c.bcnt > 0 else [])
+        b.blen = max(self.blen, other.blen)
+        b.rebin()
+        return b
+
+    #--------------------------------------------------------------------------
+    #   average, error of every blocking level (levels with at least nmin
+    #   blocks) and the error at the plateau
+    #--------------------------------------------------------------------------
+    def errors(self):
+        if self.n < 2:
+            return np.zeros((1,)+self.shape)
+        lev = [s for s in self.levels if s.n >= self.nmin] or self.levels[:1]
+        return np.array([np.sqrt(s.m2/(s.n*(s.n-1))) for s in lev])
+
+    def disp(self):
+        if self.n < 1:
+            raise ValueError("Number of measurements must be at least 1")
+        err = self.errors()
+        nb  = np.array([s.n for s in self.levels[:len(err)]])
+        nb  = nb.reshape((-1,) + (1,)*len(self.shape))
+        de  = err/np.sqrt(2.0*np.maximum(nb-1, 1))
+        up  = np.append(err[1:] > err[:-1] + de[:-1],
+                        np.zeros((1,)+self.shape, dtype=bool), axis=0)
+        k   = np.argmin(up, axis=0)
+        return self.mean, np.take_along_axis(err, k[None], axis=0)[0]
+
+    def jackknife(self, func):
+        sums = self.bins + ([self.bsum] if self.bcnt > 0 else [])
+        cnts = self.cnts + ([self.bcnt] if self.bcnt > 0 else [])
+        tot  = np.sum(sums, axis=0)
+        ntot = np.sum(cnts)
+        av   = func(tot/ntot)
+        if len(sums) < 2:
+            return av, np.zeros_like(av)
+        jk   = np.array([func((tot-s)/(ntot-c)) for s, c in zip(sums, cnts)])
+        nj   = len(jk)
+        err  = np.sqrt((nj-1)/nj*np.sum((jk-np.mean(jk, axis=0))**2, axis=0))
+        return av, err
+
 #------------------------------------------------------------------------------
 #   Estimate average and error from xtot and x2tot
 #------------------------------------------------------------------------------
@@ -42,6 +293,288 @@ def disp(n, xtot, x2tot):
     xerr = np.sqrt(del2)  
     return xav, xerr
 
+#------------------------------------------------------------------------------
+#   integrated autocorrelation time from the autocorrelation function
+#------------------------------------------------------------------------------
+#   tau(W) = 1/2 + sum_(t=1..W) rho(t), rho(t) = Gamma(t)/Gamma(0), is
+#   summed up to the first window W with
+#
+#       g(W) = exp(-W/tau_W) - tau_W/sqrt(W*N) < 0,
+#       tau_W = s/ln((2 tau(W)+1)/(2 tau(W)-1))
+#
+#   (U. Wolff, Comput. Phys. Commun. 156 (2004) 143). The first term of g
+#   is the bias from the neglected tail of rho, the second the statistical
+#   error of the sum, which grows with W. tau gets the bias correction
+#   (1+(2W+1)/N) and the error tau*sqrt((4W+2)/N). Independent
+#   measurements give tau = 1/2.
+#   Input:
+#       gam    Gamma(t), t=0,..,T-1 along axis 0, any further axes are
+#              separate observables
+#       nm     number of measurements N
+#       s      ratio of the exponential decay time to tau (s=1.5)
+#   Output:
+#       tau    integrated autocorrelation time in units of the series step
+#       dtau   statistical error of tau
+#       w      window W, w=T-1: no window found up to T-1, tau is only a
+#              lower bound
+#------------------------------------------------------------------------------
+def window(gam, nm, s=1.5):
+    gam  = np.asarray(gam, dtype=float)
+    nt   = len(gam)
+    if nt < 2:
+        return (np.full(gam.shape[1:], 0.5), np.zeros(gam.shape[1:]),
+                np.zeros(gam.shape[1:], dtype=int))
+    g0   = np.where(gam[0] > 0.0, gam[0], 1.0)
+    rho  = gam[1:]/g0
+    tint = 0.5 + np.cumsum(rho, axis=0)
+    ws   = np.arange(1, nt).reshape((-1,) + (1,)*(gam.ndim-1))
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        tauw = np.where(tint > 0.5,
+                        s/np.log((2.0*tint+1.0)/(2.0*tint-1.0)), 1e-30)
+        g    = np.exp(-ws/tauw) - tauw/np.sqrt(ws*nm)
+    stop = g < 0.0
+    w    = np.where(np.any(stop, axis=0), np.argmax(stop, axis=0)+1, nt-1)
+    tau  = np.take_along_axis(tint, w[None]-1, axis=0)[0]
+    tau  = np.maximum(tau, 0.5)*(1.0 + (2.0*w+1.0)/nm)
+    tau  = np.where(gam[0] > 0.0, tau, 0.5)
+    w    = np.where(gam[0] > 0.0, w, 0)
+    dtau = np.where(w > 0, tau*np.sqrt((4.0*w+2.0)/nm), 0.0)
+    return tau, dtau, w
+
+#------------------------------------------------------------------------------
+#   integrated autocorrelation time of a time series
+#------------------------------------------------------------------------------
+#   Gamma(t) of the whole series is computed by FFT, tau from window().
+#   Input:
+#       y     time series
+#   Output:
+#       tau   integrated autocorrelation time in units of the series step
+#------------------------------------------------------------------------------
+def tauint(y):
+    y  = np.asarray(y, dtype=float)
+    y  = y - np.mean(y)
+    ny = len(y)
+    if ny < 2 or not np.any(y):
+        return 0.5
+    yk  = np.fft.rfft(y, 2*ny)
+    gam = np.fft.irfft(yk*np.conj(yk), 2*ny)[:ny]/np.arange(ny, 0, -1)
+    return float(window(gam[:ny//2], ny)[0])
+
+#------------------------------------------------------------------------------
+#   online integrated autocorrelation time
+#------------------------------------------------------------------------------
+#   acor = Autocorrelation(shape, tmax) collects the sums
+#
+#       sum_i y_i y_(i+t),  sum_i y_i,  sum_i y_(i+t),  number of pairs
+#
+#   for t=0,..,tmax-1 while the run goes on, acor.add(y) costs O(tmax) and
+#   only the last tmax measurements are kept. acor.tau() gives tau_int,
+#   its error and the window for every component of y (see window()), and
+#   acor.nindep() the number of independent measurements N/(2 tau_int),
+#   which tells how many sweeps a run needs and how far apart the
+#   measurements can be. Replicas are merged with +, pairs are only
+#   formed inside a replica.
+#   Input:
+#       shape  shape of one measurement
+#       tmax   largest separation t (in measurements), tau_int has to be
+#              well below tmax/6 to be found
+#------------------------------------------------------------------------------
+class Autocorrelation:
+    def __init__(self, shape=(), tmax=200):
+        shape     = np.zeros(shape).shape
+        self.tmax = tmax
+        self.last = np.zeros((2*tmax,) + shape)
+        self.pos  = 0
+        self.nl   = 0
+        self.yy   = np.zeros((tmax,) + shape)
+        self.y0   = np.zeros((tmax,) + shape)
+        self.y1   = np.zeros((tmax,) + shape)
+        self.npr  = np.zeros(tmax)
+
+    @property
+    def n(self):
+        return int(self.npr[0])
+
+    #--------------------------------------------------------------------------
+    #   add one measurement, y is averaged over axis (chains, ...) first.
+    #   The last measurements are stored twice in a ring of length 2*tmax,
+    #   last[pos:pos+tmax] are the tmax newest ones, the newest first.
+    #--------------------------------------------------------------------------
+    def add(self, y, axis=None):
+        y = np.asarray(y, dtype=float)
+        if axis is not None:
+            y = np.mean(y, axis=axis)
+        self.pos = (self.pos-1) % self.tmax
+        self.last[self.pos] = self.last[self.pos+self.tmax] = y
+        self.nl  = min(self.nl+1, self.tmax)
+        k    = self.nl
+        yl   = self.last[self.pos:self.pos+k]
+        self.yy[:k]  += y*yl
+        self.y0[:k]  += yl
+        self.y1[:k]  += y
+        self.npr[:k] += 1
+
+    def __add__(self, other):
+        res     = Autocorrelation(self.yy.shape[1:], self.tmax)
+        res.yy  = self.yy + other.yy
+        res.y0  = self.y0 + other.y0
+        res.y1  = self.y1 + other.y1
+        res.npr = self.npr + other.npr
+        return res
+
+    #--------------------------------------------------------------------------
+    #   Gamma(t), the mean of all measurements is subtracted
+    #--------------------------------------------------------------------------
+    def gamma(self):
+        nt  = np.count_nonzero(self.npr)
+        if nt == 0:
+            raise ValueError("Number of measurements must be at least 1")
+        npr = self.npr[:nt].reshape((-1,) + (1,)*(self.yy.ndim-1))
+        ym  = self.y1[0]/self.npr[0]
+        return (self.yy[:nt] - ym*(self.y0[:nt] + self.y1[:nt]))/npr + ym**2
+
+    def tau(self):
+        return window(self.gamma(), self.n)
+
+    def nindep(self):
+        return self.n/(2.0*self.tau()[0])
+
+    #--------------------------------------------------------------------------
+    #   True once tau_int of every component is found inside tmax (window
+    #   below tmax-1) and the run has at least nind independent measurements
+    #--------------------------------------------------------------------------
+    def enough(self, nind):
+        if np.count_nonzero(self.npr) < self.tmax:
+            return False
+        tau, dtau, w = self.tau()
+        return bool(np.all(w < self.tmax-1)
+                    and np.all(self.n/(2.0*tau) >= nind))
+
+    #--------------------------------------------------------------------------
+    #   write tau_int, its error, the window and N/(2 tau_int) of every
+    #   observable, names are the labels of the components
+    #--------------------------------------------------------------------------
+    def write(self, file, names):
+        tau, dtau, w = self.tau()
+        nt = np.count_nonzero(self.npr)
+        for k, name in enumerate(names):
+            flag = ' (lower bound)' if nt > 1 and w[k] == nt-1 else ''
+            file.write(fs.f116.format(name, tau[k], dtau[k], w[k],
+                                      self.n/(2.0*tau[k]), flag))
+
+#------------------------------------------------------------------------------
+#   measurement schedule
+#------------------------------------------------------------------------------
+#   sched = Schedule(every) with every = {'traj': 1, 'cor': 5, ...}, the
+#   number of sweeps between two measurements of each observable, and
+#   sched.due(name, i) tells whether it is measured in sweep i. Intervals
+#   can be overwritten with strings 'name=k' (--every on the command line).
+#   Observables with interval 0 get it from the equilibration: the action
+#   of every sweep is given to sched.record(s), sched.tune() sets the
+#   interval to 2*tau_int of the second half of this series (measurements
+#   further apart are practically independent). Until then they are
+#   measured every sweep.
+#------------------------------------------------------------------------------
+class Schedule:
+    def __init__(self, every, override=()):
+        self.every = dict(every)
+        for item in override:
+            name, k = item.split('=')
+            if name not in self.every:
+                raise ValueError('--every {}: no observable {}, use one of {}'
+                                 .format(item, name, ', '.join(self.every)))
+            self.every[name] = int(k)
+        self.auto   = [name for name, k in self.every.items() if k == 0]
+        self.series = []
+        self.tau    = 0.0
+
+    def due(self, name, i):
+        k = self.every[name]
+        return k <= 1 or i % k == 0
+
+    def record(self, s):
+        if self.auto:
+            self.series.append(s)
+
+    def tune(self):
+        if self.auto:
+            self.tau = tauint(self.series[len(self.series)//2:])
+            for name in self.auto:
+                self.every[name] = max(1, int(2.0*self.tau))
+            self.series = []
+
+    #--------------------------------------------------------------------------
+    #   write the intervals (and tau_int if some were set automatically)
+    #--------------------------------------------------------------------------
+    def write(self, file):
+        for name, k in self.every.items():
+            auto = ' (auto)' if name in self.auto else ''
+            file.write(fs.f114.format(name, k, auto))
+        if self.auto:
+            file.write(fs.f115.format(self.tau))
+
+#------------------------------------------------------------------------------
+#   correlation function averaged over all sources of a periodic path
+#------------------------------------------------------------------------------
+#   Input:
+#       y    values on the ring of lattice points (last axis, any number of
+#            leading axes, e.g. x, x**2, x**3 of several chains)
+#       n_p  number of points of the correlation function
+#   Output:
+#       cor  cor[...,ip] = 1/N sum_j y_j*y_(j+ip), ip=0,..,n_p-1, with j+ip
+#            taken modulo the length N of the ring, computed by FFT
+#------------------------------------------------------------------------------
+def allsource(y, n_p):
+    nr = y.shape[-1]
+    yk = np.fft.rfft(y, axis=-1)
+    return np.fft.irfft(yk*np.conj(yk), nr, axis=-1)[..., :n_p]/nr
+
+#------------------------------------------------------------------------------
+#   matrix of cross correlation functions averaged over all sources
+#------------------------------------------------------------------------------
+#   Input:
+#       y    operators on the ring of lattice points, y[i,...,j] (operator
+#            i, any further axes, e.g. chains, lattice point j last)
+#       n_p  number of points of the correlation functions
+#   Output:
+#       cor  cor[i,k,...,ip] = 1/N sum_j y_ij*y_k(j+ip), ip=0,..,n_p-1,
+#            j+ip modulo the length N of the ring, computed by FFT
+#------------------------------------------------------------------------------
+def crosssource(y, n_p):
+    nr = y.shape[-1]
+    yk = np.fft.rfft(y, axis=-1)
+    ck = np.conj(yk)[:,None]*yk[None,:]
+    return np.fft.irfft(ck, nr, axis=-1)[..., :n_p]/nr
+
+#------------------------------------------------------------------------------
+#   energies from a correlator matrix, generalized eigenvalue problem
+#------------------------------------------------------------------------------
+#   For every t the problem C(t) v = lambda(t,t0) C(t0) v is solved, with
+#   C(t0)^(-1/2) from the eigenvectors of C(t0). For t>t0 the eigenvalues
+#   (largest first) behave like exp(-(E_n-E_0)(t-t0)), the contributions
+#   of the other states are suppressed like exp(-(E_m-E_n)t) instead of
+#   exp(-(E_m-E_0)t) for a single correlator, so the effective energies
+#   reach their plateau much earlier than the log derivatives of the
+#   diagonal correlators. Directions in which C(t0) is not positive
+#   (operators which are almost linearly dependent, noise) are left out,
+#   their energies are nan.
+#   Input:
+#       cmat   connected correlators cmat[i,k,ip], ip=0,..,n_p-1
+#       it0    reference time t0/a
+#       a      lattice spacing
+#   Output:
+#       de     effective energies log(lambda_n(t)/lambda_n(t+a))/a, E_n-E_0
+#              for n=1,..,number of operators, de[ip,n-1], ip=0,..,n_p-2
+#------------------------------------------------------------------------------
+def gevp(cmat, it0, a):
+    c    = np.moveaxis(0.5*(cmat + np.swapaxes(cmat, 0, 1)), -1, 0)
+    w, v = np.linalg.eigh(c[it0])
+    keep = w > 1e-10*w[-1]
+    p    = np.where(keep, v/np.sqrt(np.where(keep, w, 1.0)), 0.0)
+    lam  = np.linalg.eigvalsh(p.T @ c @ p)[:, ::-1]
+    lam  = np.where(lam > 0.0, lam, np.nan)
+    return np.log(lam[:-1]/lam[1:])/a
+
 #------------------------------------------------------------------------------
 #   Compute rescaled Hermite polynomials H_i(x)/2^i/sqrt(i!) for i = 0 to n
 #------------------------------------------------------------------------------
@@ -79,6 +612,54 @@ def psiosc(m, w, n, x, psi):
         psi[i] = xnorm * h[i] * np.exp(-m * w / 2.0 * x ** 2)
     return psi
 
+#------------------------------------------------------------------------------
+#   action, kinetic and potential energy, virial and moments of x in one pass
+#------------------------------------------------------------------------------
+#   The links x_j -> x_(j+1), j=0,..,m-1, and the sites j=0,..,m-1 of the
+#   path x[...,0..m] (last axis, any number of leading axes, e.g. chains)
+#   are summed with numpy. The potential is the one of the adiabatic
+#   switching codes, V = alpha*(V1-V0)+V0 with V1 = (x^2-f^2)^2 and the
+#   reference V0 = 1/2 w (x-x0)^2 + vi (w, x0, vi numbers or arrays over
+#   the sites, as in lattice.potential). The default alpha=1 gives the
+#   anharmonic oscillator.
+#   Input:
+#       x     field configuration, x[...,0..m]
+#       f     minimum of anharmonic oscillator potential
+#       a     lattice spacing
+#       alpha coupling constant of the switching codes
+#       w     reference oscillator, V0 = 1/2 w (x-x0)^2 + vi
+#   Output:
+#       stot  total action
+#       ttot  total kinetic term
+#       vtot  total potential
+#       tvtot total virial term 1/2 x V'
+#       ptot  a*sum (V1-V0), the derivative of the action by alpha
+#       xm    sum x, x^2, x^4, x^8 over the sites, xm[0..3]
+#------------------------------------------------------------------------------
+def observables(x, f, a, alpha=1.0, w=0.0, x0=0.0, vi=0.0):
+    xs    = x[...,:-1]
+    x2    = xs**2
+    xp    = np.diff(x, axis=-1)/a
+    ttot  = a*np.sum(1.0/4.0*xp**2, axis=-1)
+    v1    = (x2-f**2)**2
+    v0    = 1.0/2.0*w*(xs-x0)**2 + vi
+    vtot  = a*np.sum(alpha*(v1-v0) + v0, axis=-1)
+    tvtot = a*np.sum(alpha*2.0*x2*(x2-f**2)
+                     + (1.0-alpha)*1.0/2.0*w*xs*(xs-x0), axis=-1)
+    ptot  = a*np.sum(v1-v0, axis=-1)
+    stot  = ttot + vtot
+    return stot, ttot, vtot, tvtot, ptot, moments(xs, x2)
+
+#------------------------------------------------------------------------------
+#   sums of x, x^2, x^4, x^8 over the sites (last axis) of xs
+#------------------------------------------------------------------------------
+def moments(xs, x2=None):
+    if x2 is None:
+        x2 = xs**2
+    x4 = x2**2
+    return np.stack((np.sum(xs, axis=-1), np.sum(x2, axis=-1),
+                     np.sum(x4, axis=-1), np.sum(x4**2, axis=-1)))
+
 #------------------------------------------------------------------------------
 #   discretized action for configuration x(n)                           
 #------------------------------------------------------------------------------
@@ -93,55 +674,11 @@ def psiosc(m, w, n, x, psi):
 #       vtot total potential
 #------------------------------------------------------------------------------
 def act(f, a, n, x):
-    stot = 0.0
-    ttot = 0.0
-    vtot = 0.0
-    for j in range(n):
-        xp = (x[j+1] - x[j]) / a
-        t = 1.0 / 4.0 * xp**2
-        v = (x[j]**2 - f**2)**2
-        s = a * (t + v)
-        ttot += a * t
-        vtot += a * v
-        stot += s
-    return stot, ttot, vtot
-
-#------------------------------------------------------------------------------
-#   return number and location of (anti) instantons                    
-#------------------------------------------------------------------------------
-#   Input:
-#       f  minimum of anharmonic oscillator potential
-#       a  lattice spacing
-#       n  number of lattice points
-#       x  field configuration
-#       xi instanton location
-#       xa anti-instanton location
-#       z  cooled configuration
-#   Output:
-#       ni inatanton location
-#       na anti-instanton location
-#------------------------------------------------------------------------------
-def inst(f, a, n, x, xi, xa, z):
-    ni = 0
-    na = 0
-    nin= 0
-    ix = int(np.sign(x[0]))
-    for i in range(1,n):
-        tau = a * i
-        ixp = int(np.sign(x[i]))
-        if ixp > ix:
-            ni  += 1
-            nin += 1
-            xi[ni] = tau
-            z[nin] = tau
-                     
-        elif ixp < ix:
-            na  += 1
-            nin += 1 
-            xa[na] = tau
-            z[nin] = tau                     
-        ix = ixp
-    return ni, na
+    xp   = x[1:n+1] - x[:n]
+    ttot = np.dot(xp, xp)/(4.0*a)
+    v    = x[:n]*x[:n] - f*f
+    vtot = a*np.dot(v, v)
+    return ttot + vtot, ttot, vtot
 
 #------------------------------------------------------------------------------
 #   discretized log derivatie                                              
@@ -173,6 +710,23 @@ def dle(xcor1, xcor2, xcor1e, xcor2e):
     dle  = np.sqrt(dle2)
     return dle
 
+#------------------------------------------------------------------------------
+#   log derivatives of the <x^k(0)x^k(t)> correlators, k=1,2,3
+#------------------------------------------------------------------------------
+#   The x^2 correlator is taken minus its value at the largest t (the
+#   disconnected part <x^2>^2). Applied to the averages in the jackknife
+#   bins of a Blocking accumulator (Blocking.jackknife) it gives errors
+#   which include the correlations between neighbouring t.
+#   Input:
+#       c      correlators c[k-1,ip], ip=0,..,n_p-1
+#       a      lattice spacing
+#   Output:
+#       dlog   log derivatives dl(c[k-1,ip], c[k-1,ip+1], a), ip=0,..,n_p-2
+#------------------------------------------------------------------------------
+def dlogs(c, a):
+    c = c - np.array([0.0, 1.0, 0.0])[:,None]*c[:,-1:]
+    return dl(c[:,:-1], c[:,1:], a)
+
 #------------------------------------------------------------------------------
 #   sum ansatz path                                                  
 #------------------------------------------------------------------------------
@@ -1,8 +1,9 @@
 import format_strings as fs
 import numpy as np
-import random
 from tqdm import tqdm
 import functions as fn
+import topology as top
+import parallel as par
 import re
 #------------------------------------------------------------------------------
 #     interacting instanton calculation in quantum mechanics                    
@@ -22,10 +23,21 @@ import re
 #   n_p      number of points on which the correlation functions are measured: 
 #           <x_i x_(i+1)>,...,<x_i x_(i+np)> (np=20)
 #   nc      number of correlator measurements in a single configuration (nc=5)                              
+#   icor    icor=0: nc random sources per configuration; icor=1: the
+#           correlators are averaged over all sources of the periodic
+#           path at once, computed by FFT (functions.allsource)
 #   kp      number of sweeps between writeout of complete configuration
 #   tcore   range of hard interaction (tcore=0.3)
 #   acore   strenght of hard core interaction (acore=3.0)
 #   dz      average position update (dz=1)
+#   ntau    largest separation (sweeps) for the integrated autocorrelation
+#           times of S, x^2 and the number of zero crossings of the path,
+#           measured while the run goes on (functions.Autocorrelation)
+#   nindep  nindep>0: a replica stops before nmc once S, x^2 and the zero
+#           crossings each have nindep independent measurements N/(2 tau_int)
+#           in it
+#   --workers N  (command line) run N independent replicas in parallel
+#           processes and add up their results, see parallel.py
 #------------------------------------------------------------------------------
 file16 = open('Data/iilm/iilm.dat',       'w')
 file17 = open('Data/iilm/config.dat',     'w')
@@ -51,6 +63,7 @@ a      = re.search(r'a\s*=\s*(\d+\.\d+)', contents).group(1)
 neq    = re.search(r'neq\s*=\s*(\d+)', contents).group(1)
 nmc    = re.search(r'nmc\s*=\s*(\d+)', contents).group(1)
 nc     = re.search(r'nc\s*=\s*(\d+)', contents).group(1)
+icor   = re.search(r'icor\s*=\s*(\d+)', contents).group(1)
 n_p    = re.search(r'n_p\s*=\s*(\d+)', contents).group(1)
 kp     = re.search(r'kp\s*=\s*(\d+)', contents).group(1)
 nin    = re.search(r'nin\s*=\s*(\d+)', contents).group(1)
@@ -58,6 +71,8 @@ dz     = re.search(r'dz\s*=\s*(\d+\.\d+)', contents).group(1)
 rcore  = re.search(r'rcore\s*=\s*(\d+\.\d+)', contents).group(1)
 acore  = re.search(r'acore\s*=\s*(\d+\.\d+)', contents).group(1)
 seed   = re.search(r'seed\s*=\s*(\d+)', contents).group(1)
+ntau   = re.search(r'ntau\s*=\s*(\d+)', contents).group(1)
+nindep = re.search(r'nindep\s*=\s*(\d+)', contents).group(1)
 
 # convert the values to integers
 f      = float(f)    #separation of wells f (f=1.4)
@@ -68,16 +83,19 @@ neq    = int(neq)    #equilibration sweeps
 n_p    = int(n_p)    #number of points in correlator
 kp     = int(kp)     #number of sweeps between cooling
 nc     = int(nc)     #number of measurements per configuration
+icor   = int(icor)   #random sources/all sources (0,1)
 nin    = int(nin)    #number of instantons
 dz     = float(dz)   #position update dz
 rcore  = float(rcore)#hard core radius rcore (tcore=rcore/f) (0.3)
 acore  = float(acore)#hard core strength A (score=A*s0) (3.0)
 seed   = int(seed)   #seed to generate random numbers
+ntau   = int(ntau)   #largest separation for tau_int
+nindep = int(nindep) #independent measurements wanted (0: nmc sweeps)
+nworkers = par.arguments().workers #replicas in parallel (--workers)
 
 #------------------------------------------------------------------------------
 #   echo input parameters                                                  
 #------------------------------------------------------------------------------
-random.seed(seed)
 pi    = np.pi
 tcore = rcore/f
 tmax  = n*a
@@ -106,50 +124,11 @@ stxhist   = 3.0*f/float(nxhist)
 nzhist    = 40
 stzhist   = 4.01/float(nzhist)
 
-#------------------------------------------------------------------------------
-#   initialize                                                  
-#------------------------------------------------------------------------------
-nconf = 0
-ncor  = 0
-nacc  = 0
-nhit  = 0
-
-stot_sum  = 0.0
-stot2_sum = 0.0
-vtot_sum  = 0.0
-vtot2_sum = 0.0
-ttot_sum  = 0.0
-ttot2_sum = 0.0
-tvir_sum  = 0.0
-tvir2_sum = 0.0
-x_sum     = 0.0
-x2_sum    = 0.0
-x4_sum    = 0.0
-x8_sum    = 0.0
-
-x          = np.zeros(n+1)
-z          = np.zeros(nin+1)
-zstore     = np.zeros(n)    
-xcor_av    = np.zeros(n_p)
-xcor_er    = np.zeros(n_p)
-x2cor_av   = np.zeros(n_p)
-x2cor_er   = np.zeros(n_p)
-x3cor_av   = np.zeros(n_p)
-x3cor_er   = np.zeros(n_p)
-x2sub_av   = np.zeros(n_p)
-x2sub_er   = np.zeros(n_p)       
-xcor_sum   = np.zeros(n_p)
-xcor2_sum  = np.zeros(n_p)
-x2cor_sum  = np.zeros(n_p)
-x2cor2_sum = np.zeros(n_p)
-x3cor_sum  = np.zeros(n_p)
-x3cor2_sum = np.zeros(n_p)     
-ix         = np.zeros(nxhist)
-iz         = np.zeros(nzhist)
-
 #------------------------------------------------------------------------------
 #   plot S_IA                                                              
 #------------------------------------------------------------------------------
+x  = np.zeros(n+1)
+z  = np.zeros(nin+1)
 ni = n//4
 for na in range(ni, ni*2+1):
     z[0] = ni*a
@@ -161,164 +140,164 @@ for na in range(ni, ni*2+1):
     file31.write(fs.f222.format((na-ni)*a, stot/s0-2.0))
 
 #------------------------------------------------------------------------------
-#   setup and intial action                                                
+#   one replica of the simulation, returns the accumulators
 #------------------------------------------------------------------------------
-for i in range(nin):
-    z[i] = random.random()*tmax
-z = np.sort(z)
-fn.xconf(n, x, nin, z, f, a)
-stot, ttot, vtot = fn.act(f, a, n, x)
-shc   = fn.sshort(z, nin, tcore, score, tmax)
-stot += shc
+def simulate(ireplica, seed):
+    #--------------------------------------------------------------------------
+    #   initialize                                                  
+    #--------------------------------------------------------------------------
+    rng   = par.stream(seed, ireplica)
+    nacc  = 0
+    nhit  = 0
+
+    #   stot, vtot, ttot; x, x^2, x^4; x, x^2, x^3 correlators
+    act_acc = fn.Blocking(3)
+    xm_acc  = fn.Blocking(3)
+    cor_acc = fn.Blocking((3, n_p))
+
+    #   tau_int of stot, x^2, number of zero crossings
+    acor    = fn.Autocorrelation(3, ntau)
+
+    x          = np.zeros(n+1)
+    z          = np.zeros(nin+1)
+    zstore     = np.zeros(n)    
+    ix         = fn.Histogram(xhist_min, stxhist, nxhist)
+    iz         = fn.Histogram(0.0, stzhist, nzhist)
 
-#------------------------------------------------------------------------------
-#   loop over configs                                                      
-#------------------------------------------------------------------------------
-for i in tqdm(range(nmc)):
-    nconf += 1
-    if i == neq :
-        ncor       = 0
-        nconf      = 0
-        stot_sum   = 0.0
-        stot2_sum  = 0.0
-        vtot_sum   = 0.0
-        vtot2_sum  = 0.0
-        ttot_sum   = 0.0
-        ttot2_sum  = 0.0
-        tvir_sum   = 0.0
-        tvir2_sum  = 0.0
-        x_sum      = 0.0
-        x2_sum     = 0.0
-        x4_sum     = 0.0
-        x8_sum     = 0.0
-        xcor_sum   = np.zeros(n_p)
-        xcor2_sum  = np.zeros(n_p)
-        x2cor_sum  = np.zeros(n_p)
-        x2cor2_sum = np.zeros(n_p)
-        x3cor_sum  = np.zeros(n_p)
-        x3cor2_sum = np.zeros(n_p)
-        ix         = np.zeros(nxhist)
-        iz         = np.zeros(nzhist)
     #--------------------------------------------------------------------------
-    #   generate new configuration: loop over instantons                       
+    #   setup and intial action                                                
     #--------------------------------------------------------------------------
-    for iin in range(nin):
-        nhit  += 1
-        sold   = stot 
-        zstore = np.copy(z)
-        zold   = z[iin]
-        znew   = zold + (random.random()-0.5)*dz
-        if znew > tmax:
-            znew -= tmax
-        if znew < -tmax:
-            znew += tmax
-        z[iin] = znew
-        z      = np.sort(z)
-        
+    z[:nin] = rng.random(nin)*tmax
+    z = np.sort(z)
+    fn.xconf(n, x, nin, z, f, a)
+    stot, ttot, vtot = fn.act(f, a, n, x)
+    shc   = fn.sshort(z, nin, tcore, score, tmax)
+    stot += shc
+
+    #--------------------------------------------------------------------------
+    #   loop over configs                                                      
+    #--------------------------------------------------------------------------
+    for i in tqdm(range(nmc), disable=ireplica>0):
         #----------------------------------------------------------------------
-        #   calculate new action
+        #   generate new configuration: loop over instantons                       
         #----------------------------------------------------------------------
-        fn.xconf(n,x,nin,z, f, a)
-        snew, tnew, vnew = fn.act(f, a, n, x)
-        shc = fn.sshort(z, nin, tcore, score, tmax)
-        snew += shc
+        dzs = (rng.random(nin)-0.5)*dz
+        rs  = rng.random(nin)
+        for iin in range(nin):
+            nhit  += 1
+            sold   = stot 
+            zstore = np.copy(z)
+            zold   = z[iin]
+            znew   = zold + dzs[iin]
+            if znew > tmax:
+                znew -= tmax
+            if znew < -tmax:
+                znew += tmax
+            z[iin] = znew
+            z      = np.sort(z)
+        
+            #------------------------------------------------------------------
+            #   calculate new action
+            #------------------------------------------------------------------
+            fn.xconf(n,x,nin,z, f, a)
+            snew, tnew, vnew = fn.act(f, a, n, x)
+            shc = fn.sshort(z, nin, tcore, score, tmax)
+            snew += shc
         
+            #------------------------------------------------------------------
+            #   accept with probability exp(-delta S)                                  
+            #------------------------------------------------------------------
+            dels = snew-sold  
+            if np.exp(-dels) > rs[iin] :
+                nacc += 1
+                stot = snew
+            else:
+                z = np.copy(zstore)
+            if i < 400 and ireplica == 0:
+                for ipr in range(min(10,len(z))):
+                    file23.write(f'{z[ipr]:.4f}')
+                    file23.write(' ')
+                file23.write('\n')
+            
         #----------------------------------------------------------------------
-        #   accept with probability exp(-delta S)                                  
+        #   action etc.                                                            
         #----------------------------------------------------------------------
-        dels = snew-sold  
-        if np.exp(-dels) > random.random() :
-            nacc += 1
-            stot = snew
-        else:
-            z = np.copy(zstore)
-        if i < 400:
-            for ipr in range(min(10,len(z))):
-                file23.write(f'{z[ipr]:.4f}')
-                file23.write(' ')
-            file23.write('\n')
-            
-    #--------------------------------------------------------------------------
-    #   new configuration: instanton distribution                              
-    #--------------------------------------------------------------------------
-    for ii in range(0, nin, 2):
-        if ii == 0:
-            zm = z[nin] - tmax
-        else:
-            zm = z[ii-1]
-        z0  = z[ii]
-        zp  = z[ii+1]
-        zia = min(zp-z0, z0-zm)
-        fn.histogramarray( zia, 0.0, stzhist, nzhist, iz)
+        stot = snew
+        ttot = tnew
+        vtot = vnew
         
-    #--------------------------------------------------------------------------
-    #   action etc.                                                            
-    #--------------------------------------------------------------------------
-    stot = snew
-    ttot = tnew
-    vtot = vnew
+        if ireplica == 0:
+            file18.write(fs.f555.format(i,stot,ttot,vtot,stot/(nin*s0)))
+        if i % kp == 0 and ireplica == 0:
+            file17.write('configuration: ')
+            file17.write(str(i))
+            file17.write('\n')
+            for k in range(n):
+                file17.write(fs.f222.format(k*a,x[k]))
         
-    file18.write(fs.f555.format(i,stot,ttot,vtot,stot/(nin*s0)))
-    if i % kp == 0:
-        file17.write('configuration: ')
-        file17.write(str(i))
-        file17.write('\n')
-        for k in range(n):
-            file17.write(fs.f222.format(k*a,x[k]))
+        #----------------------------------------------------------------------
+        #   include in sample, from the end of the equilibration on
+        #----------------------------------------------------------------------
+        if i < neq:
+            continue
+        act_acc.add([stot, vtot, ttot])
+        ix.add(x[:n])
+        xm_acc.add(np.stack((x[:n], x[:n]**2, x[:n]**4)), 1)
+        ncross = top.count(x[:n])
+        acor.add([stot, np.mean(x[:n]**2), ncross])
         
-    #--------------------------------------------------------------------------
-    #   include in sample                                                      
-    #--------------------------------------------------------------------------
-    stot_sum  += stot
-    stot2_sum += stot**2
-    vtot_sum  += vtot
-    vtot2_sum += vtot**2
-    ttot_sum  += ttot
-    ttot2_sum += ttot**2
-    for k in range(n):
-        fn.histogramarray(x[k],xhist_min,stxhist,nxhist,ix)
-        x_sum  += x[k]
-        x2_sum += x[k]**2
-        x4_sum += x[k]**4
-        x8_sum += x[k]**8
+        #----------------------------------------------------------------------
+        #   instanton distribution                              
+        #----------------------------------------------------------------------
+        iz.add(top.separations(z[:nin], tmax))
         
-    #--------------------------------------------------------------------------
-    #   correlation function                                                   
-    #--------------------------------------------------------------------------
-    for ic in range(nc):
-        ncor += 1 
-        ip0  = int( (n-n_p)*random.random() ) 
-        x0   = x[ip0]
-        for ip in range(n_p):
-            x1    = x[ip0+ip]
-            xcor  = x0*x1
-            x2cor = xcor**2
-            x3cor = xcor**3
-            xcor_sum[ip]   += xcor
-            xcor2_sum[ip]  += xcor**2
-            x2cor_sum[ip]  += x2cor
-            x2cor2_sum[ip] += x2cor**2
-            x3cor_sum[ip]  += x3cor
-            x3cor2_sum[ip] += x3cor**2
+        #----------------------------------------------------------------------
+        #   correlation function                                                   
+        #----------------------------------------------------------------------
+        if icor == 1:
+            xr    = x[1:n]
+            xr    = np.stack((xr, xr**2, xr**3))
+            cor_acc.add(fn.allsource(xr, n_p))
+        else:
+            ip0   = rng.integers(0, n-n_p, nc)
+            x1    = x[ip0[:,None] + np.arange(n_p)]
+            xcor  = x1[:,:1]*x1
+            cor_acc.add(np.stack((xcor, xcor**2, xcor**3)), 1)
+
+        #----------------------------------------------------------------------
+        #   enough independent measurements, checked every ntau sweeps
+        #----------------------------------------------------------------------
+        if nindep > 0 and (i-neq) % ntau == ntau-1 and acor.enough(nindep):
+            break
+
+    return nacc, nhit, act_acc, xm_acc, cor_acc, acor, ix, iz
+
+#------------------------------------------------------------------------------
+#   run the replicas and merge their accumulators
+#------------------------------------------------------------------------------
+(nacc, nhit, act_acc, xm_acc, cor_acc, acor, ix, iz) = par.run(simulate, seed,
+                                                               nworkers)
+
 #------------------------------------------------------------------------------
 #   averages                                                               
 #------------------------------------------------------------------------------
-stot_av,stot_err = fn.disp(nconf,stot_sum,stot2_sum)
-vtot_av,vtot_err = fn.disp(nconf,vtot_sum,vtot2_sum)
-ttot_av,ttot_err = fn.disp(nconf,ttot_sum,ttot2_sum)
-x_av,x_err       = fn.disp(nconf*n,x_sum,x2_sum)
-x2_av,x2_err     = fn.disp(nconf*n,x2_sum,x4_sum)
-x4_av,x4_err     = fn.disp(nconf*n,x4_sum,x8_sum)
-for ip in range(n_p): 
-    xcor_av[ip],xcor_er[ip]   = fn.disp(ncor,xcor_sum[ip],xcor2_sum[ip])
-    x2cor_av[ip],x2cor_er[ip] = fn.disp(ncor,x2cor_sum[ip],x2cor2_sum[ip])  
-    x3cor_av[ip],x3cor_er[ip] = fn.disp(ncor,x3cor_sum[ip],x3cor2_sum[ip])     
+
+act_av, act_err = act_acc.disp()
+xm_av, xm_err   = xm_acc.disp()
+cor_av, cor_err = cor_acc.disp()
+
+stot_av, vtot_av, ttot_av     = act_av
+stot_err, vtot_err, ttot_err  = act_err
+x_av, x2_av, x4_av            = xm_av
+x_err, x2_err, x4_err         = xm_err
+xcor_av, x2cor_av, x3cor_av   = cor_av
+xcor_er, x2cor_er, x3cor_er   = cor_err
 v_av  = vtot_av/tmax
 v_err = vtot_err/tmax
 t_av  = ttot_av/tmax
 t_err = ttot_err/tmax
-e_av  = v_av+t_av
-e_err = np.sqrt(v_err**2+t_err**2)
+e_av, e_err   = act_acc.jackknife(lambda s: (s[1]+s[2])/tmax)
+dl_av, dl_er  = cor_acc.jackknife(lambda c: fn.dlogs(c, a))
 
 #------------------------------------------------------------------------------
 #   output                                                                 
@@ -335,6 +314,9 @@ file16.write(fs.f806.format(x_av,x_err))
 file16.write(fs.f807.format(x2_av,x2_err)) 
 file16.write(fs.f808.format(x4_av,x4_err)) 
 file16.write('\n') 
+file16.write(fs.f117.format(acor.n))
+acor.write(file16, ['S', 'x^2', 'nin'])
+file16.write('\n')
       
 #------------------------------------------------------------------------------
 #   correlation function, log derivative                                   
@@ -342,28 +324,17 @@ file16.write('\n')
 file16.write("x correlation function\n")
 file20.write("          tau       x(tau)      dx(tau)         dlog\n")
 for ip in range(n_p-1):
-    dx   = (xcor_av[ip]-xcor_av[ip+1])/xcor_av[ip]/a
-    dxe2 = (xcor_er[ip+1]/xcor_av[ip])**2
-    +(xcor_er[ip]*xcor_av[ip+1]/xcor_av[ip]**2)**2
-    dxe = np.sqrt(dxe2)/a
+    dx, dxe = dl_av[0,ip], dl_er[0,ip]
     file16.write(fs.f555.format(ip*a,xcor_av[ip],xcor_er[ip],dx,dxe)) 
     file20.write(fs.f555.format(ip*a,xcor_av[ip],xcor_er[ip],dx,dxe))        
 
 #------------------------------------------------------------------------------
 #   subtracted x^2 correlation function, log derivative                    
 #------------------------------------------------------------------------------
-xx_sub = x2cor_av[n_p-1]
-xx_er  = x2cor_er[n_p-1]
-for ip in range(n_p):
-    x2sub_av[ip] = x2cor_av[ip]-xx_sub
-    x2sub_er[ip] = np.sqrt(x2cor_er[ip]**2+xx_er**2)
 file16.write("x2 correlation function\n")
 file21.write("          tau      x2(tau)     dx2(tau)         dlog\n")
 for ip in range(n_p-1):
-    dx  = (x2sub_av[ip]-x2sub_av[ip+1])/x2sub_av[ip]/a
-    dxe2= (x2sub_er[ip+1]/x2sub_av[ip])**2
-    +(x2sub_er[ip]*x2sub_av[ip+1]/x2sub_av[ip]**2)**2
-    dxe = np.sqrt(dxe2)/a
+    dx, dxe = dl_av[1,ip], dl_er[1,ip]
     file16.write(fs.f555.format(ip*a,x2cor_av[ip],x2cor_er[ip],dx,dxe)) 
     file21.write(fs.f555.format(ip*a,x2cor_av[ip],x2cor_er[ip],dx,dxe)) 
 
@@ -373,19 +344,14 @@ for ip in range(n_p-1):
 file16.write("x3 correlation function\n")
 file22.write("          tau      x3(tau)     dx3(tau)         dlog\n")
 for ip in range(n_p-1):      
-    dx   = (x3cor_av[ip]-x3cor_av[ip+1])/x3cor_av[ip]/a
-    dxe2 = (x3cor_er[ip+1]/x3cor_av[ip])**2
-    +(x3cor_er[ip]*x3cor_av[ip+1]/x3cor_av[ip]**2)**2
-    dxe = np.sqrt(dxe2)/a
+    dx, dxe = dl_av[2,ip], dl_er[2,ip]
     file16.write(fs.f555.format(ip*a,x3cor_av[ip],x3cor_er[ip],dx,dxe)) 
     file22.write(fs.f555.format(ip*a,x3cor_av[ip],x3cor_er[ip],dx,dxe))  
 
 #------------------------------------------------------------------------------
 #   histograms                                                             
 #------------------------------------------------------------------------------
-for i in range(nzhist):
-    xx = (i+0.5)*stzhist
-    file30.write(fs.f222.format(xx,iz[i]))      
+iz.write(file30)
 
 #------------------------------------------------------------------------------
 #------------------------------------------------------------------------------
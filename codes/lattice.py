@@ -0,0 +1,538 @@
+import numpy as np
+from math import log
+#------------------------------------------------------------------------------
+#   Metropolis kernels shared by qm.py, qmcool.py, qmswitch.py, qmidens.py
+#------------------------------------------------------------------------------
+#   All codes update the euclidean path x(0..n) with the local action
+#
+#       s_j = a*(1/4*((x_j-x_(j-1))^2+(x_(j+1)-x_j)^2)/a^2 + v_j(x_j))
+#       v_j = alpha*v1 + (1-alpha)*v0
+#       v1  = (x^2-f^2)^2,   v0 = 1/2*w_j*(x-x0_j)^2 + vi_j
+#
+#   qm/qmcool use alpha=1, qmswitch switches from the harmonic oscillator
+#   w_j=w^2/2, qmidens from the gaussian potential around the classical
+#   path. Sites 1..n-1 are updated, x(0)=bc*x(n-1) and x(n)=bc*x(1) are
+#   kept up to date by the kernels (bc=1 periodic, bc=-1 anti-periodic).
+#   qmidens fixes the instanton center at n0, adds the jacobian
+#   -log|x(n0+1)-x(n0-1)| of the constraint and keeps the end points
+#   x(0)=bc*x(n-1) at their initial values.
+#------------------------------------------------------------------------------
+#   The site by site kernel is compiled with numba if it is installed and
+#   runs as plain python otherwise. The even/odd kernel only uses numpy.
+#------------------------------------------------------------------------------
+try:
+    import numba
+    jit = numba.njit(cache=True)
+except ImportError:
+    def jit(func):
+        return func
+
+#------------------------------------------------------------------------------
+#   set up the potential and the constraint
+#------------------------------------------------------------------------------
+#   Input:
+#       n     number of lattice points
+#       a     lattice spacing
+#       f     minimum of anharmonic oscillator potential
+#       alpha coupling between v0 (alpha=0) and v1 (alpha=1)
+#       w     curvature of v0 (number or array over the lattice)
+#       x0    center of v0 (number or array over the lattice)
+#       vi    constant part of v0 (number or array over the lattice)
+#       bc    1 periodic, -1 anti-periodic boundary conditions
+#       n0    instanton center, kept fixed with the jacobian, -1 for none
+#       fixed sites which are not updated
+#   Output:
+#       pot   dictionary passed to the sweeps, alpha may be changed later
+#------------------------------------------------------------------------------
+def potential(n, a, f, alpha=1.0, w=0.0, x0=0.0, vi=0.0, bc=1.0, n0=-1,
+              fixed=()):
+    pot = {'n': n, 'a': a, 'f': f, 'alpha': float(alpha), 'bc': float(bc)}
+    for key, val in (('w', w), ('x0', x0), ('vi', vi)):
+        pot[key] = np.zeros(n+1)
+        if np.ndim(val) == 0:
+            pot[key][:] = val
+        else:
+            pot[key][:len(val)] = val[:n+1]
+    fixed = list(fixed) + ([n0] if n0 > 0 else [])
+    sites = np.arange(1, n)
+    pot['sites'] = sites[~np.isin(sites, fixed)]
+    pot['n0m']   = n0-1 if n0 > 0 else -1
+    pot['n0p']   = n0+1 if n0 > 0 else -1
+    #--------------------------------------------------------------------------
+    #   sites the even/odd sweep leaves to the site by site kernel: last site
+    #   of an odd ring and the two sites coupled by the jacobian
+    #--------------------------------------------------------------------------
+    special = [n-1] if n % 2 == 0 else []
+    if n0 > 0:
+        special += [n0-1, n0+1]
+    special = [j for j in special if j not in fixed]
+    pot['special'] = np.array(special, dtype=np.int64)
+    free = np.ones(n+1, dtype=bool)
+    free[special] = False
+    free[fixed]   = False
+    pot['free'] = None if free[1:n-1+n%2].all() else free
+    return pot
+
+#------------------------------------------------------------------------------
+#   site by site Metropolis update of the sites listed in sites
+#------------------------------------------------------------------------------
+#   Input:
+#       x      field configuration x(0..n)
+#       sites  sites to be updated, in this order
+#       dx     proposed shifts x_j -> x_j+dx_j
+#       e      exponential random numbers, accept if dels < e_j
+#       tot    running kinetic term, potential and virial term, the changes
+#              of the accepted hits are added (see totals())
+#   Output:
+#       nacc   number of accepted hits
+#------------------------------------------------------------------------------
+@jit
+def metropolis(x, sites, f, a, alpha, w, x0, vi, bc, n0m, n0p, dx, e, tot):
+    n    = x.shape[0] - 1
+    nacc = 0
+    for j in sites:
+        xo   = x[j]
+        xnew = xo + dx[j]
+        dt   = (xnew-xo)*(xnew+xo-x[j-1]-x[j+1])/(2.0*a)
+        v1o  = (xo*xo-f*f)**2
+        v1n  = (xnew*xnew-f*f)**2
+        v0o  = 0.5*w[j]*(xo-x0[j])**2 + vi[j]
+        v0n  = 0.5*w[j]*(xnew-x0[j])**2 + vi[j]
+        dv   = a*(alpha*(v1n-v0n) + v0n - alpha*(v1o-v0o) - v0o)
+        dels = dt + dv
+        if j == n0m:
+            dels -= log(abs((x[n0p]-xnew)/(x[n0p]-xo)))
+        elif j == n0p:
+            dels -= log(abs((xnew-x[n0m])/(xo-x[n0m])))
+        if dels < e[j]:
+            x[j]  = xnew
+            nacc += 1
+            tot[0] += dt
+            tot[1] += dv
+            tot[2] += a*(alpha*2.0*(xnew*xnew*(xnew*xnew-f*f)
+                                    - xo*xo*(xo*xo-f*f))
+                         + (1.0-alpha)*0.5*w[j]*(xnew*(xnew-x0[j])
+                                                 - xo*(xo-x0[j])))
+            if j == 1:
+                x[n] = bc*xnew
+            if j == n-1:
+                x[0] = bc*xnew
+    return nacc
+
+#------------------------------------------------------------------------------
+#   potential v_j(x) on a set of sites (array version)
+#------------------------------------------------------------------------------
+def vloc(x, pot, js=slice(None)):
+    v  = x*x
+    v -= pot['f']**2
+    v *= v
+    if pot['alpha'] != 1.0:
+        v0 = 0.5*pot['w'][js]*(x-pot['x0'][js])**2 + pot['vi'][js]
+        v  = pot['alpha']*v + (1.0-pot['alpha'])*v0
+    return v
+
+#------------------------------------------------------------------------------
+#   virial term 1/2*x*v_j'(x) on a set of sites (array version)
+#------------------------------------------------------------------------------
+def virial(x, pot, js=slice(None)):
+    tv = 2.0*x*x*(x*x-pot['f']**2)
+    if pot['alpha'] != 1.0:
+        tv0 = 0.5*pot['w'][js]*x*(x-pot['x0'][js])
+        tv  = pot['alpha']*tv + (1.0-pot['alpha'])*tv0
+    return tv
+
+#------------------------------------------------------------------------------
+#   even/odd (checkerboard) Metropolis update
+#------------------------------------------------------------------------------
+#   All sites of one colour only couple to sites of the other colour through
+#   the nearest neighbour kinetic term, so they are proposed and accepted in
+#   one numpy step. exp(-dels) > r is tested as 2a*dels < 2a*e, e = -log(r).
+#   The special sites are updated afterwards by the site by site kernel.
+#   If tot is given the accepted changes are added as in metropolis().
+#------------------------------------------------------------------------------
+def checkerboard(x, pot, dx, e, tot=None):
+    n, a, bc = pot['n'], pot['a'], pot['bc']
+    free  = pot['free']
+    e2a   = 2.0*a*e
+    vold  = vloc(x, pot)
+    nacc  = 0
+    for js in (slice(2, n-1+n%2, 2), slice(1, n-1, 2)):
+        xo    = x[..., js]
+        dxj   = dx[..., js]
+        xnew  = xo + dxj
+        #   kinetic part: (xnew-xo)*(xnew+xo-x(j-1)-x(j+1))
+        dels  = xnew + xo
+        dels -= x[..., js.start-1:js.stop-1:2]
+        dels -= x[..., js.start+1:js.stop+1:2]
+        dels *= dxj
+        if tot is not None:
+            dt = dels/(2.0*a)
+        #   potential part: 2a^2*(v(xnew)-v(xo))
+        vnew  = vloc(xnew, pot, js)
+        vnew -= vold[..., js]
+        vnew *= 2.0*a*a
+        dels += vnew
+        acc   = dels < e2a[..., js]
+        if free is not None:
+            acc &= free[js]
+        if tot is not None:
+            dtv = a*(virial(xnew, pot, js) - virial(xo, pot, js))
+            tot[..., 0] += np.sum(dt, axis=-1, where=acc)
+            tot[..., 1] += np.sum(vnew, axis=-1, where=acc)/(2.0*a)
+            tot[..., 2] += np.sum(dtv, axis=-1, where=acc)
+        np.copyto(xo, xnew, where=acc)
+        x[..., 0] = bc*x[..., n-1]
+        x[..., n] = bc*x[..., 1]
+        nacc += int(np.count_nonzero(acc))
+    if len(pot['special']) > 0:
+        if tot is None:
+            tot = np.zeros(x.shape[:-1]+(3,))
+        for xc, dxc, ec, tc in zip(x.reshape(-1, n+1), dx.reshape(-1, n+1),
+                                   e.reshape(-1, n+1), tot.reshape(-1, 3)):
+            nacc += _kernel(xc, pot['special'], pot, dxc, ec, tc)
+    return nacc
+
+def _kernel(x, sites, pot, dx, e, tot):
+    return metropolis(x, sites, pot['f'], pot['a'], pot['alpha'], pot['w'],
+                      pot['x0'], pot['vi'], pot['bc'], pot['n0m'], pot['n0p'],
+                      dx, e, tot)
+
+#------------------------------------------------------------------------------
+#   one Metropolis sweep through the configuration(s) x(...,0..n)
+#------------------------------------------------------------------------------
+#   Input:
+#       x      field configuration, the last axis is euclidean time
+#       pot    potential and constraint, see potential()
+#       delx   width of the Metropolis update
+#       rng    numpy random generator
+#       isweep 0: site by site, 1: even/odd
+#       tot    optional running totals tot(...,3) from totals(), updated with
+#              the accepted changes
+#   Output:
+#       nacc   number of accepted hits
+#       nhit   number of hits
+#------------------------------------------------------------------------------
+def sweep(x, pot, delx, rng, isweep=0, tot=None):
+    n    = pot['n']
+    dx   = rng.uniform(-delx, delx, x.shape)
+    e    = rng.standard_exponential(x.shape)
+    nhit = len(pot['sites'])*(x.size//(n+1))
+    if isweep not in (0, 1):
+        raise ValueError('isweep = {} is not a Metropolis sweep'.format(isweep))
+    if isweep == 1:
+        return checkerboard(x, pot, dx, e, tot), nhit
+    if tot is None:
+        tot = np.zeros(x.shape[:-1]+(3,))
+    nacc = 0
+    for xc, dxc, ec, tc in zip(x.reshape(-1, n+1), dx.reshape(-1, n+1),
+                               e.reshape(-1, n+1), tot.reshape(-1, 3)):
+        nacc += _kernel(xc, pot['sites'], pot, dxc, ec, tc)
+    return nacc, nhit
+
+#------------------------------------------------------------------------------
+#   adjust the width of the update towards a target acceptance rate
+#------------------------------------------------------------------------------
+#   Input:
+#       delx   width of the update
+#       nacc   accepted hits since the last call
+#       nhit   hits since the last call
+#       pacc   target acceptance rate, pacc=0 keeps delx fixed
+#   Output:
+#       delx   new width, changed by at most a factor 2 per call
+#------------------------------------------------------------------------------
+def tune(delx, nacc, nhit, pacc):
+    if pacc <= 0.0 or nhit == 0:
+        return delx
+    return delx*min(max(nacc/nhit/pacc, 0.5), 2.0)
+
+#------------------------------------------------------------------------------
+#   lattice action of the configuration(s) x(...,0..n)
+#------------------------------------------------------------------------------
+#   Sum of the local actions over the ring of sites 1..n-1, every link and
+#   every site is counted once. This is the action sampled by the sweeps.
+#------------------------------------------------------------------------------
+def action(x, pot):
+    n, a = pot['n'], pot['a']
+    xp = x[..., 2:n+1] - x[..., 1:n]
+    return np.sum(xp*xp, axis=-1)/(4.0*a) + a*np.sum(vloc(x[..., 1:n], pot,
+                                                          slice(1, n)), axis=-1)
+
+#------------------------------------------------------------------------------
+#   kinetic term, potential and virial term of the configuration(s) x(...,0..n)
+#------------------------------------------------------------------------------
+#   Summed over the ring like action(), tot(...,0) + tot(...,1) = action.
+#   The sweeps keep these totals up to date with the changes of the accepted
+#   hits, a new call removes the rounding errors accumulated by the updates.
+#   The jacobian of qmidens is not included.
+#   Output:
+#       tot    tot(...,0) kinetic term, tot(...,1) potential, tot(...,2) virial
+#------------------------------------------------------------------------------
+def totals(x, pot):
+    n, a = pot['n'], pot['a']
+    xp  = x[..., 2:n+1] - x[..., 1:n]
+    xs  = x[..., 1:n]
+    return np.stack((np.sum(xp*xp, axis=-1)/(4.0*a),
+                     a*np.sum(vloc(xs, pot, slice(1, n)), axis=-1),
+                     a*np.sum(virial(xs, pot, slice(1, n)), axis=-1)), axis=-1)
+
+#------------------------------------------------------------------------------
+#   kinetic term, potential and virial term of the ghost site x(0)=x(n-1)
+#------------------------------------------------------------------------------
+#   The link x(0)-x(1) and the site x(0) repeat the link x(n-1)-x(n) and the
+#   site x(n-1) of the ring. totals() + ghost() are the sums over the n
+#   sites 0..n-1 and n links of fn.observables, the convention of the
+#   measurements in all codes (energies divided by n*a).
+#------------------------------------------------------------------------------
+def ghost(x, pot):
+    a   = pot['a']
+    xp  = x[..., 1] - x[..., 0]
+    x0  = x[..., 0]
+    return np.stack((xp*xp/(4.0*a), a*vloc(x0, pot, 0),
+                     a*virial(x0, pot, 0)), axis=-1)
+
+#------------------------------------------------------------------------------
+#   force -dS/dx_j on the updated sites, zero on all other sites
+#------------------------------------------------------------------------------
+def force(x, pot, mask):
+    n, a, f = pot['n'], pot['a'], pot['f']
+    xj  = x[..., 1:n]
+    dv  = 4.0*xj*(xj*xj-f*f)
+    if pot['alpha'] != 1.0:
+        dv0 = pot['w'][1:n]*(xj-pot['x0'][1:n])
+        dv  = pot['alpha']*dv + (1.0-pot['alpha'])*dv0
+    frc = np.zeros_like(x)
+    frc[..., 1:n] = (x[..., 0:n-1] + x[..., 2:n+1] - 2.0*xj)/(2.0*a) - a*dv
+    frc *= mask
+    return frc
+
+#------------------------------------------------------------------------------
+#   hybrid Monte Carlo update of the configuration(s) x(...,0..n)
+#------------------------------------------------------------------------------
+#   Gaussian momenta p_j for all updated sites, nmd leapfrog steps of size
+#   dt for H = p^2/2 + S(x), then every path is accepted with probability
+#   min(1, exp(-dH)). The constraint of qmidens (n0) is not supported.
+#   Input:
+#       x      field configuration(s), the last axis is euclidean time
+#       pot    potential, see potential()
+#       dt     leapfrog step
+#       nmd    number of leapfrog steps per trajectory
+#       rng    numpy random generator
+#   Output:
+#       nacc   number of accepted trajectories
+#       nhit   number of trajectories (one per path)
+#------------------------------------------------------------------------------
+def hmc(x, pot, dt, nmd, rng):
+    if pot['n0m'] > 0:
+        raise ValueError('hybrid Monte Carlo does not support the constraint')
+    n, bc = pot['n'], pot['bc']
+    mask  = np.zeros(n+1)
+    mask[pot['sites']] = 1.0
+    xold  = x.copy()
+    p     = rng.standard_normal(x.shape)*mask
+    hold  = 0.5*np.sum(p*p, axis=-1) + action(x, pot)
+    #   a diverging trajectory (dt too large) gives dH=inf or nan: rejected
+    with np.errstate(over='ignore', invalid='ignore'):
+        p += 0.5*dt*force(x, pot, mask)
+        for k in range(nmd):
+            x += dt*p
+            x[..., 0] = bc*x[..., n-1]
+            x[..., n] = bc*x[..., 1]
+            if k < nmd-1:
+                p += dt*force(x, pot, mask)
+        p += 0.5*dt*force(x, pot, mask)
+        hnew = 0.5*np.sum(p*p, axis=-1) + action(x, pot)
+        acc  = hnew - hold < rng.standard_exponential(hold.shape)
+    np.copyto(x, xold, where=~acc[..., None])
+    return int(np.count_nonzero(acc)), acc.size
+
+#------------------------------------------------------------------------------
+#   Fourier accelerated hybrid Monte Carlo of the configuration(s) x(...,0..n)
+#------------------------------------------------------------------------------
+#   Same as hmc() with H = 1/2 p M^-1 p + S(x), where the mass matrix M is
+#   diagonal in momentum space. M_k is the free part of the action
+#
+#       M_k = 2/a*sin^2(pi*k/N) + a*m^2,   m^2 = max(8f^2, 1),  N = n-1
+#
+#   (m^2 = 8f^2 is the curvature of the potential at x=f), so that all
+#   modes of the path move with frequencies ~1 and the step dt does not have
+#   to shrink with the lattice spacing: the short wavelength modes get small
+#   steps, the long wavelength modes large ones. The momenta are drawn from
+#   N(0,M), the velocity of the path is M^-1 p, both are computed with real
+#   FFTs over the ring of sites 1..n-1. Periodic paths only, no constraint.
+#   Input/Output: see hmc()
+#------------------------------------------------------------------------------
+def fourier(x, pot, dt, nmd, rng):
+    if pot['n0m'] > 0 or pot['bc'] != 1.0:
+        raise ValueError('Fourier acceleration needs periodic boundary '
+                         'conditions')
+    n, a, f = pot['n'], pot['a'], pot['f']
+    mass = 2.0/a*np.sin(np.pi*np.arange((n-1)//2+1)/(n-1))**2
+    mass+= a*max(8.0*f*f, 1.0)
+    mask = np.zeros(n+1)
+    mask[1:n] = 1.0
+    xold = x.copy()
+    p    = np.zeros_like(x)
+    p[..., 1:n] = np.fft.irfft(np.sqrt(mass)*np.fft.rfft(
+                  rng.standard_normal(x[..., 1:n].shape)), n-1)
+    def velocity(p):
+        return np.fft.irfft(np.fft.rfft(p[..., 1:n])/mass, n-1)
+    hold = 0.5*np.sum(p[..., 1:n]*velocity(p), axis=-1) + action(x, pot)
+    #   a diverging trajectory (dt too large) gives dH=inf or nan: rejected
+    with np.errstate(over='ignore', invalid='ignore'):
+        p += 0.5*dt*force(x, pot, mask)
+        for k in range(nmd):
+            x[..., 1:n] += dt*velocity(p)
+            x[..., 0] = x[..., n-1]
+            x[..., n] = x[..., 1]
+            if k < nmd-1:
+                p += dt*force(x, pot, mask)
+        p += 0.5*dt*force(x, pot, mask)
+        hnew = 0.5*np.sum(p[..., 1:n]*velocity(p), axis=-1) + action(x, pot)
+        acc  = hnew - hold < rng.standard_exponential(hold.shape)
+    np.copyto(x, xold, where=~acc[..., None])
+    return int(np.count_nonzero(acc)), acc.size
+
+#------------------------------------------------------------------------------
+#   instanton-anti-instanton pair insertion/removal
+#------------------------------------------------------------------------------
+#   Proposes x -> x + s*dx with the pair profile of the sum ansatz
+#
+#       dx(t) = f*tanh(2f(t-z1)) - f*tanh(2f(t-z2)),  z1 = zc-d/2, z2 = zc+d/2
+#
+#   (see functions.xsum), zc uniform on the ring, d uniform in (0,T/2), T the
+#   length of the ring. s=+1 if x(zc) < 0, s=-1 otherwise: in the x=-f vacuum
+#   the move inserts an instanton-anti-instanton pair, on top of an existing
+#   pair with s=-1 it removes it. The reverse move adds -s*dx, the proposal
+#   is symmetric if the sign chosen at x+s*dx is -s, otherwise the move is
+#   rejected. The pair is accepted with the exact lattice action difference.
+#   Input:
+#       x      field configuration(s), the last axis is euclidean time
+#       pot    potential, see potential() (periodic, no constraint)
+#       npair  number of proposals per path
+#       rng    numpy random generator
+#   Output:
+#       nacc   number of accepted proposals
+#       nhit   number of proposals
+#------------------------------------------------------------------------------
+def pair(x, pot, npair, rng):
+    if pot['n0m'] > 0 or pot['bc'] != 1.0:
+        raise ValueError('pair moves need periodic boundary conditions')
+    n, a, f = pot['n'], pot['a'], pot['f']
+    tmax = (n-1)*a
+    t    = a*np.arange(1, n)
+    xc   = x.reshape(-1, n+1)
+    sold = action(xc, pot)
+    nacc = 0
+    for ipair in range(npair):
+        zc   = rng.uniform(0.0, tmax, (len(xc), 1))
+        d    = rng.uniform(0.0, 0.5*tmax, (len(xc), 1))
+        jc   = 1 + (np.rint(zc/a).astype(int) % (n-1))
+        sgn  = np.where(np.take_along_axis(xc, jc, axis=1) < 0.0, 1.0, -1.0)
+        u    = (t - zc + 0.5*tmax) % tmax - 0.5*tmax
+        dx   = f*np.tanh(2.0*f*(u+0.5*d)) - f*np.tanh(2.0*f*(u-0.5*d))
+        xnew = xc.copy()
+        xnew[:, 1:n] += sgn*dx
+        xnew[:, 0] = xnew[:, n-1]
+        xnew[:, n] = xnew[:, 1]
+        snew = action(xnew, pot)
+        rev  = np.where(np.take_along_axis(xnew, jc, axis=1) < 0.0, 1.0, -1.0)
+        acc  = (snew - sold < rng.standard_exponential(len(xc)))
+        acc &= (rev == -sgn)[:, 0]
+        xc[acc]   = xnew[acc]
+        sold[acc] = snew[acc]
+        nacc += int(np.count_nonzero(acc))
+    return nacc, npair*len(xc)
+
+#------------------------------------------------------------------------------
+#   cooling: minimization of the action of the configuration(s) x(...,0..n)
+#------------------------------------------------------------------------------
+#   Every site is moved to the minimum of its local action s_j for fixed
+#   neighbours, the solution of the cubic
+#
+#       y^3 + p*y + q = 0,   p = 1/(4a^2) - f^2,   q = -(x_(j-1)+x_(j+1))/(8a^2)
+#
+#   which has one real root for p > 0 (a < 1/(2f)), found with Cardano's
+#   formula. The even and the odd sites are done in one numpy step each
+#   (as in checkerboard()), the special sites one by one. The action never
+#   increases, the quantum fluctuations are removed first and the path
+#   ends in a classical configuration of widely separated instantons,
+#   close instanton-anti-instanton pairs annihilate on the way.
+#   Only the potential of qm/qmcool (alpha=1) is supported. A sweep removes
+#   more action than a sweep of mcool(), so the cooling depths of the two
+#   are not the same.
+#   Input:
+#       x      field configuration(s), the last axis is euclidean time
+#       pot    potential, see potential()
+#       ncool  number of cooling sweeps
+#------------------------------------------------------------------------------
+def cool(x, pot, ncool=1):
+    n, a, f, bc = pot['n'], pot['a'], pot['f'], pot['bc']
+    p = 1.0/(4.0*a*a) - f*f
+    if pot['alpha'] != 1.0 or pot['n0m'] > 0 or p <= 0.0:
+        raise ValueError('cooling needs alpha=1, no constraint and a < 1/(2f)')
+    def minimum(xnb):
+        q = -xnb/(8.0*a*a)
+        r = np.sqrt(0.25*q*q + p*p*p/27.0)
+        return np.cbrt(r - 0.5*q) - np.cbrt(r + 0.5*q)
+    for k in range(ncool):
+        for js in (slice(2, n-1+n%2, 2), slice(1, n-1, 2)):
+            x[..., js] = minimum(x[..., js.start-1:js.stop-1:2]
+                                 + x[..., js.start+1:js.stop+1:2])
+            x[..., 0] = bc*x[..., n-1]
+            x[..., n] = bc*x[..., 1]
+        for j in pot['special']:
+            x[..., j] = minimum(x[..., j-1] + x[..., j+1])
+            x[..., 0] = bc*x[..., n-1]
+            x[..., n] = bc*x[..., 1]
+
+#------------------------------------------------------------------------------
+#   site by site stochastic cooling of the sites listed in sites
+#------------------------------------------------------------------------------
+#   Every site gets nhit trial moves x_j -> x_j+dx_j,k, a move is kept if
+#   its local action is lower than the one before the first move (as in the
+#   original cooling of qmcool).
+#   Input:
+#       x      field configuration x(0..n)
+#       sites  sites to be cooled, in this order
+#       dx     trial moves dx(j,k)
+#------------------------------------------------------------------------------
+@jit
+def downhill(x, sites, f, a, bc, dx):
+    n = x.shape[0] - 1
+    for j in sites:
+        xo = x[j]
+        so = ((xo-x[j-1])**2 + (x[j+1]-xo)**2)/(4.0*a) + a*(xo*xo-f*f)**2
+        for k in range(dx.shape[1]):
+            xnew = x[j] + dx[j,k]
+            snew = (((xnew-x[j-1])**2 + (x[j+1]-xnew)**2)/(4.0*a)
+                    + a*(xnew*xnew-f*f)**2)
+            if snew < so:
+                x[j] = xnew
+        if j == 1:
+            x[n] = bc*x[j]
+        if j == n-1:
+            x[0] = bc*x[j]
+
+#------------------------------------------------------------------------------
+#   stochastic cooling of the configuration(s) x(...,0..n)
+#------------------------------------------------------------------------------
+#   Metropolis update which only accepts moves that lower the action, with
+#   nhit hits per site, site by site as in sweep(isweep=0). This is the
+#   cooling of the original codes, a sweep removes less action than a
+#   sweep of cool(). Only the potential of qm/qmcool (alpha=1) is supported.
+#   Input:
+#       x      field configuration(s), the last axis is euclidean time
+#       pot    potential, see potential()
+#       delx   width of the trial moves
+#       rng    numpy random generator
+#       ncool  number of cooling sweeps
+#       nhit   trial moves per site
+#------------------------------------------------------------------------------
+def mcool(x, pot, delx, rng, ncool=1, nhit=10):
+    n = pot['n']
+    if pot['alpha'] != 1.0 or pot['n0m'] > 0:
+        raise ValueError('cooling needs alpha=1 and no constraint')
+    for k in range(ncool):
+        dx = rng.uniform(-delx, delx, x.shape[:-1]+(n, nhit))
+        for xc, dxc in zip(x.reshape(-1, n+1), dx.reshape(-1, n, nhit)):
+            downhill(xc, pot['sites'], pot['f'], pot['a'], pot['bc'], dxc)
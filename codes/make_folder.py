@@ -1,10 +1,10 @@
 import os
 
 #------------------------------------------------------------------------------
-#   Run the program to create the data folders for the 8 codes
+#   Run the program to create the data folders for the 9 codes
 #------------------------------------------------------------------------------
 data_folder = 'Data'
-subfolders = ['iilm', 'qm', 'qmcool', 'qmdiag', 'qmidens', 'qmswitch', 'rilm', 'rilm_gauss']
+subfolders = ['iilm', 'qm', 'qmcool', 'qmdiag', 'qmidens', 'qmswitch', 'qmtemper', 'rilm', 'rilm_gauss']
 
 if not os.path.exists(data_folder):
     os.makedirs(data_folder)
@@ -0,0 +1,146 @@
+import argparse
+import collections
+import functools
+import multiprocessing
+import operator
+import numpy as np
+#------------------------------------------------------------------------------
+#   Independent replicas of the Monte Carlo codes on several cores
+#------------------------------------------------------------------------------
+#   qm.py, qmcool.py, rilm.py, rilm_gauss.py and iilm.py run their Monte
+#   Carlo loop in a function simulate(ireplica, seed) which returns the
+#   accumulators (fn.Blocking, fn.Histogram) and counters. With
+#
+#       python qm.py --workers N
+#
+#   N replicas are started, replica k draws its random numbers from the
+#   stream k of seed in parameters.txt (see stream()). Replica 0 runs in
+#   the main process, the others run in a process pool. The accumulators
+#   are merged and written to the usual output files. Files written during
+#   the run (trajectory.dat, config.dat, ...) are only written by replica 0.
+#   Inside a replica, work which does not feed back into the Markov chain
+#   (cooling in qmcool.py) can be handed to a Pipeline of --coolers
+#   processes.
+#------------------------------------------------------------------------------
+
+#------------------------------------------------------------------------------
+#   command line options of the Monte Carlo codes
+#------------------------------------------------------------------------------
+def arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of independent replicas (processes)')
+    parser.add_argument('--every', action='append', default=[],
+                        metavar='NAME=K',
+                        help='sweeps between measurements of an observable '
+                             '(traj, hist, cor, top, conf, cool), 0: from the '
+                             'autocorrelation time, see fn.Schedule')
+    parser.add_argument('--coolers', type=int, default=0,
+                        help='number of cooling processes (qmcool.py), '
+                             '0: cool in the Monte Carlo process')
+    args, unknown = parser.parse_known_args()
+    if args.workers < 1:
+        parser.error('--workers has to be at least 1')
+    if args.coolers < 0:
+        parser.error('--coolers has to be at least 0')
+    for item in args.every:
+        name, _, k = item.partition('=')
+        if not k.isdigit():
+            parser.error('--every {}: use NAME=K, K >= 0'.format(item))
+    return args
+
+#------------------------------------------------------------------------------
+#   independent, reproducible random number streams
+#------------------------------------------------------------------------------
+#   All codes draw their random numbers from numpy generators, in blocks
+#   (one array per sweep) instead of one python call per number. The
+#   generator of the stream (k1,k2,...) is the counter based Philox
+#   generator seeded with SeedSequence(seed).spawn(...)[k1].spawn(...)[k2]...
+#   Replica k of --workers uses stream(seed, k), further keys (alpha point,
+#   ...) give independent streams inside a replica. The same keys always
+#   give the same numbers, whatever the number of processes.
+#   Input:
+#       seed    seed from parameters.txt
+#       key     stream numbers
+#   Output:
+#       rng     numpy random generator
+#------------------------------------------------------------------------------
+def stream(seed, *key):
+    return np.random.Generator(np.random.Philox(
+        np.random.SeedSequence(seed, spawn_key=key)))
+
+#------------------------------------------------------------------------------
+#   add up the results of the replicas
+#------------------------------------------------------------------------------
+#   Every replica returns a tuple of numbers, numpy arrays and accumulators
+#   (fn.Histogram, ...), the tuples are added element by element with +.
+#------------------------------------------------------------------------------
+def merge(results):
+    return tuple(functools.reduce(operator.add, r) for r in zip(*results))
+
+#------------------------------------------------------------------------------
+#   run simulate(ireplica, seed) for nrep replicas and merge the results
+#------------------------------------------------------------------------------
+#   Every replica gets the same seed and uses stream(seed, ireplica).
+#   The pool needs the fork start method (simulate is defined in the main
+#   script). Where it is not available the replicas run one after the other.
+#------------------------------------------------------------------------------
+def run(simulate, seed, nrep):
+    if nrep == 1:
+        return simulate(0, seed)
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        return merge([simulate(k, seed) for k in range(nrep)])
+    with multiprocessing.get_context('fork').Pool(nrep-1) as pool:
+        other   = pool.starmap_async(simulate,
+                                     [(k, seed) for k in range(1, nrep)])
+        results = [simulate(0, seed)] + other.get()
+    return merge(results)
+
+#------------------------------------------------------------------------------
+#   bounded queue of jobs for a pool of processes
+#------------------------------------------------------------------------------
+#   put(tag, *args) queues func(*args) for the pool, the Monte Carlo chain
+#   goes on while the job runs. The results are passed to handle(tag,
+#   result) in the order of the put() calls, the accumulators see the same
+#   sequence as without the pool. At most maxsize jobs (default 2 per
+#   process) are queued or running, put() waits for the oldest one when the
+#   queue is full. The arguments are pickled when the job is sent, arrays
+#   which the caller goes on changing have to be passed as copies.
+#   With nproc=0, without the fork start method or inside a replica of run()
+#   (a pool process can not start processes) func runs in put() itself.
+#   Input:
+#       func      job, a function of the main script
+#       handle    handle(tag, result), called in the calling process
+#       nproc     number of processes
+#       maxsize   maximal number of queued and running jobs
+#------------------------------------------------------------------------------
+class Pipeline:
+    def __init__(self, func, handle, nproc, maxsize=None):
+        self.func    = func
+        self.handle  = handle
+        self.maxsize = maxsize or 2*nproc
+        self.pending = collections.deque()
+        self.pool    = None
+        if (nproc > 0
+                and 'fork' in multiprocessing.get_all_start_methods()
+                and not multiprocessing.current_process().daemon):
+            self.pool = multiprocessing.get_context('fork').Pool(nproc)
+
+    def put(self, tag, *args):
+        if self.pool is None:
+            self.handle(tag, self.func(*args))
+            return
+        while len(self.pending) >= self.maxsize:
+            self.next()
+        self.pending.append((tag, self.pool.apply_async(self.func, args)))
+
+    def next(self):
+        tag, result = self.pending.popleft()
+        self.handle(tag, result.get())
+
+    def close(self):
+        while self.pending:
+            self.next()
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
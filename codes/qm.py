@@ -1,8 +1,10 @@
 import format_strings as fs
 import numpy as np
 import re
-import random
 import functions as fn
+import lattice as lat
+import topology as top
+import parallel as par
 from tqdm import tqdm
 #------------------------------------------------------------------------------
 #------------------------------------------------------------------------------
@@ -27,7 +29,61 @@ from tqdm import tqdm
 #   n_p      number of points on which the correlation functions are measured: 
 #           <x_i x_(i+1)>,...,<x_i x_(i+np)> (np=20)
 #   nc      number of correlator measurements in a single configuration (nc=5)                               
+#   icor    icor=0: nc random sources per configuration; icor=1: the
+#           correlators are averaged over all sources of the periodic
+#           path at once, computed by FFT (functions.allsource)
 #   kp      number of sweeps between writeout of complete configuration     
+#   isweep  isweep=0: site by site sweep (compiled if numba is installed);
+#           isweep=1: even/odd (checkerboard) sweep, all sites of one colour
+#           are updated in one numpy step, see lattice.py;
+#           isweep=2: hybrid Monte Carlo, nmd leapfrog steps of size dtmd
+#           for the whole path followed by one accept/reject step;
+#           isweep=3: Fourier accelerated hybrid Monte Carlo, the leapfrog
+#           steps are taken in momentum space with a step size for every
+#           mode, so that the autocorrelation time stays flat as a -> 0
+#           (periodic paths, see lattice.fourier)
+#   nmd     number of leapfrog steps per HMC trajectory (nmd=20)
+#   dtmd    leapfrog step of HMC (dtmd=0.05), tuned like delx
+#   nchain  number of independent Markov chains, stored as the rows of an
+#           (nchain,n+1) array and updated together in one sweep. All
+#           measurements are summed over the chains, trajectory.dat and
+#           config.dat follow the first chain
+#   pacc    target acceptance rate, delx (dtmd for HMC) is tuned towards it
+#           during the neq equilibration sweeps and kept fixed afterwards
+#           (pacc=0: no tuning)
+#   npair   number of instanton-anti-instanton pair insertion/removal
+#           proposals per chain after every sweep, accepted with the exact
+#           action difference, see lattice.pair (npair=0: no pair moves)
+#   ktraj, khist, kcor  number of sweeps between entries in trajectory.dat,
+#           measurements of the histogram and moments of x and of the
+#           correlators. 0 (also for kp): 2 tau_int of the action, measured
+#           during the equilibration, see functions.Schedule
+#   igevp   igevp=1: the matrix of correlators <O_i(0)O_k(t)> of
+#           O=x,x^2,x^3 is measured with the correlators and the energies
+#           are written to qm.dat and qmgevp.dat; igevp=0: not measured
+#   nsmear  nsmear>0: the matrix also contains the x^k smeared by nsmear
+#           steps x_j -> (x_(j-1)+2x_j+x_(j+1))/4
+#   it0     reference time t0/a of the generalized eigenvalue problem
+#           C(t)v = lambda C(t0)v for the energies (functions.gevp)
+#   ntsm, htop  the number of instantons + anti-instantons
+#           ntop is estimated without cooling: crossings of the path,
+#           averaged over 2*ntsm+1 sites, through the band |x|<htop*f
+#           (topology.estimate). ntsm=10, htop=0.2 follow the count after
+#           about 50 cooling sweeps of qmcool.py
+#   ktop    number of sweeps between measurements of nin and ntop and
+#           entries in topology.dat (0: 2 tau_int of the action)
+#   ntau    largest separation (sweeps) for the integrated autocorrelation
+#           times of S, x^2, the number of zero crossings nin and ntop,
+#           measured while the run goes on (functions.Autocorrelation).
+#           nin and ntop are only included if they are measured every
+#           sweep (ktop=1 or nindep>0)
+#   nindep  nindep>0: a replica stops before nmc once S, x^2, nin and ntop
+#           each have nindep independent measurements N/(2 tau_int) in it,
+#           nin and ntop are then measured every sweep; nindep=0: nmc sweeps
+#   --every NAME=K  (command line) overwrite the interval of traj, hist,
+#           cor, top (=ktop) or conf (=kp)
+#   --workers N  (command line) run N independent replicas in parallel
+#           processes and add up their results, see parallel.py
 #------------------------------------------------------------------------------
 #   Output:
 #------------------------------------------------------------------------------
@@ -38,6 +94,15 @@ from tqdm import tqdm
 #               for O=x,x^2,x^3; results are given in the format: tau, Pi(tau),
 #               DeltaPi(tau), dlog(Pi)/dtau, Delta[dlog(Pi)/dtau],
 #               where DeltaPi(tau) is the statistical error in Pi(tau)
+#   E_n-E_0     effective energies of the correlator matrix, tau,
+#               E_n-E_0 and its error for n=1,..,number of operators
+#               (igevp=1)
+#   nin, ntop   average number of zero crossings, estimated number of
+#               instantons + anti-instantons per path
+#   tau_int     integrated autocorrelation time of S, x^2 (nin, ntop) in
+#               sweeps, window W and number of independent measurements
+#               N/(2tau)
+#   topology.dat  every ktop sweeps: nin and ntop of the first chain
 #------------------------------------------------------------------------------
 file16 = open('Data/qm/qm.dat', 'w')
 file17 = open('Data/qm/config.dat', 'w')
@@ -46,6 +111,8 @@ file19 = open('Data/qm/qmdist.dat', 'w')
 file20 = open('Data/qm/qmcor.dat', 'w')
 file21 = open('Data/qm/qmcor2.dat', 'w')
 file22 = open('Data/qm/qmcor3.dat', 'w')
+file23 = open('Data/qm/qmgevp.dat', 'w')
+file24 = open('Data/qm/topology.dat', 'w')
 #------------------------------------------------------------------------------
 #   Input parameters 
 #------------------------------------------------------------------------------
@@ -65,7 +132,25 @@ n_p    = re.search(r'n_p\s*=\s*(\d+)', contents).group(1)
 delx   = re.search(r'delx\s*=\s*(\d+\.\d+)', contents).group(1)
 kp     = re.search(r'kp\s*=\s*(\d+)', contents).group(1)
 nc     = re.search(r'nc\s*=\s*(\d+)', contents).group(1)
+icor   = re.search(r'icor\s*=\s*(\d+)', contents).group(1)
 seed   = re.search(r'seed\s*=\s*(\d+)', contents).group(1)
+isweep = re.search(r'isweep\s*=\s*(\d+)', contents).group(1)
+nchain = re.search(r'nchain\s*=\s*(\d+)', contents).group(1)
+pacc   = re.search(r'pacc\s*=\s*(\d+\.\d+)', contents).group(1)
+nmd    = re.search(r'nmd\s*=\s*(\d+)', contents).group(1)
+dtmd   = re.search(r'dtmd\s*=\s*(\d+\.\d+)', contents).group(1)
+npair  = re.search(r'npair\s*=\s*(\d+)', contents).group(1)
+ktraj  = re.search(r'ktraj\s*=\s*(\d+)', contents).group(1)
+khist  = re.search(r'khist\s*=\s*(\d+)', contents).group(1)
+kcor   = re.search(r'kcor\s*=\s*(\d+)', contents).group(1)
+ktop   = re.search(r'ktop\s*=\s*(\d+)', contents).group(1)
+ntau   = re.search(r'ntau\s*=\s*(\d+)', contents).group(1)
+nindep = re.search(r'nindep\s*=\s*(\d+)', contents).group(1)
+igevp  = re.search(r'igevp\s*=\s*(\d+)', contents).group(1)
+nsmear = re.search(r'nsmear\s*=\s*(\d+)', contents).group(1)
+it0    = re.search(r'it0\s*=\s*(\d+)', contents).group(1)
+ntsm   = re.search(r'ntsm\s*=\s*(\d+)', contents).group(1)
+htop   = re.search(r'htop\s*=\s*(\d+\.\d+)', contents).group(1)
 
 # convert the values to numbers
 f      = float(f)   #separation of wells f (f=1.4)
@@ -77,14 +162,38 @@ nmc    = int(nmc)   #monte carlo sweeps
 delx   = float(delx)#update x (delx)
 n_p    = int(n_p)   #number of points in correlator
 nc     = int(nc)    #number of measurements per configuration
+icor   = int(icor)  #random sources/all sources (0,1)
 kp     = int(kp)    #write every kth config
 nc     = int(nc)    #number of measurements per configuration
 seed   = int(seed)  #seed to generate random numbers
+isweep = int(isweep)#site by site/checkerboard/HMC/Fourier HMC (0-3)
+nchain = int(nchain)#number of independent chains
+pacc   = float(pacc)#target acceptance rate
+nmd    = int(nmd)   #leapfrog steps per HMC trajectory
+dtmd   = float(dtmd)#leapfrog step
+npair  = int(npair) #pair moves per sweep
+ktraj  = int(ktraj) #sweeps between entries in trajectory.dat
+khist  = int(khist) #sweeps between histogram/moments of x
+kcor   = int(kcor)  #sweeps between correlator measurements
+ktop   = int(ktop)  #sweeps between nin/ntop measurements
+ntau   = int(ntau)  #largest separation for tau_int
+nindep = int(nindep)#independent measurements wanted (0: nmc sweeps)
+igevp  = int(igevp) #correlator matrix and GEVP energies (0,1)
+nsmear = int(nsmear)#smearing steps of the smeared operators (0: none)
+it0    = int(it0)   #reference time of the GEVP
+ntsm   = int(ntsm)  #half width of the moving average for ntop
+htop   = float(htop)#half width of the band for ntop, units of f
+nworkers = par.arguments().workers #replicas in parallel (--workers)
+schedule = fn.Schedule({'traj': ktraj, 'hist': khist, 'cor': kcor, 'top': ktop,
+                        'conf': kp},
+                       par.arguments().every) #measurement intervals (--every)
+#   nin and ntop every sweep, for their autocorrelation times
+topeach  = nindep > 0 or schedule.every['top'] == 1
+nobs     = 4 if topeach else 2
 
 #------------------------------------------------------------------------------
 #   echo input parameters
 #------------------------------------------------------------------------------
-random.seed(seed)
 tmax   = n*a
 
 file16.write('lattice qm 1.0\n')
@@ -93,7 +202,11 @@ file16.write(fs.f101.format(f,n,a))
 file16.write(fs.f102.format(nmc,neq))
 file16.write(fs.f103.format(n_p,nc))
 file16.write(fs.f104.format(delx,icold))
-file17.write(fs.f444.format(n, nmc/kp, n*a, f))
+file16.write(fs.f108.format(nchain,nworkers))
+file16.write(fs.f208.format(ntsm,htop))
+#   the configuration count is filled in at the end of the run, once the
+#   (possibly automatic) interval and the number of sweeps are known
+file17.write(fs.f444.format(n, 0, n*a, f))
 
 #------------------------------------------------------------------------------
 #   histogram parameters
@@ -103,200 +216,233 @@ xhist_min = -2.0*f
 stxhist   = -2*xhist_min/nxhist
 
 #------------------------------------------------------------------------------
-#   initialize                                                             
-#------------------------------------------------------------------------------
-nacc  = 0
-nhit  = 0
-nconf = 0
-ncor  = 0
-
-stot      = 0.0    
-stot_sum  = 0.0
-stot2_sum = 0.0
-vtot_sum  = 0.0
-vtot2_sum = 0.0
-ttot_sum  = 0.0
-ttot2_sum = 0.0
-tvir_sum  = 0.0
-tvir2_sum = 0.0
-x_sum     = 0.0
-x2_sum    = 0.0
-x4_sum    = 0.0
-x8_sum    = 0.0
-
-x          = np.zeros(n)
-xcor_av    = np.zeros(n_p)
-x2cor_av   = np.zeros(n_p)
-x3cor_av   = np.zeros(n_p)
-xcor_er    = np.zeros(n_p)
-x2cor_er   = np.zeros(n_p)
-x3cor_er   = np.zeros(n_p)
-xcor_sum   = np.zeros(n_p)
-x2cor_sum  = np.zeros(n_p)
-x3cor_sum  = np.zeros(n_p)
-xcor2_sum  = np.zeros(n_p)
-x2cor2_sum = np.zeros(n_p)
-x3cor2_sum = np.zeros(n_p)
-histo_x    = np.zeros(nxhist)
-x2sub_av   = np.zeros(n_p)
-x2sub_er   = np.zeros(n_p)
-
-#------------------------------------------------------------------------------
-#   set the start
-#------------------------------------------------------------------------------
-if icold==0:
-    for i in range(n):
-        x[i]= -f
-else:
-    for i in range(n):
-        x[i] = 2.0 * random.random() * f - f
-        
+#   sweeps between full recomputations of the running action
+#------------------------------------------------------------------------------
+nresum = 100
+
 #------------------------------------------------------------------------------
-#   periodic boundary conditions                                           
+#   operators of the correlator matrix: 1, x, x^2, x^3 (and smeared x^k)
+#   on the periodic path x(1..n-1), one row per chain. The unit operator
+#   gives <O_i> for the subtraction of the disconnected part, which is
+#   only done for the even operators (<x>=<x^3>=0 by symmetry).
 #------------------------------------------------------------------------------
-x[0] = x[n-1]
-x    = np.append(x, x[1])
+nop  = 6 if nsmear > 0 else 3
+even = np.array([0.0, 1.0, 0.0]*(nop//3))
+
+def operators(x):
+    xr  = x[:,1:n]
+    ops = [np.ones_like(xr), xr, xr**2, xr**3]
+    if nsmear > 0:
+        xs = xr
+        for k in range(nsmear):
+            xs = 0.25*(np.roll(xs, 1, axis=1) + 2.0*xs
+                       + np.roll(xs, -1, axis=1))
+        ops += [xs, xs**2, xs**3]
+    return np.stack(ops)
 
 #------------------------------------------------------------------------------
-#   initial action                                                       
-#------------------------------------------------------------------------------     
-for i in range(n):
-    xp = (x[i+1]-x[i])/a
-    t  = 1.0/4.0*xp**2
-    v  = (x[i]**2-f**2)**2
-    s  = a*(t+v)
-    stot += s
-    
+#   one replica of the simulation, returns the accumulators
 #------------------------------------------------------------------------------
-#    monte carlo sweeps                                                     
-#------------------------------------------------------------------------------
-for i in tqdm(range(nmc)):
-    nconf += 1
-    if i == neq:
-        nconf = 0
-        ncor  = 0
-        stot_sum  = 0.0
-        stot2_sum = 0.0
-        vtot_sum  = 0.0
-        vtot2_sum = 0.0
-        ttot_sum  = 0.0
-        ttot2_sum = 0.0
-        tvir_sum  = 0.0
-        tvir2_sum = 0.0
-        x_sum     = 0.0
-        x2_sum    = 0.0
-        x4_sum    = 0.0
-        x8_sum    = 0.0
-        xnorm     = 0.0
-        xcor_sum  = np.zeros(n_p)
-        x2cor_sum = np.zeros(n_p)
-        x3cor_sum = np.zeros(n_p)
-        histo_x   = np.zeros(nxhist)
+def simulate(ireplica, seed):
+    #--------------------------------------------------------------------------
+    #   initialize                                                             
+    #--------------------------------------------------------------------------
+    rng   = par.stream(seed, ireplica)
+    nacc  = 0
+    nhit  = 0
+    nacc0 = 0
+    nhit0 = 0
+    npacc = 0
+    nphit = 0
+    nconf = 0
+    delx_mc = dtmd if isweep >= 2 else delx
+    sched   = fn.Schedule(schedule.every)
+
+    #   stot, vtot, ttot, tvir; x, x^2, x^4; x, x^2, x^3 correlators
+    act_acc = fn.Blocking(4)
+    xm_acc  = fn.Blocking(3)
+    cor_acc = fn.Blocking((3, n_p))
+    mat_acc = fn.Blocking((nop+1, nop+1, n_p))
+
+    #   number of zero crossings, estimated number of instantons
+    top_acc = fn.Blocking(2)
+
+    #   tau_int of stot, x^2 (number of zero crossings, instantons)
+    acor    = fn.Autocorrelation(nobs, ntau)
+
+    x          = np.zeros((nchain, n))
+    histo_x    = fn.Histogram(xhist_min, stxhist, nxhist)
+
+    #--------------------------------------------------------------------------
+    #   set the start
+    #--------------------------------------------------------------------------
+    if icold==0:
+        x[:] = -f
+    else:
+        x[:] = rng.uniform(-f, f, (nchain, n))
         
     #--------------------------------------------------------------------------
-    #   one sweep thorough configuration                                       
+    #   periodic boundary conditions                                           
     #--------------------------------------------------------------------------
-    for j in range(1,n):
-        nhit += 1
-        xpm   = (x[j]-x[j-1])/a
-        xpp   = (x[j+1]-x[j])/a
-        t     = 1.0/4.0*(xpm**2+xpp**2)
-        v     = (x[j]**2-f**2)**2
-        sold  = a*(t+v)
-        xnew  = x[j] + delx*(2.0*random.random()-1.0)
-        xpm   = (xnew-x[j-1])/a
-        xpp   = (x[j+1]-xnew)/a
-        t     = 1.0/4.0*(xpm**2+xpp**2)
-        v     = (xnew**2-f**2)**2
-        snew  = a*(t+v)
-        dels  = snew-sold
-        dels  = min(dels,70.0)
-        dels  = max(dels,-70.0)
-        if np.exp(-dels) > random.random():
-            x[j]  = xnew
-            nacc += 1
-    x[0] = x[n-1]
-    x[n] = x[1] 
-		
+    x[:,0] = x[:,n-1]
+    x    = np.append(x, x[:,1:2], axis=1)
+    pot  = lat.potential(n, a, f)
+
+    #--------------------------------------------------------------------------
+    #   initial action: tot[chain] = kinetic term, potential, virial term,
+    #   kept up to date by the Metropolis sweeps (see lattice.totals)
     #--------------------------------------------------------------------------
-    #   calculate action and other things                                                  
-    #--------------------------------------------------------------------------    
-    stot  = 0.0
-    ttot  = 0.0
-    tvtot = 0.0
-    vtot  = 0.0
-    for j in range(n):
-        xp = (x[j+1]-x[j])/a
-        t  = 1.0/4.0*xp**2
-        v  = (x[j]**2-f**2)**2
-        tv = 2.0*x[j]**2*(x[j]**2-f**2)
-        s  = a*(t+v)
-        ttot  += a*t
-        vtot  += a*v
-        tvtot += a*tv
-        stot  += s
+    tot = lat.totals(x, pot)
     
-    file18.write(fs.f444.format(i,stot,ttot,vtot))    
-    if i % kp == 0:
-        file17.write('configuration: ')
-        file17.write(str(i))
-        file17.write('\n')
-        for i in range(n):
-            file17.write(fs.f222.format(i*a, x[i]))
-            
     #--------------------------------------------------------------------------
-    #   populate histogram include in sample                                                     
+    #    monte carlo sweeps                                                     
     #--------------------------------------------------------------------------
-    stot_sum  += stot
-    stot2_sum += stot**2
-    vtot_sum  += vtot
-    vtot2_sum += vtot**2
-    ttot_sum  += ttot
-    ttot2_sum += ttot**2
-    tvir_sum  += tvtot
-    tvir2_sum += tvtot**2
-
-    for k in range(n):
-        fn.histogramarray(x[k], xhist_min, stxhist, nxhist, histo_x)
-        x_sum  += x[k]
-        x2_sum += x[k]**2
-        x4_sum += x[k]**4
-        x8_sum += x[k]**8
+    for i in tqdm(range(nmc), disable=ireplica>0):
+        if i == neq:
+            nacc  = 0
+            nhit  = 0
+            npacc = 0
+            nphit = 0
+            sched.tune()
+            if ireplica == 0:
+                sched.write(file16)
         
-    #--------------------------------------------------------------------------
-    #   correlation function                                                   
-    #--------------------------------------------------------------------------
-    for ic in range(nc):
-        ncor += 1 
-        ip0  = int((n-n_p)*random.random()) 
-        x0   = x[ip0] 
-        for ip in range(n_p):
-            x1 = x[ip0+ip]
-            xcor  = x0*x1
-            x2cor = xcor**2
-            x3cor = xcor**3   
-            xcor_sum[ip]   += xcor
-            xcor2_sum[ip]  += xcor**2
-            x2cor_sum[ip]  += x2cor
-            x2cor2_sum[ip] += x2cor**2
-            x3cor_sum[ip]  += x3cor
-            x3cor2_sum[ip] += x3cor**2
-         	
-#------------------------------------------------------------------------------
-#   averages                                                               
-#------------------------------------------------------------------------------
-stot_av,stot_err = fn.disp(nconf,stot_sum,stot2_sum)
-vtot_av,vtot_err = fn.disp(nconf,vtot_sum,vtot2_sum)
-ttot_av,ttot_err = fn.disp(nconf,ttot_sum,ttot2_sum)
-tvir_av,tvir_err = fn.disp(nconf,tvir_sum,tvir2_sum)
-x_av,x_err       = fn.disp(nconf*n,x_sum,x2_sum)
-x2_av,x2_err     = fn.disp(nconf*n,x2_sum,x4_sum)
-x4_av,x4_err     = fn.disp(nconf*n,x4_sum,x8_sum)
-
-for ip in range(n_p):
-    xcor_av[ip],xcor_er[ip]   = fn.disp(ncor,xcor_sum[ip],xcor2_sum[ip])
-    x2cor_av[ip],x2cor_er[ip] = fn.disp(ncor,x2cor_sum[ip],x2cor2_sum[ip],)
-    x3cor_av[ip],x3cor_er[ip] = fn.disp(ncor,x3cor_sum[ip],x3cor2_sum[ip],)
+        #----------------------------------------------------------------------
+        #   one sweep thorough configuration or one HMC trajectory, the
+        #   width is tuned once at least 10 hits (trajectories) are done
+        #----------------------------------------------------------------------
+        if isweep == 2:
+            dacc, dhit = lat.hmc(x, pot, delx_mc, nmd, rng)
+        elif isweep == 3:
+            dacc, dhit = lat.fourier(x, pot, delx_mc, nmd, rng)
+        else:
+            dacc, dhit = lat.sweep(x, pot, delx_mc, rng, isweep, tot)
+        nacc += dacc
+        nhit += dhit
+        if i < neq and nhit-nhit0 >= 10:
+            delx_mc = lat.tune(delx_mc, nacc-nacc0, nhit-nhit0, pacc)
+            nacc0, nhit0 = nacc, nhit
+        if npair > 0:
+            dacc, dhit = lat.pair(x, pot, npair, rng)
+            npacc += dacc
+            nphit += dhit
+		
+        #----------------------------------------------------------------------
+        #   action and other things, one entry per chain, from the running
+        #   totals, recomputed after global updates and every nresum sweeps.
+        #   With the ghost site x(0) the sums run over the n sites of
+        #   fn.observables, as in the other codes.
+        #----------------------------------------------------------------------
+        if isweep >= 2 or npair > 0 or i % nresum == 0:
+            tot = lat.totals(x, pot)
+        totn  = tot + lat.ghost(x, pot)
+        ttot  = totn[:,0]
+        vtot  = totn[:,1]
+        tvtot = totn[:,2]
+        stot  = ttot + vtot
+    
+        if i < neq:
+            sched.record(np.mean(stot))
+        if sched.due('traj', i) and ireplica == 0:
+            file18.write(fs.f444.format(i,stot[0],ttot[0],vtot[0]))    
+        #----------------------------------------------------------------------
+        #   zero crossings and estimated number of instantons
+        #----------------------------------------------------------------------
+        measure = sched.due('top', i)
+        if measure or topeach:
+            nin   = top.count(x[:,1:n+1])
+            ntop  = top.estimate(x[:,1:n], ntsm, htop*f)
+        if measure and ireplica == 0:
+            file24.write(fs.f445.format(i, nin[0], ntop[0]))
+
+        if sched.due('conf', i) and ireplica == 0:
+            nconf += 1
+            file17.write('configuration: ')
+            file17.write(str(i))
+            file17.write('\n')
+            for k in range(n):
+                file17.write(fs.f222.format(k*a, x[0,k]))
+            
+        #----------------------------------------------------------------------
+        #   populate histogram include in sample, from the end of the
+        #   equilibration on
+        #----------------------------------------------------------------------
+        if i < neq:
+            continue
+        act_acc.add(np.stack((stot, vtot, ttot, tvtot)), 1)
+        xr    = x[:,:n]
+        if measure:
+            top_acc.add(np.stack((nin, ntop)), 1)
+        if topeach:
+            acor.add(np.stack((stot, np.mean(xr**2, axis=1), nin, ntop)), 1)
+        else:
+            acor.add(np.stack((stot, np.mean(xr**2, axis=1))), 1)
+
+        if sched.due('hist', i):
+            xr = x[:,:n]
+            histo_x.add(xr)
+            xm_acc.add(np.stack((xr, xr**2, xr**4)), (1,2))
+        
+        #----------------------------------------------------------------------
+        #   correlation function                                                   
+        #----------------------------------------------------------------------
+        #   nc random sources in every chain, x1[chain,source,tau], or the
+        #   average over all sources, xcor[chain,0,tau]
+        #----------------------------------------------------------------------
+        if sched.due('cor', i):
+            if icor == 1:
+                xr    = x[:,None,1:n]
+                xr    = np.stack((xr, xr**2, xr**3))
+                xc    = fn.allsource(xr, n_p)
+            else:
+                ip0   = rng.integers(0, n-n_p, (nchain, nc))
+                js    = (ip0[:,:,None] + np.arange(n_p)).reshape(nchain, -1)
+                x1    = np.take_along_axis(x, js, axis=1).reshape(nchain,nc,n_p)
+                xcor  = x1[:,:,:1]*x1
+                xc    = np.stack((xcor, xcor**2, xcor**3))
+            cor_acc.add(xc, (1,2))
+            if igevp == 1:
+                mat_acc.add(fn.crosssource(operators(x), n_p), 2)
+
+        #----------------------------------------------------------------------
+        #   enough independent measurements, checked every ntau sweeps
+        #----------------------------------------------------------------------
+        if nindep > 0 and (i-neq) % ntau == ntau-1 and acor.enough(nindep):
+            break
+
+    #   header with the number of configurations actually written
+    if ireplica == 0:
+        file17.seek(0)
+        file17.write(fs.f444.format(n, nconf, n*a, f))
+
+    #   tuned step size, averaged over the replicas after the run
+    delx_acc = fn.Accumulator()
+    delx_acc.add(delx_mc)
+
+    return (delx_acc, nacc, nhit, npacc, nphit, act_acc, xm_acc, cor_acc,
+            mat_acc, top_acc, acor, histo_x)
+
+#------------------------------------------------------------------------------
+#   run the replicas and merge their accumulators
+#------------------------------------------------------------------------------
+(delx_acc, nacc, nhit, npacc, nphit, act_acc, xm_acc, cor_acc,
+ mat_acc, top_acc, acor, histo_x) = par.run(simulate, seed, nworkers)
+
+#------------------------------------------------------------------------------
+#   averages, errors from blocking; energy and log derivatives of the
+#   correlators with jackknife errors
+#------------------------------------------------------------------------------
+act_av, act_err = act_acc.disp()
+xm_av, xm_err   = xm_acc.disp()
+cor_av, cor_err = cor_acc.disp()
+top_av, top_err = top_acc.disp()
+
+stot_av, vtot_av, ttot_av, tvir_av     = act_av
+stot_err, vtot_err, ttot_err, tvir_err = act_err
+x_av, x2_av, x4_av                     = xm_av
+x_err, x2_err, x4_err                  = xm_err
+xcor_av, x2cor_av, x3cor_av            = cor_av
+xcor_er, x2cor_er, x3cor_er            = cor_err
 
 v_av   = vtot_av/tmax
 v_err  = vtot_err/tmax
@@ -304,13 +450,26 @@ t_av   = ttot_av/tmax
 t_err  = ttot_err/tmax
 tv_av  = tvir_av/tmax
 tv_err = tvir_err/tmax
-e_av   = v_av + tv_av
-e_err  = np.sqrt(v_err**2 + tv_err**2)
+e_av, e_err  = act_acc.jackknife(lambda s: (s[1] + s[3])/tmax)
+dl_av, dl_er = cor_acc.jackknife(lambda c: fn.dlogs(c, a))
+
+#   connected correlator matrix <O_i(0)O_k(t)> - <O_i><O_k>, GEVP energies
+def energies(c):
+    m = even*c[0,1:,0]
+    return fn.gevp(c[1:,1:] - (m[:,None]*m)[...,None], it0, a)
+if igevp == 1:
+    de_av, de_er = mat_acc.jackknife(energies)
 
 #------------------------------------------------------------------------------
 #   output                                                               
 #------------------------------------------------------------------------------
 file16.write('\n')
+if isweep >= 2:
+    file16.write(fs.f111.format(delx_acc.mean, nmd, nacc/nhit))
+else:
+    file16.write(fs.f109.format(delx_acc.mean, nacc/nhit))
+if npair > 0:
+    file16.write(fs.f112.format(npair, npacc/nphit))
 file16.write(fs.f801.format(stot_av, stot_err))
 file16.write(fs.f802.format(v_av, v_err))
 file16.write(fs.f803.format(t_av, t_err))
@@ -319,6 +478,11 @@ file16.write(fs.f805.format(e_av, e_err))
 file16.write(fs.f806.format(x_av, x_err))
 file16.write(fs.f807.format(x2_av, x2_err))
 file16.write(fs.f808.format(x4_av, x4_err))
+file16.write(fs.f822.format(top_av[0], top_err[0]))
+file16.write(fs.f824.format(top_av[1], top_err[1]))
+file16.write('\n')
+file16.write(fs.f117.format(acor.n))
+acor.write(file16, ['S', 'x^2', 'nin', 'ntop'][:nobs])
 file16.write('\n')
 
 #------------------------------------------------------------------------------
@@ -328,31 +492,20 @@ file16.write("x correlation function\n")
 file20.write("          tau       x(tau)      dx(tau)         dlog\n")
 
 for ip in range(n_p-1):
-    dx  = (xcor_av[ip]-xcor_av[ip+1])/xcor_av[ip]/a
-    dxe2 = (xcor_er[ip+1]/xcor_av[ip])**2
-    + (xcor_er[ip]*xcor_av[ip+1]/xcor_av[ip]**2)**2
-    dxe  = np.sqrt(dxe2)/a
+    dx   = dl_av[0,ip]
+    dxe  = dl_er[0,ip]
     file16.write(fs.f555.format(ip*a, xcor_av[ip], xcor_er[ip], dx, dxe))
     file20.write(fs.f555.format(ip*a, xcor_av[ip], xcor_er[ip], dx, dxe))
 
 #------------------------------------------------------------------------------
 #   subtracted x^2 correlation function, log derivative                                                              
 #------------------------------------------------------------------------------
-xx_sub = x2cor_av[n_p-1]
-xx_er  = x2cor_er[n_p-1]
-
-for ip in range(n_p):
-    x2sub_av[ip] = x2cor_av[ip]-xx_sub
-    x2sub_er[ip] = np.sqrt(x2cor_er[ip]**2+xx_er**2)
-    
 file16.write("x2 correlation function\n")
 file21.write("          tau      x2(tau)     dx2(tau)         dlog\n")
 
 for ip in range(n_p-1):
-    dx  = (x2sub_av[ip]-x2sub_av[ip+1])/x2sub_av[ip]/a
-    dxe2 = (x2sub_er[ip+1]/x2sub_av[ip])**2
-    + (x2sub_er[ip]*x2sub_av[ip+1]/x2sub_av[ip]**2)**2
-    dxe  = np.sqrt(dxe2)/a
+    dx   = dl_av[1,ip]
+    dxe  = dl_er[1,ip]
     file16.write(fs.f555.format(ip*a, x2cor_av[ip], x2cor_er[ip], dx, dxe))
     file21.write(fs.f555.format(ip*a, x2cor_av[ip], x2cor_er[ip], dx, dxe))
 
@@ -363,21 +516,28 @@ file16.write("x3 correlation function\n")
 file22.write("          tau      x3(tau)     dx3(tau)         dlog\n")
 
 for ip in range(n_p-1):
-    dx  = (x3cor_av[ip]-x3cor_av[ip+1])/x3cor_av[ip]/a
-    dxe2 = (x3cor_er[ip+1]/x3cor_av[ip])**2
-    + (x3cor_er[ip]*x3cor_av[ip+1]/x3cor_av[ip]**2)**2
-    dxe  = np.sqrt(dxe2)/a
+    dx   = dl_av[2,ip]
+    dxe  = dl_er[2,ip]
     file16.write(fs.f555.format(ip*a, x3cor_av[ip], x3cor_er[ip], dx, dxe))
     file22.write(fs.f555.format(ip*a, x3cor_av[ip], x3cor_er[ip], dx, dxe))
 
+#------------------------------------------------------------------------------
+#   energies E_n-E_0 from the correlator matrix, plateau for t > t0
+#------------------------------------------------------------------------------
+if igevp == 1:
+    file16.write("GEVP energies E_n-E_0\n")
+    file23.write("          tau      E_n-E_0        error  (n=1,2,..)\n")
+    for ip in range(n_p-1):
+        for fl in (file16, file23):
+            fl.write(fs.f557.format(ip*a))
+            for k in range(nop):
+                fl.write(fs.f558.format(de_av[ip,k], de_er[ip,k]))
+            fl.write('\n')
+
 #------------------------------------------------------------------------------
 #   wave function                                                              
 #------------------------------------------------------------------------------
-for i in range(nxhist):
-    xnorm += histo_x[i]*stxhist
-for i in range(nxhist):
-    xx = xhist_min + (i+1)*stxhist
-    file19.write(fs.f222.format(xx, histo_x[i]/xnorm))
+histo_x.write(file19, shift=1, norm=True)
     
 #------------------------------------------------------------------------------
 #------------------------------------------------------------------------------
@@ -387,4 +547,6 @@ file18.close()
 file19.close()
 file20.close()
 file21.close()
-file22.close()
\ No newline at end of file
+file22.close()
+file23.close()
+file24.close()
\ No newline at end of file
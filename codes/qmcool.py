@@ -1,8 +1,10 @@
 import format_strings as fs
 import numpy as np
-import random
 from tqdm import tqdm
 import functions as fn
+import lattice as lat
+import topology as top
+import parallel as par
 import re
 #------------------------------------------------------------------------------
 #   Action m/2(\dot x)^2+k(x^2-f^2)^2, units 2m=k=1.                      
@@ -28,12 +30,55 @@ import re
 #   npri    number of MonteCarlo configurations between output of averaes to
 #           output file (npri=100)
 #   nc      number of correlator measurements in a single configuration                                
+#   icor    icor=0: nc random sources per configuration; icor=1: the
+#           correlators are averaged over all sources of the periodic
+#           path at once, computed by FFT (functions.allsource)
 #   nst     number of MonteCarlo configurations between successive cooled
 #           configurations. The number of cooled configurations is nconf/nst
 #           (nst=20)
 #   kp2      number of sweeps between cooling                              
-#   ncool   number of cooling sweeps in a single configuration (ncool=50)             
+#   ncool   number of cooling sweeps in a single configuration (ncool=50)
+#   icool   icool=0: stochastic cooling, 10 trial moves of width
+#           delxp=0.1*delx per site which are kept if they lower the action,
+#           see lattice.mcool (the cooling of the original code);
+#           icool=1: every site is moved to the minimum of its local action,
+#           even and odd sites in one numpy step each, see lattice.cool
+#           (needs a < 1/(2f)). icool=1 is much faster, but removes more
+#           action per sweep, so the results at a given number of cooling
+#           sweeps (nin.dat, scool.dat, sinst.dat) are not the same as for
+#           icool=0
+#   nclog   number of cooling depths 1..ncool, logarithmically spaced, at
+#           which instantons and action are measured (nclog=0: after every
+#           cooling sweep)
+#   dsinst  cooling of a snapshot stops at the first depth where
+#           |S/N_I+A - S_0| < dsinst*S_0 (S < dsinst*S_0 without instantons)
+#           and, since the last depth, N_I+A did not change and S changed
+#           by less than dsinst*S (dsinst=0: always ncool sweeps). With
+#           dsinst>0 a row of nin.dat, scool.dat and sinst.dat is the
+#           average over the snapshots which were cooled to this depth only,
+#           rows which no snapshot reached are left out. The cooled correlators, zdist.dat and
+#           coolconfig.dat use the path where the cooling stopped.
+#   ntsm, htop  estimate of N_I+A without cooling (topology.estimate), for
+#           comparison with the cooled counts, see qm.py
 #   kp      number of sweeps between writeout of complete configuration     
+#   isweep  isweep=0: site by site sweep (compiled if numba is installed);
+#           isweep=1: even/odd (checkerboard) sweep, see lattice.py
+#   pacc    target acceptance rate, delx is tuned towards it during the neq
+#           equilibration sweeps and kept fixed afterwards (pacc=0: no tuning)
+#   npair   number of instanton-anti-instanton pair insertion/removal
+#           proposals after every sweep, accepted with the exact action
+#           difference, see lattice.pair (npair=0: no pair moves)
+#   ktraj, khist, kcor  number of sweeps between entries in trajectory.dat,
+#           measurements of the histogram and moments of x and of the
+#           correlators. 0 (also for kp, kp2): 2 tau_int of the action,
+#           measured during the equilibration, see functions.Schedule
+#   --every NAME=K  (command line) overwrite the interval of traj, hist,
+#           cor, cool (=kp2) or conf (=kp)
+#   --workers N  (command line) run N independent replicas in parallel
+#           processes and add up their results, see parallel.py
+#   --coolers N  (command line) cool the snapshots in N processes while the
+#           Monte Carlo chain goes on (par.Pipeline, at most 2N snapshots
+#           waiting), the results are the same as with N=0
 #------------------------------------------------------------------------------
 #   Output:
 #------------------------------------------------------------------------------
@@ -48,6 +93,8 @@ import re
 #   Stot        total action vs number of cooling sweeps
 #   S/N         action per instanton. S_0 is the continuum result for one 
 #               instanton
+#   <ncool>     average number of cooling sweeps per snapshot
+#   ntop        N_I+A estimated on the same snapshots before cooling
 #------------------------------------------------------------------------------
 #------------------------------------------------------------------------------
 file16 = open('Data/qmcool/qm.dat', 'w')
@@ -80,12 +127,24 @@ icold  = re.search(r'icold\s*=\s*(\d+)', contents).group(1)
 neq    = re.search(r'neq\s*=\s*(\d+)', contents).group(1)
 nmc    = re.search(r'nmc\s*=\s*(\d+)', contents).group(1)
 nc     = re.search(r'nc\s*=\s*(\d+)', contents).group(1)
+icor   = re.search(r'icor\s*=\s*(\d+)', contents).group(1)
 delx   = re.search(r'delx\s*=\s*(\d+\.\d+)', contents).group(1)
 n_p    = re.search(r'n_p\s*=\s*(\d+)', contents).group(1)
 kp     = re.search(r'kp\s*=\s*(\d+)', contents).group(1)
 kp2    = re.search(r'kp2\s*=\s*(\d+)', contents).group(1)
 ncool  = re.search(r'ncool\s*=\s*(\d+)', contents).group(1)
+icool  = re.search(r'icool\s*=\s*(\d+)', contents).group(1)
 seed   = re.search(r'seed\s*=\s*(\d+)', contents).group(1)
+isweep = re.search(r'isweep\s*=\s*(\d+)', contents).group(1)
+pacc   = re.search(r'pacc\s*=\s*(\d+\.\d+)', contents).group(1)
+npair  = re.search(r'npair\s*=\s*(\d+)', contents).group(1)
+ktraj  = re.search(r'ktraj\s*=\s*(\d+)', contents).group(1)
+khist  = re.search(r'khist\s*=\s*(\d+)', contents).group(1)
+kcor   = re.search(r'kcor\s*=\s*(\d+)', contents).group(1)
+nclog  = re.search(r'nclog\s*=\s*(\d+)', contents).group(1)
+dsinst = re.search(r'dsinst\s*=\s*(\d+\.\d+)', contents).group(1)
+ntsm   = re.search(r'ntsm\s*=\s*(\d+)', contents).group(1)
+htop   = re.search(r'htop\s*=\s*(\d+\.\d+)', contents).group(1)
 
 # convert the strings to numbers
 f      = float(f)   #separation of wells f (f=1.4)
@@ -97,15 +156,34 @@ nmc    = int(nmc)   #monte carlo sweeps
 delx   = float(delx)#update x (delx)
 n_p    = int(n_p)   #number of points in correlator
 nc     = int(nc)    #number of measurements per configuration
+icor   = int(icor)  #random sources/all sources (0,1)
 kp     = int(kp)    #write every kth config
 kp2    = int(kp2)   #number of sweeps between cooling
 ncool  = int(ncool) #number of cooling sweeps (ncool<5000)
+icool  = int(icool) #stochastic/exact cooling (0,1)
 seed   = int(seed)  #seed to generate random numbers
+isweep = int(isweep)#site by site/checkerboard sweep (0,1)
+pacc   = float(pacc)#target acceptance rate
+npair  = int(npair) #pair moves per sweep
+ktraj  = int(ktraj) #sweeps between entries in trajectory.dat
+khist  = int(khist) #sweeps between histogram/moments of x
+kcor   = int(kcor)  #sweeps between correlator measurements
+nclog  = int(nclog) #log spaced cooling depths (0: every sweep)
+dsinst = float(dsinst)#plateau of S/N at S_0 (0.0: no stop)
+ntsm   = int(ntsm)  #half width of the moving average for ntop
+htop   = float(htop)#half width of the band for ntop, units of f
+nworkers = par.arguments().workers #replicas in parallel (--workers)
+ncoolers = par.arguments().coolers #cooling processes (--coolers)
+schedule = fn.Schedule({'traj': ktraj, 'hist': khist, 'cor': kcor,
+                        'cool': kp2, 'conf': kp},
+                       par.arguments().every) #measurement intervals (--every)
 
 #------------------------------------------------------------------------------
 #   echo input parameters                                                  
 #------------------------------------------------------------------------------
-random.seed(seed)
+#   the path is taken as the n sites x(0..n-1) of fn.observables (x(0)
+#   equals x(n-1)) with the period tmax, as in qm.py. The action, the
+#   instanton counts, the separations and the densities all use it.
 tmax  = n*a
 pi  = np.pi
 s0  = 4.0/3.0*f**3
@@ -120,8 +198,12 @@ file16.write(fs.f203.format(n_p,nc))
 file16.write(fs.f204.format(delx,icold,ncool))
 file16.write(fs.f205.format(s0,de,de*n*a))
 file16.write(fs.f206.format(s0,de2,de2*n*a))
-file17.write(fs.f444.format(n,nmc/kp2,n*a,f))
-file20.write(fs.f444.format(n,nmc/kp2,n*a,f))
+file16.write(fs.f207.format(nclog,dsinst))
+file16.write(fs.f208.format(ntsm,htop))
+#   the configuration count is filled in at the end of the run, once the
+#   (possibly automatic) interval is known
+file17.write(fs.f444.format(n,0,n*a,f))
+file20.write(fs.f444.format(n,0,n*a,f))
 
 #------------------------------------------------------------------------------
 #   parameters for histograms                                              
@@ -131,365 +213,328 @@ xhist_min = -2.0 * f
 stxhist = -2 * xhist_min / float(nxhist)
 nzhist = 40
 stzhist = 4.01 / float(nzhist)
+pot     = lat.potential(n, a, f)
 
 #------------------------------------------------------------------------------
-#   inizialize                                                
-#------------------------------------------------------------------------------
-nacc      = 0
-nhit      = 0    
-nconf     = 0
-ncor      = 0
-ncoolconf = 0
-ncoolcor  = 0
-
-stot      = 0.0   
-stot_sum  = 0.0
-stot2_sum = 0.0
-vtot_sum  = 0.0
-vtot2_sum = 0.0
-ttot_sum  = 0.0
-ttot2_sum = 0.0
-tvir_sum  = 0.0
-tvir2_sum = 0.0
-x_sum     = 0.0
-x2_sum    = 0.0
-x4_sum    = 0.0
-x8_sum    = 0.0
-
-ipa        = np.zeros(nc)
-xs         = np.zeros(n+1)
-x          = np.zeros(n)
-z          = np.zeros(n)
-nin_sum    = np.zeros(ncool+1)
-nin2_sum   = np.zeros(ncool+1)
-scool_sum  = np.zeros(ncool+1)
-scool2_sum = np.zeros(ncool+1)
-ix         = np.zeros(nxhist)
-iz         = np.zeros(nzhist)
-xi         = np.zeros(n)
-xa         = np.zeros(n)
-
-#correlators <x(#0)x(t)>
-xcor_sum   = np.zeros(n_p)
-xcor2_sum  = np.zeros(n_p)
-xcor_av    = np.zeros(n_p)
-xcor_er    = np.zeros(n_p)
-xcool_sum  = np.zeros(n_p)
-xcool2_sum = np.zeros(n_p)
-xcool_av   = np.zeros(n_p)
-xcool_er   = np.zeros(n_p)
-
-#correlators <x^2(0)x^2(t)>                                             
-x2cor_sum     = np.zeros(n_p)
-x2cor2_sum    = np.zeros(n_p)
-x2cor_av      = np.zeros(n_p)
-x2cor_er      = np.zeros(n_p)
-x2sub_av      = np.zeros(n_p)
-x2sub_er      = np.zeros(n_p)
-x2cool_sum    = np.zeros(n_p)
-x2cool2_sum   = np.zeros(n_p)
-x2cool_av     = np.zeros(n_p)
-x2cool_er     = np.zeros(n_p)
-x2cool_sub_av = np.zeros(n_p)
-x2cool_sub_er = np.zeros(n_p)
-
-#correlators <x^3(0)x^3(t)>                                             
-x3cor_sum   = np.zeros(n_p)
-x3cor2_sum  = np.zeros(n_p)
-x3cor_av    = np.zeros(n_p)
-x3cor_er    = np.zeros(n_p)
-x3cool_sum  = np.zeros(n_p)
-x3cool2_sum = np.zeros(n_p)
-x3cool_av   = np.zeros(n_p)
-x3cool_er   = np.zeros(n_p)
-
-#------------------------------------------------------------------------------
-#    set the start                                                             
-#------------------------------------------------------------------------------
-if icold==0:
-    for i in range(n):
-        x[i]= -f
+#   cooling depths at which instantons and action are measured
+#------------------------------------------------------------------------------
+if nclog > 0:
+    depth = np.rint(np.geomspace(1, max(ncool, 1), nclog)).astype(int)
+    depth = np.unique(np.append(0, depth[depth <= ncool]))
 else:
-    for i in range(n):
-        x[i] = 2.0 * random.random() * f - f
-        
+    depth = np.arange(ncool+1)
+ndepth = len(depth)
+
 #------------------------------------------------------------------------------
-#     periodic boundary conditions                                           
+#   cool one snapshot, runs in the cooling processes (par.Pipeline)
 #------------------------------------------------------------------------------
-x[0] = x[n-1]
-x    = np.append(x, x[1])
+#   Input:
+#       xs      snapshot of the path, xs[0..n]
+#       ipa     sources of the cooled correlators (icor=0)
+#       nsweep  number of cooling sweeps (ncool, 0: path only)
+#       delxp   width of the stochastic cooling moves (icool=0)
+#       key     replica and sweep, key of the random stream (icool=0)
+#   Output:
+#       ntop    estimated number of instantons before cooling
+#       nin_c   number of instantons at the cooling depths up to nsweep
+#       scool_c action at the cooling depths up to nsweep
+#       reached 1 for the depths reached, 0 after a stop (dsinst), the
+#               entries of nin_c and scool_c are 0 there
+#       nswept  number of cooling sweeps done (< nsweep: plateau, dsinst)
+#       sep     instanton-anti-instanton separations of the cooled path
+#       ccor    cooled correlators
+#       xs      cooled path
+#------------------------------------------------------------------------------
+def cool(xs, ipa, nsweep, delxp, key):
+    crng    = par.stream(seed, *key)
+    ntop    = top.estimate(xs[:n], ntsm, htop*f)
+    nd      = np.count_nonzero(depth <= nsweep)
+    nin_c   = np.zeros(nd)
+    scool_c = np.zeros(nd)
+    nswept  = 0
+    for k in range(nd):
+        if icool == 0:
+            lat.mcool(xs, pot, delxp, crng, depth[k] - nswept)
+        else:
+            lat.cool(xs, pot, depth[k] - nswept)
+        nswept     = depth[k]
+        nin_c[k]   = top.count(xs[:n])
+        scool_c[k] = fn.act(f, a, n, xs)[0]
+        if dsinst > 0.0 and k > 0:
+            ds   = abs(scool_c[k] - scool_c[k-1])
+            dsin = abs(scool_c[k] - nin_c[k]*s0)
+            if (nin_c[k] == nin_c[k-1] and ds < dsinst*scool_c[k-1]
+                    and dsin < dsinst*s0*max(nin_c[k], 1)):
+                break
+
+    conf, tau, q = top.crossings(xs[:n], a)
+    sep = top.separations(tau, tmax)
+
+    if icor == 1:
+        xr   = xs[1:n]
+        ccor = fn.allsource(np.stack((xr, xr**2, xr**3)), n_p)
+    else:
+        x1   = xs[ipa[:,None] + np.arange(n_p)]
+        xcor = x1[:,:1]*x1
+        ccor = np.stack((xcor, xcor**2, xcor**3))
+    reached = (depth[:nd] <= nswept).astype(float)
+    return ntop, nin_c, scool_c, reached, nswept, sep, ccor, xs
 
 #------------------------------------------------------------------------------
-#     initial action                                                       
-#------------------------------------------------------------------------------      
-for i in range(n):
-    xp = (x[i+1]-x[i])/a
-    t  = 1.0/4.0*xp**2
-    v  = (x[i]**2-f**2)**2
-    s  = a*(t+v)
-    stot += s
-    
+#   one replica of the simulation, returns the accumulators
 #------------------------------------------------------------------------------
-#    monte carlo sweeps                                                     
-#------------------------------------------------------------------------------
-for i in tqdm(range(nmc)):
-    nconf += 1
-    if i == neq:
-        nconf     = 0
-        ncor      = 0
-        ncoolconf = 0
-        ncoolcor  = 0
-        stot_sum  = 0.0
-        stot2_sum = 0.0
-        vtot_sum  = 0.0
-        vtot2_sum = 0.0
-        ttot_sum  = 0.0
-        ttot2_sum = 0.0
-        tvir_sum  = 0.0
-        tvir2_sum = 0.0
-        x_sum     = 0
-        x2_sum    = 0
-        x4_sum    = 0
-        x8_sum    = 0
-        xcor_sum    = np.zeros(n_p)
-        xcor2_sum   = np.zeros(n_p)
-        xcool_sum   = np.zeros(n_p)
-        xcool2_sum  = np.zeros(n_p)
-        x2cor_sum   = np.zeros(n_p)
-        x2cor2_sum  = np.zeros(n_p)
-        x2cool_sum  = np.zeros(n_p)
-        x2cool2_sum = np.zeros(n_p)
-        x3cor_sum   = np.zeros(n_p)
-        x3cor2_sum  = np.zeros(n_p)
-        x3cool_sum  = np.zeros(n_p)
-        x3cool2_sum = np.zeros(n_p)
-        nin_sum     = np.zeros(ncool+1)
-        nin2_sum    = np.zeros(ncool+1)
-        ix          = np.zeros(nxhist)
-        iz          = np.zeros(nzhist)
-        nin_av      = np.zeros(ncool+1)
-        nin_er      = np.zeros(ncool+1)
-        scool_av    = np.zeros(ncool+1)
-        scool_er    = np.zeros(ncool+1) 
+def simulate(ireplica, seed):
+    #--------------------------------------------------------------------------
+    #   inizialize                                                
+    #--------------------------------------------------------------------------
+    rng       = par.stream(seed, ireplica)
+    nacc      = 0
+    nhit      = 0    
+    nacc0     = 0
+    nhit0     = 0
+    npacc     = 0
+    nphit     = 0
+    nconf     = 0
+    delx_mc   = delx
+    sched     = fn.Schedule(schedule.every)
+
+    ipa        = np.zeros(nc, dtype=int)
+    xs         = np.zeros(n+1)
+    x          = np.zeros(n)
+    ix         = fn.Histogram(xhist_min, stxhist, nxhist)
+    iz         = fn.Histogram(0.0, stzhist, nzhist)
+
+    #   stot, vtot, ttot, tvir; x, x^2, x^4
+    act_acc    = fn.Blocking(4)
+    xm_acc     = fn.Blocking(3)
+
+    #   correlators <x^k(0)x^k(t)>, k=1,2,3, and the cooled correlators
+    cor_acc    = fn.Blocking((3, n_p))
+    cool_acc   = fn.Blocking((3, n_p))
+
+    #   number of instantons and action at the cooling depths (0 where
+    #   the depth was not reached) and 1 for the depths reached, number of
+    #   cooling sweeps per snapshot, estimated number before cooling
+    ncool_acc  = fn.Blocking((3, ndepth))
+    nswp_acc   = fn.Blocking()
+    ntop_acc   = fn.Blocking()
+
+    #--------------------------------------------------------------------------
+    #   results of the cooling processes, in the order of the snapshots
+    #--------------------------------------------------------------------------
+    def cooled(tag, result):
+        i, measure, write = tag
+        ntop, nin_c, scool_c, reached, nswept, sep, ccor, xc = result
+        if measure:
+            ncool_acc.add(np.stack((nin_c, scool_c, reached)))
+            nswp_acc.add(nswept)
+            ntop_acc.add(ntop)
+            iz.add(sep)
+            cool_acc.add(ccor, 1 if icor == 0 else None)
+        if write:
+            file20.write('configuration: ')
+            file20.write(str(i))
+            file20.write('\n')
+            for j in range(n):
+                file20.write(fs.f222.format(j*a, xc[j]))
+
+    pipe = par.Pipeline(cool, cooled, ncoolers)
+
+    #--------------------------------------------------------------------------
+    #    set the start                                                             
+    #--------------------------------------------------------------------------
+    if icold==0:
+        for i in range(n):
+            x[i]= -f
+    else:
+        x[:] = rng.uniform(-f, f, n)
         
     #--------------------------------------------------------------------------
-    #   one sweep thorough configuration                                       
+    #     periodic boundary conditions                                           
     #--------------------------------------------------------------------------
-    for j in range(1,n):
-        nhit += 1
-        xpm   = (x[j]-x[j-1])/a
-        xpp   = (x[j+1]-x[j])/a
-        t     = 1.0/4.0*(xpm**2+xpp**2)
-        v     = (x[j]**2-f**2)**2
-        sold  = a*(t+v)
-        xnew  = x[j] + delx*(2.0*random.random()-1.0)
-        xpm   = (xnew-x[j-1])/a
-        xpp   = (x[j+1]-xnew)/a
-        t     = 1.0/4.0*(xpm**2+xpp**2)
-        v     = (xnew**2-f**2)**2
-        snew  = a*(t+v)
-        dels  = snew-sold
-        dels  = min(dels,70.0)
-        dels  = max(dels,-70.0)
-        if np.exp(-dels) > random.random():
-            x[j]  = xnew
-            nacc += 1
     x[0] = x[n-1]
-    x[n] = x[1]
-    
+    x    = np.append(x, x[1])
+
     #--------------------------------------------------------------------------
-    #   calculate action and other things                                                  
+    #     initial action                                                       
     #--------------------------------------------------------------------------
-    stot = 0.0
-    ttot = 0.0
-    tvtot= 0.0
-    vtot = 0.0
-    for j in range(n):
-        xp     = (x[j+1]-x[j])/a
-        t      = 1.0/4.0*xp**2
-        v      = (x[j]**2-f**2)**2
-        tv     = 2.0*x[j]**2*(x[j]**2-f**2)
-        s      = a*(t+v)
-        xs[j]  = x[j]
-        ttot  += a*t
-        vtot  += a*v
-        tvtot += a*tv
-        stot  += s
-    xs[0] = xs[n-1]
-    xs[n] = xs[1]
+    stot = fn.observables(x, f, a)[0]
     
-    file18.write(fs.f444.format(i,stot,ttot,vtot)) 
     #--------------------------------------------------------------------------
-    #     populate histogram include in sample                                                     
+    #    monte carlo sweeps                                                     
     #--------------------------------------------------------------------------
-    stot_sum  += stot
-    stot2_sum += stot**2
-    vtot_sum  += vtot
-    vtot2_sum += vtot**2
-    ttot_sum  += ttot
-    ttot2_sum += ttot**2
-    tvir_sum  += tvtot
-    tvir2_sum += tvtot**2
-
-    for k in range(n):
-        fn.histogramarray(x[k], xhist_min, stxhist, nxhist, ix)
-        x_sum  += x[k]
-        x2_sum += x[k]**2
-        x4_sum += x[k]**4
-        x8_sum += x[k]**8
+    for i in tqdm(range(nmc), disable=ireplica>0):
+        if i == neq:
+            nacc      = 0
+            nhit      = 0
+            npacc     = 0
+            nphit     = 0
+            sched.tune()
+            if ireplica == 0:
+                sched.write(file16)
+        
+        #----------------------------------------------------------------------
+        #   one sweep thorough configuration                                       
+        #----------------------------------------------------------------------
+        dacc, dhit = lat.sweep(x, pot, delx_mc, rng, isweep)
+        nacc += dacc
+        nhit += dhit
+        if i < neq and nhit-nhit0 >= 10:
+            delx_mc = lat.tune(delx_mc, nacc-nacc0, nhit-nhit0, pacc)
+            nacc0, nhit0 = nacc, nhit
+        if npair > 0:
+            dacc, dhit = lat.pair(x, pot, npair, rng)
+            npacc += dacc
+            nphit += dhit
+    
+        #----------------------------------------------------------------------
+        #   calculate action and other things                                                  
+        #----------------------------------------------------------------------
+        stot, ttot, vtot, tvtot, ptot, xm = fn.observables(x, f, a)
+        xs[:] = x
+        xs[0] = xs[n-1]
+        xs[n] = xs[1]
+    
+        if i < neq:
+            sched.record(stot)
+        if sched.due('traj', i) and ireplica == 0:
+            file18.write(fs.f444.format(i,stot,ttot,vtot)) 
+        #----------------------------------------------------------------------
+        #     populate histogram include in sample, from the end of the
+        #     equilibration on
+        #----------------------------------------------------------------------
+        if i >= neq:
+            act_acc.add([stot, vtot, ttot, tvtot])
+
+        if i >= neq and sched.due('hist', i):
+            ix.add(x[:n])
+            xm_acc.add(np.stack((x[:n], x[:n]**2, x[:n]**4)), 1)
  
-    #--------------------------------------------------------------------------
-    #     correlation function                                                   
-    #--------------------------------------------------------------------------
-    for ic in range(nc):
-        ncor += 1 
-        ip0  = int((n-n_p)*random.random())
-        ipa[ic]  = ip0
-        x0   = x[ip0]
-        for ip in range(n_p):
-            x1    = x[ip0+ip]
-            xcor  = x0*x1
-            x2cor = xcor**2
-            x3cor = xcor**3   
-            xcor_sum[ip]   += xcor
-            xcor2_sum[ip]  += xcor**2
-            x2cor_sum[ip]  += x2cor
-            x2cor2_sum[ip] += x2cor**2
-            x3cor_sum[ip]  += x3cor
-            x3cor2_sum[ip] += x3cor**2     
-            
-    #--------------------------------------------------------------------------
-    #   cooling and topological charge                                         
-    #-------------------------------------------------------------------------- 
-    if i % kp2 == 0:
-        ncoolconf += 1
-        ni, na     = fn.inst(f, a, n, xs, xi, xa, z)
-        ss, ts, vs = fn.act(f, a, n, xs)
-        nin = ni + na
-        nin_sum[0]   += nin
-        nin2_sum[0]  += nin**2
-        scool_sum[0] += ss
-        scool2_sum[0]+= ss**2
-        for icool in range(1,ncool+1):
-            nhit2 = 10
-            delxp= 0.1*delx
-            for w in range(1,n):
-                xpm2  = (xs[w]-xs[w-1])/a
-                xpp2  = (xs[w+1]-xs[w])/a
-                t2    = 1.0/4.0*(xpm2**2+xpp2**2)
-                v2    = (xs[w]**2-f**2)**2
-                sold2 = a*(t2+v2)
-                for j in range(nhit2):          
-                    xnew2 = xs[w] + delxp*(2.0*random.random()-1.0)
-                    xpm2  = (xnew2-xs[w-1])/a
-                    xpp2  = (xs[w+1]-xnew2)/a
-                    t2    = 1.0/4.0*(xpm2**2+xpp2**2)
-                    v2    = (xnew2**2-f**2)**2
-                    snew2 = a*(t2+v2)
-                    if snew2 < sold2 :
-                        xs[w]=xnew2         
-            ni, na     = fn.inst(f, a, n, xs, xi, xa, z)
-            ss, ts, vs = fn.act(f, a, n, xs)
-            nin = ni + na
-            nin_sum[icool]   += nin
-            nin2_sum[icool]  += nin**2
-            scool_sum[icool] += ss
-            scool2_sum[icool]+= ss**2
-            
         #----------------------------------------------------------------------
-        #     cooled configuration: instanton distribution                            
+        #     correlation function                                                   
         #----------------------------------------------------------------------
-        for ii in range(0, nin, 2):
-            if ii == 0:
-                zm = z[nin] - tmax
+        if i >= neq and sched.due('cor', i):
+            if icor == 1:
+                xr     = x[1:n]
+                xr     = np.stack((xr, xr**2, xr**3))
+                cor_acc.add(fn.allsource(xr, n_p))
             else:
-                zm = z[ii-1]
-            z0  = z[ii]
-            zp  = z[ii+1]
-            zia = min(zp-z0, z0-zm)
-            fn.histogramarray( zia, 0.0, stzhist, nzhist, iz)
-        
+                ipa[:] = rng.integers(0, n-n_p, nc)
+                x1     = x[ipa[:,None] + np.arange(n_p)]
+                xcor   = x1[:,:1]*x1
+                cor_acc.add(np.stack((xcor, xcor**2, xcor**3)), 1)
+            
+        #----------------------------------------------------------------------
+        #   cooling and topological charge: number of instantons and action
+        #   after every cooling sweep, instanton distribution and correlators
+        #   of the cooled path. The snapshot goes to the cooling processes,
+        #   the chain does not wait for the result.
         #----------------------------------------------------------------------
-        #   cooled correlator                                                      
-        #----------------------------------------------------------------------       
-        for ic in range(nc):
-            ncoolcor += 1
-            ip0 = int(ipa[ic])
-            x0 = xs[ip0]
-            for ip in range(n_p):
-                x1    = xs[ip0+ip]
-                xcor  = x0*x1
-                x2cor = xcor**2
-                x3cor = xcor**3
-                xcool_sum[ip]   += xcor
-                xcool2_sum[ip]  += xcor**2
-                xcool_sum[ip]   += xcor
-                xcool2_sum[ip]  += xcor**2
-                x2cool_sum[ip]  += x2cor
-                x2cool2_sum[ip] += x2cor**2
-                x3cool_sum[ip]  += x3cor
-                x3cool2_sum[ip] += x3cor**2
+        measure = i >= neq and sched.due('cool', i)
+        write   = sched.due('conf', i) and ireplica == 0
+        if measure and icor == 0 and not sched.due('cor', i):
+            ipa[:] = rng.integers(0, n-n_p, nc)
+        if measure or write:
+            nsweep = ncool if sched.due('cool', i) else 0
+            pipe.put((i, measure, write), xs.copy(), ipa.copy(), nsweep,
+                     0.1*delx_mc, (ireplica, i))
         
-    #--------------------------------------------------------------------------
-    #     write configuration                                                    
-    #--------------------------------------------------------------------------
-    if i % kp == 0:
-        file17.write('configuration: ')
-        file17.write(str(i))
-        file17.write('\n')
-        file20.write('configuration: ')
-        file20.write(str(i))
-        file20.write('\n')
-        for i in range(n):
-            file17.write(fs.f222.format(i*a, x[i]))
-            file20.write(fs.f222.format(i*a, xs[i]))
-            
+        #----------------------------------------------------------------------
+        #     write configuration                                                    
+        #----------------------------------------------------------------------
+        if write:
+            nconf += 1
+            file17.write('configuration: ')
+            file17.write(str(i))
+            file17.write('\n')
+            for j in range(n):
+                file17.write(fs.f222.format(j*a, x[j]))
+
+    pipe.close()
+
+    #   headers with the number of configurations actually written
+    if ireplica == 0:
+        for fw in (file17, file20):
+            fw.seek(0)
+            fw.write(fs.f444.format(n,nconf,n*a,f))
+
+    #   tuned step size, averaged over the replicas after the run
+    delx_acc = fn.Accumulator()
+    delx_acc.add(delx_mc)
+
+    return (delx_acc, nacc, nhit, npacc, nphit, act_acc, xm_acc, cor_acc,
+            cool_acc, ncool_acc, nswp_acc, ntop_acc, ix, iz)
+
+#------------------------------------------------------------------------------
+#   run the replicas and merge their accumulators
+#------------------------------------------------------------------------------
+(delx_acc, nacc, nhit, npacc, nphit, act_acc, xm_acc, cor_acc,
+ cool_acc, ncool_acc, nswp_acc, ntop_acc, ix, iz) = par.run(simulate, seed,
+                                                             nworkers)
+
 #------------------------------------------------------------------------------
 #   averages
 #------------------------------------------------------------------------------
-stot_av, stot_err = fn.disp(nconf  , stot_sum, stot2_sum)
-vtot_av, vtot_err = fn.disp(nconf  , vtot_sum, vtot2_sum)
-ttot_av, ttot_err = fn.disp(nconf  , ttot_sum, ttot2_sum)
-tvir_av, tvir_err = fn.disp(nconf  , tvir_sum, tvir2_sum)
-x_av   , x_err    = fn.disp(nconf*n, x_sum   , x2_sum)
-x2_av  , x2_err   = fn.disp(nconf*n, x2_sum  , x4_sum)
-x4_av  , x4_err   = fn.disp(nconf*n, x4_sum  , x8_sum)
+act_av, act_err = act_acc.disp()
+xm_av, xm_err   = xm_acc.disp()
+stot_av, vtot_av, ttot_av, tvir_av     = act_av
+stot_err, vtot_err, ttot_err, tvir_err = act_err
+x_av, x2_av, x4_av                     = xm_av
+x_err, x2_err, x4_err                  = xm_err
 
 #------------------------------------------------------------------------------
 #     correlators                                                            
 #------------------------------------------------------------------------------
-for ip in range(n_p):
-    xcor_av[ip]  , xcor_er[ip]   = fn.disp(ncor    , xcor_sum[ip]  , xcor2_sum[ip]) 
-    x2cor_av[ip] , x2cor_er[ip]  = fn.disp(ncor    , x2cor_sum[ip] , x2cor2_sum[ip]) 
-    x3cor_av[ip] , x3cor_er[ip]  = fn.disp(ncor    , x3cor_sum[ip] , x3cor2_sum[ip]) 
-    xcool_av[ip] , xcool_er[ip]  = fn.disp(ncoolcor, xcool_sum[ip] , xcool2_sum[ip]) 
-    x2cool_av[ip], x2cool_er[ip] = fn.disp(ncoolcor, x2cool_sum[ip], x2cool2_sum[ip]) 
-    x3cool_av[ip], x3cool_er[ip] = fn.disp(ncoolcor, x3cool_sum[ip], x3cool2_sum[ip]) 
+cor_av, cor_er   = cor_acc.disp()
+cool_av, cool_er = cool_acc.disp()
+
+#correlators <x(#0)x(t)>, <x^2(0)x^2(t)>, <x^3(0)x^3(t)>
+xcor_av, x2cor_av, x3cor_av    = cor_av
+xcor_er, x2cor_er, x3cor_er    = cor_er
+xcool_av, x2cool_av, x3cool_av = cool_av
+xcool_er, x2cool_er, x3cool_er = cool_er
+
+#log derivatives, <x^2(0)x^2(t)> minus <x^2>^2, jackknife errors
+dl_av, dl_er     = cor_acc.jackknife(lambda c: fn.dlogs(c, a))
+dlc_av, dlc_er   = cool_acc.jackknife(lambda c: fn.dlogs(c, a))
 
 #------------------------------------------------------------------------------
 #   instanton density, cooled action                                       
 #------------------------------------------------------------------------------
-for ic in range(ncool + 1):
-    nin_av[ic], nin_er[ic] = fn.disp(ncoolconf, nin_sum[ic]  , nin2_sum[ic]) 
-    scool_av[ic], scool_er[ic] = fn.disp(ncoolconf, scool_sum[ic], scool2_sum[ic]) 
+#   with dsinst>0 averages over the snapshots which reached the depth
+if dsinst > 0.0:
+    keep = ncool_acc.mean[2] > 0.0
+    (nin_av, scool_av), (nin_er, scool_er) = ncool_acc.jackknife(
+        lambda m: m[:2,keep]/m[2,keep])
+    depth = depth[keep]
+else:
+    (nin_av, scool_av, _), (nin_er, scool_er, _) = ncool_acc.disp()
+    keep = slice(None)
+si_av, si_er = ncool_acc.jackknife(lambda m: m[1,keep]/m[0,keep])
+nswp_av, nswp_er = nswp_acc.disp()
+ntop_av, ntop_er = ntop_acc.disp()
 v_av   = vtot_av/tmax
 v_err  = vtot_err/tmax
 t_av   = ttot_av/tmax
 t_err  = ttot_err/tmax
 tv_av  = tvir_av/tmax
 tv_err = tvir_err/tmax
-e_av   = v_av+tv_av
-e_err  = np.sqrt(v_err**2+tv_err**2)
+e_av, e_err  = act_acc.jackknife(lambda s: (s[1]+s[3])/tmax)
 
 #------------------------------------------------------------------------------
 #   output                                                                 
 #------------------------------------------------------------------------------
 file16.write('\n')
 file16.write('nconf = ')
-file16.write(str(nconf))
+file16.write(str(act_acc.n))
 file16.write('\nncoolc= ')
-file16.write(str(ncoolconf))
+file16.write(str(ncool_acc.n))
 file16.write('\n')     
+file16.write(fs.f109.format(delx_acc.mean, nacc/nhit))
+if icool == 0:
+    file16.write(fs.f110.format(0.1*delx_acc.mean))
+if npair > 0:
+    file16.write(fs.f112.format(npair, npacc/nphit))
 file16.write(fs.f801.format(stot_av,stot_err)) 
 file16.write(fs.f802.format(v_av,v_err)) 
 file16.write(fs.f803.format(t_av,t_err)) 
@@ -498,6 +543,8 @@ file16.write(fs.f805.format(e_av,e_err))
 file16.write(fs.f806.format(x_av,x_err)) 
 file16.write(fs.f807.format(x2_av,x2_err)) 
 file16.write(fs.f808.format(x4_av,x4_err)) 
+file16.write(fs.f823.format(nswp_av,nswp_er))
+file16.write(fs.f824.format(ntop_av,ntop_er))
 file16.write('\n')
 
 #------------------------------------------------------------------------------
@@ -507,46 +554,32 @@ file16.write('\n')
 file16.write(' <x(0)x(t)> correlation function\n') 
 file21.write(' <x(0)x(t)> correlation function\n')
 for ip in range(n_p-1):
-    dx  = fn.dl(xcor_av[ip], xcor_av[ip+1], a)
-    dxe = fn.dle(xcor_av[ip], xcor_av[ip+1], xcor_er[ip-1], xcor_er[ip+1])
+    dx, dxe = dl_av[0,ip], dl_er[0,ip]
     file16.write(fs.f555.format(ip*a, xcor_av[ip], xcor_er[ip], dx, dxe)) 
     file21.write(fs.f555.format(ip*a, xcor_av[ip], xcor_er[ip], dx, dxe)) 
 file16.write('\n')
 file16.write(' <x(0)x(t)> cooled correlation function\n') 
 file22.write(' <x(0)x(t)> cooled correlation function\n')
 for ip in range(n_p-1):
-    dx  = fn.dl(xcool_av[ip], xcool_av[ip+1], a)
-    dxe = fn.dle(xcool_av[ip], xcool_av[ip+1], xcool_er[ip], xcool_er[ip+1])
+    dx, dxe = dlc_av[0,ip], dlc_er[0,ip]
     file16.write(fs.f555.format(ip*a, xcool_av[ip], xcool_er[ip], dx, dxe)) 
     file22.write(fs.f555.format(ip*a, xcool_av[ip], xcool_er[ip], dx, dxe)) 
 
 #------------------------------------------------------------------------------
 #     <x^2(0)x^2(t) correlator requires subtraction                          
 #------------------------------------------------------------------------------
-xx_sub = x2cor_av[n_p-1]
-xx_er  = x2cor_er[n_p-1]
-for ip in range(n_p):
-    x2sub_av[ip] = x2cor_av[ip]-xx_sub
-    x2sub_er[ip] = np.sqrt(x2cor_er[ip]**2+xx_er**2)
 file16.write('\n')
 file16.write(' <x^2(0)x^2(t)> correlation function\n')
 file26.write(' <x^2(0)x^2(t)> correlation function\n')      
 for ip in range(n_p-1):
-    dx  = fn.dl(x2sub_av[ip], x2sub_av[ip+1],a)
-    dxe = fn.dle(x2sub_av[ip], x2sub_av[ip+1], x2sub_er[ip],x2sub_er[ip+1])
+    dx, dxe = dl_av[1,ip], dl_er[1,ip]
     file16.write(fs.f555.format(ip*a, x2cor_av[ip], x2cor_er[ip], dx, dxe))
     file26.write(fs.f555.format(ip*a, x2cor_av[ip], x2cor_er[ip], dx, dxe))     
-xx_sub = x2cool_av[n_p-1]
-xx_er  = x2cool_er[n_p-1]
-for ip in range(n_p):
-    x2cool_sub_av[ip] = x2cool_av[ip]-xx_sub
-    x2cool_sub_er[ip] = np.sqrt(x2cool_er[ip]**2+xx_er**2)
 file16.write('\n')
 file16.write(' <x^2(0)x^2(t)> cooled correlation function\n')
 file27.write(' <x^2(0)x^2(t)> cooled correlation function\n')
 for ip in range(n_p-1):
-    dx = fn.dl(x2cool_sub_av[ip], x2cool_sub_av[ip+1], a)
-    dxe= fn.dle(x2cool_sub_av[ip], x2cool_sub_av[ip+1], x2cool_sub_er[ip], x2cool_sub_er[ip+1])
+    dx, dxe = dlc_av[1,ip], dlc_er[1,ip]
     file16.write(fs.f555.format(ip*a, x2cool_av[ip], x2cool_er[ip], dx, dxe))
     file27.write(fs.f555.format(ip*a, x2cool_av[ip], x2cool_er[ip], dx, dxe))
     
@@ -557,16 +590,14 @@ file16.write('\n')
 file16.write(' <x^3(0)x^3(t)> correlation function\n')
 file28.write(' <x^3(0)x^3(t)> correlation function\n')      
 for ip in range(n_p-1):
-    dx  = fn.dl(x3cor_av[ip], x3cor_av[ip+1],a)
-    dxe = fn.dle(x3cor_av[ip],x3cor_av[ip+1], x3cor_er[ip],x3cor_er[ip+1])
+    dx, dxe = dl_av[2,ip], dl_er[2,ip]
     file16.write(fs.f555.format(ip*a,x3cor_av[ip],x3cor_er[ip],dx,dxe))
     file28.write(fs.f555.format(ip*a,x3cor_av[ip],x3cor_er[ip],dx,dxe))     
 file16.write('\n')
 file16.write(' <x^3(0)x^3(t)> cooled correlation function\n')
 file29.write(' <x^3(0)x^3(t)> cooled correlation function\n')
 for ip in range(n_p-1):
-    dx  = fn.dl(x3cool_av[ip],x3cool_av[ip+1],a)
-    dxe = fn.dle(x3cool_av[ip],x3cool_av[ip+1], x3cool_er[ip-1],x3cool_er[ip+1])
+    dx, dxe = dlc_av[2,ip], dlc_er[2,ip]
     file16.write(fs.f555.format(ip*a,x3cool_av[ip],x3cool_er[ip],dx,dxe))
     file29.write(fs.f555.format(ip*a,x3cool_av[ip],x3cool_er[ip],dx,dxe))
 
@@ -576,16 +607,16 @@ for ip in range(n_p-1):
 file16.write('\n')
 file16.write(' number of instantons\n')
 file23.write(' number of instantons\n')
-for ic in range(ncool+1):
-    file16.write(fs.f556.format(ic, nin_av[ic], nin_er[ic], de*tmax, de2*tmax)) 
-    file23.write(fs.f556.format(ic, nin_av[ic], nin_er[ic], de*tmax, de2*tmax))       
+for k, ic in enumerate(depth):
+    file16.write(fs.f556.format(ic, nin_av[k], nin_er[k], de*tmax, de2*tmax)) 
+    file23.write(fs.f556.format(ic, nin_av[k], nin_er[k], de*tmax, de2*tmax))       
 file16.write('\n')
 file16.write(' action vs cooling sweeps\n')
 file24.write(' action vs cooling sweeps\n')
-for ic in range(ncool+1):    
-    sin = nin_av[ic]*s0
-    file16.write(fs.f443.format(ic, scool_av[ic], scool_er[ic], sin)) 
-    file24.write(fs.f443.format(ic, scool_av[ic], scool_er[ic], sin))
+for k, ic in enumerate(depth):    
+    sin = nin_av[k]*s0
+    file16.write(fs.f443.format(ic, scool_av[k], scool_er[k], sin)) 
+    file24.write(fs.f443.format(ic, scool_av[k], scool_er[k], sin))
 file16.write('\n')
 file16.write(' action per instanton, S_0 = ')
 file16.write(str(4.0/3.0*f**3))
@@ -594,19 +625,14 @@ file25.write(' action per instanton, S_0 = ')
 file25.write(str(4.0/3.0*f**3))
 file25.write('\n')
  
-for ic in range(ncool+1):
-    si_av= scool_av[ic]/nin_av[ic]                    
-    del2 =(scool_er[ic]/scool_av[ic])**2+(nin_er[ic]/nin_av[ic])**2
-    si_er= si_av*np.sqrt(del2)
-    file16.write(fs.f443.format(ic,si_av,si_er,s0))
-    file25.write(fs.f443.format(ic,si_av,si_er,s0))
+for k, ic in enumerate(depth):
+    file16.write(fs.f443.format(ic,si_av[k],si_er[k],s0))
+    file25.write(fs.f443.format(ic,si_av[k],si_er[k],s0))
 
 #------------------------------------------------------------------------------
 #   histograms                                                             
 #------------------------------------------------------------------------------
-for i in range(nzhist): 
-    xx = (i+0.5)*stzhist
-    file30.write(fs.f222.format(xx,iz[i]))
+iz.write(file30)
 
 #------------------------------------------------------------------------------
 #------------------------------------------------------------------------------
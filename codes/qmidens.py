@@ -1,7 +1,8 @@
 import numpy as np
 import format_strings as fs
-import random
 import functions as fn
+import lattice as lat
+import parallel as par
 import re
 from tqdm import tqdm
 #------------------------------------------------------------------------------
@@ -17,6 +18,9 @@ from tqdm import tqdm
 #   Instanton is placed at beta/2. anti-symmetric boundary conditions are
 #   used. position is fixed during update by requiring x(beta/2)=0
 #------------------------------------------------------------------------------
+#   isweep=0: site by site sweep (compiled if numba is installed);
+#   isweep=1: even/odd (checkerboard) sweep, see lattice.py
+#------------------------------------------------------------------------------
 file16 = open('Data/qmidens/qmidens.dat', 'w')
 file17 = open('Data/qmidens/idens_conf.dat', 'w')
 file18 = open('Data/qmidens/vac_conf.dat', 'w')
@@ -38,6 +42,7 @@ delx   = re.search(r'delx\s*=\s*(\d+\.\d+)', contents).group(1)
 kp     = re.search(r'kp\s*=\s*(\d+)', contents).group(1)
 nalpha = re.search(r'nalpha\s*=\s*(\d+)', contents).group(1)
 seed   = re.search(r'seed\s*=\s*(\d+)', contents).group(1)
+isweep = re.search(r'isweep\s*=\s*(\d+)', contents).group(1)
 
 # convert the values to integers
 f      = float(f)   #separation of wells f (f=1.4)
@@ -49,11 +54,12 @@ delx   = float(delx)#update x (delx)
 kp     = int(kp)    #write every kth config
 nalpha = int(nalpha)#number of steps in adiabatic switching (nswitch ∼ 20)
 seed   = int(seed)  #seed to generate random numbers
+isweep = int(isweep)#site by site/checkerboard sweep (0,1)
 
 #------------------------------------------------------------------------------
 # echo input parameters
 #------------------------------------------------------------------------------
-random.seed(seed)
+rng    = par.stream(seed)
 pi     = np.pi
 dalpha = 1.0/float(nalpha)
 beta   = n*a
@@ -76,12 +82,6 @@ file16.write('------------------------------------\n')
 stot        = 0.0
 sng         = 0.0
 svacng      = 0.0
-stot_sum    = 0.0
-stot2_sum   = 0.0
-vav_sum     = 0.0
-vav2_sum    = 0.0
-valpha_sum  = 0.0
-valpha2_sum = 0.0
 sup_sum     = 0.0
 sup_err     = 0.0
 sup_hal     = 0.0
@@ -118,16 +118,13 @@ for i in range(n):
 #------------------------------------------------------------------------------
 x[n-1] = -x[0]
 x      = np.append(x, -x[1])
+pot    = lat.potential(n, a, f, w=w, x0=x0, vi=vi, bc=-1.0, n0=int(n0),
+                       fixed=[n-1])
 
 #------------------------------------------------------------------------------
 #     initial actions                                                          
 #------------------------------------------------------------------------------
-for i in range(n):
-    xp = (x[i+1]-x[i])/a
-    t  = 1.0/4.0*xp**2    
-    v  = (x[i]**2-f**2)**2
-    s  = a*(t+v)
-    stot += s
+stot = fn.observables(x, f, a)[0]
     
 s0   = 4.0/3.0*f**3
 dens = 8*np.sqrt(2.0/pi)*f**2.5*np.exp(-s0)
@@ -144,131 +141,42 @@ for ialpha in tqdm(range(2*nalpha+1)):
         alpha = ialpha * dalpha
     else:
         alpha = 2.0 - ialpha * dalpha
+    pot['alpha'] = alpha
     nacc  = 0
     nhit  = 0    
-    nconf = 0
-    ncor  = 0
+
+    #   stot, v, v_alpha
+    act_acc = fn.Accumulator(3)
     #------------------------------------------------------------------------------
     #    monte carlo sweeps                                                     
     #------------------------------------------------------------------------------
     for i in range(nmc):
-        nconf += 1
-        if i == neq:
-            nconf = 0
-            stot_sum   = 0.0
-            stot2_sum  = 0.0
-            vav_sum    = 0.0
-            vav2_sum   = 0.0 
-            valpha_sum = 0.0
-            valpha2_sum= 0.0
             
         #----------------------------------------------------------------------
         #   one sweep thorough configuration                                       
         #----------------------------------------------------------------------
-        for j in range(1,n):
-            nhit += 1
-    
-            #------------------------------------------------------------------
-            #   fix instanton center
-            #------------------------------------------------------------------
-            if j == n0:
-                continue
-
-            #------------------------------------------------------------------
-            #   old action                                       
-            #------------------------------------------------------------------
-            xpm   = (x[j]-x[j-1])/a
-            xpp   = (x[j+1]-x[j])/a
-            t     = 1.0/4.0*(xpm**2+xpp**2)
-            v0    = 1.0/2.0*w[j]*(x[j]-x0[j])**2+vi[j]
-            v1    = (x[j]**2-f**2)**2
-            v     = alpha*(v1-v0) + v0
-            sold  = a*(t+v)
-
-            #------------------------------------------------------------------
-            #   jakobian of constraint
-            #------------------------------------------------------------------
-            if j == n0m or j == n0p:
-                vel   = (x[n0p] - x[n0m]) / (2.0 * a)
-                sjak  = -np.log(abs(vel))
-                sold += sjak
-
-            #------------------------------------------------------------------
-            #   MC hit                                       
-            #------------------------------------------------------------------
-            xnew = x[j] + delx*(2.0*random.random()-1.0)
-
-            #------------------------------------------------------------------
-            #   new action                                       
-            #------------------------------------------------------------------
-            xpm   = (xnew-x[j-1])/a
-            xpp   = (x[j+1]-xnew)/a
-            t     = 1.0/4.0*(xpm**2+xpp**2)
-            v0    = 1.0/2.0*w[j]*(xnew-x0[j])**2+vi[j]
-            v1    = (xnew**2-f**2)**2
-            v     = alpha*(v1-v0) + v0
-            snew  = a*(t+v)
-
-            #------------------------------------------------------------------
-            #   jakobian                                     
-            #------------------------------------------------------------------
-            if j == n0m:
-                vel   = (x[n0p] - xnew) / (2.0 * a)
-                sjak  = -np.log(abs(vel))
-                snew += sjak
-            elif j == n0p:
-                vel   = (xnew - x[n0m]) / (2.0 * a)
-                sjak  = -np.log(abs(vel))
-                snew += sjak
-
-            #------------------------------------------------------------------
-            #   accept/reject                                     
-            #------------------------------------------------------------------
-            dels  = snew-sold
-            dels  = min(dels,70.0)
-            dels  = max(dels,-70.0)
-            if np.exp(-dels) > random.random():
-                x[j]  = xnew
-                nacc += 1
-                
-        x[n-1] = -x[0]
-        x[n]   = -x[1]
+        dacc, dhit = lat.sweep(x, pot, delx, rng, isweep)
+        nacc += dacc
+        nhit += dhit
     
+        if i < neq:
+            continue
+
         #----------------------------------------------------------------------
         #   calculate action and other things                                                  
         #----------------------------------------------------------------------
-        stot = 0.0
-        ttot = 0.0
-        vtot = 0.0
-        ptot = 0.0
-        for j in range(n):
-            xp = (x[j+1]-x[j])/a
-            t  = 1.0/4.0*xp**2
-            v0 = 1.0/2.0*w[j]*(x[j]-x0[j])**2+vi[j]
-            v1 = (x[j]**2-f**2)**2
-            v  = alpha*(v1-v0) + v0
-            s  = a*(t+v)
-            ttot += a*t
-            vtot += a*v
-            stot += s
-            ptot += a*(v1-v0)
+        stot, ttot, vtot, tvtot, ptot, xm = fn.observables(x, f, a, alpha,
+                                                           w, x0, vi)
         
         #----------------------------------------------------------------------
         #   include in sample                                                     
         #----------------------------------------------------------------------
-        stot_sum    += stot
-        stot2_sum   += stot**2
-        vav_sum     += vtot/beta
-        vav2_sum    += vtot**2/beta
-        valpha_sum  += ptot/beta
-        valpha2_sum += ptot**2/beta
+        act_acc.add([stot, vtot/beta, ptot/beta])
 
     #--------------------------------------------------------------------------
     #   averages                                                     
     #--------------------------------------------------------------------------
-    stot_av, stot_err     = fn.disp(nconf, stot_sum, stot2_sum)
-    v_av, v_err           = fn.disp(nconf, vav_sum, vav2_sum)
-    valpha_av, valpha_err = fn.disp(nconf, valpha_sum, valpha2_sum)
+    (stot_av, v_av, valpha_av), (stot_err, v_err, valpha_err) = act_acc.disp()
     va_av[ialpha]  = valpha_av
     va_err[ialpha] = valpha_err   
     if ialpha % (2 * nalpha) == 0:
@@ -339,16 +247,6 @@ file16.write("\nreference calculation: trivial vacuum\n-------------------------
 #------------------------------------------------------------------------------
 #   repeat calculation for fluctuations around trivial vacuum                                                                         
 #------------------------------------------------------------------------------
-#------------------------------------------------------------------------------
-#   clear summation arrays                                                                         
-#------------------------------------------------------------------------------
-stot_sum   = 0.0
-stot2_sum  = 0.0
-vav_sum    = 0.0
-vav2_sum   = 0.0 
-valpha_sum = 0.0
-valpha2_sum= 0.0
-
 #------------------------------------------------------------------------------
 #   initialize                                                                         
 #------------------------------------------------------------------------------
@@ -364,6 +262,7 @@ for i in range(n):
 #------------------------------------------------------------------------------
 x[0] = x[n-1]
 x[n] = x[1]
+pot  = lat.potential(n, a, f, w=w, x0=x0, fixed=[n-1])
 
 #------------------------------------------------------------------------------
 #   loop over coupling constant (up/down)                                                                          
@@ -373,106 +272,43 @@ for ialpha in tqdm(range(2 * nalpha + 1)):
         alpha = ialpha * dalpha
     else:
         alpha = 2.0 - ialpha * dalpha
-    nacc = 0
-    nhit = 0    
-    nconf= 0
-    ncor = 0
+    pot['alpha'] = alpha
+    nacc  = 0
+    nhit  = 0    
+
+    #   stot, v, v_alpha
+    act_acc = fn.Accumulator(3)
     
     #--------------------------------------------------------------------------
     #    monte carlo sweeps                                                     
     #--------------------------------------------------------------------------
     for i in range(nmc):
-        nconf += 1
-        if i == neq:
-            nconf = 0
-            stot_sum   = 0.0
-            stot2_sum  = 0.0
-            vav_sum    = 0.0
-            vav2_sum   = 0.0 
-            valpha_sum = 0.0
-            valpha2_sum= 0.0
 
         #----------------------------------------------------------------------
         #   one sweep thorough configuration                                       
         #----------------------------------------------------------------------
-        for j in range(1,n):
-            nhit += 1
-
-            #------------------------------------------------------------------
-            #   old action                                       
-            #------------------------------------------------------------------
-            xpm   = (x[j]-x[j-1])/a
-            xpp   = (x[j+1]-x[j])/a
-            t     = 1.0/4.0*(xpm**2+xpp**2)
-            v0    = 1.0/2.0*w[j]*(x[j]-x0[j])**2
-            v1    = (x[j]**2-f**2)**2
-            v     = alpha*(v1-v0) + v0
-            sold  = a*(t+v)
-
-            #------------------------------------------------------------------
-            #   MC hit                                       
-            #------------------------------------------------------------------
-            xnew = x[j] + delx*(2.0*random.random()-1.0)
-
-            #------------------------------------------------------------------
-            #   new action                                       
-            #------------------------------------------------------------------
-            xpm   = (xnew-x[j-1])/a
-            xpp   = (x[j+1]-xnew)/a
-            t     = 1.0/4.0*(xpm**2+xpp**2)
-            v0    = 1.0/2.0*w[j]*(xnew-x0[j])**2
-            v1    = (xnew**2-f**2)**2
-            v     = alpha*(v1-v0) + v0
-            snew  = a*(t+v)
-
-            #------------------------------------------------------------------
-            #   accept/reject                                     
-            #------------------------------------------------------------------
-            dels  = snew-sold
-            dels  = min(dels,70.0)
-            dels  = max(dels,-70.0)
-            if np.exp(-dels) > random.random():
-                x[j]  = xnew
-                nacc += 1
-                
-        x[n-1] = x[0]
-        x[n]   = x[1]
+        dacc, dhit = lat.sweep(x, pot, delx, rng, isweep)
+        nacc += dacc
+        nhit += dhit
     
+        if i < neq:
+            continue
+
         #----------------------------------------------------------------------
         #   calculate action and other things                                                  
         #----------------------------------------------------------------------
-        stot = 0.0
-        ttot = 0.0
-        vtot = 0.0
-        ptot = 0.0
-        for j in range(n):
-            xp = (x[j+1]-x[j])/a
-            t  = 1.0/4.0*xp**2
-            v0 = 1.0/2.0*w[j]*(x[j]-x0[j])**2
-            v1 = (x[j]**2-f**2)**2
-            v  = alpha*(v1-v0) + v0
-            s  = a*(t+v)
-            ttot += a*t
-            vtot += a*v
-            stot += s
-            ptot += a*(v1-v0)
+        stot, ttot, vtot, tvtot, ptot, xm = fn.observables(x, f, a, alpha,
+                                                           w, x0)
        
         #----------------------------------------------------------------------
         #   include in sample                                                     
         #----------------------------------------------------------------------
-        stot_sum    += stot
-        stot2_sum   += stot**2
-        vav_sum     += vtot/beta
-        vav2_sum    += vtot**2/beta
-        valpha_sum  += ptot/beta
-        valpha2_sum += ptot**2/beta
+        act_acc.add([stot, vtot/beta, ptot/beta])
 
     #--------------------------------------------------------------------------
     #   averages                                                     
     #--------------------------------------------------------------------------
-    stot_av, stot_err     = fn.disp(nconf, stot_sum, stot2_sum)
-    v_av, v_err           = fn.disp(nconf, vav_sum, vav2_sum)
-    valpha_av, valpha_err = fn.disp(nconf, valpha_sum, valpha2_sum)
+    (stot_av, v_av, valpha_av), (stot_err, v_err, valpha_err) = act_acc.disp()
 
     va_av[ialpha]  = valpha_av
     va_err[ialpha] = valpha_err
@@ -1,7 +1,8 @@
 import numpy as np
 import format_strings as fs
-import random
 import functions as fn
+import lattice as lat
+import parallel as par
 import re
 from tqdm import tqdm 
 #------------------------------------------------------------------------------
@@ -35,6 +36,19 @@ from tqdm import tqdm
 #           output file (npri=100)
 #   nc      number of correlator measurements in a single configuration                                
 #   kp      number of sweeps between writeout of complete configuration   
+#   isweep  isweep=0: site by site sweep (compiled if numba is installed);
+#           isweep=1: even/odd (checkerboard) sweep, see lattice.py
+#   nwarm   nwarm=0: one chain is switched through alpha=0,..,1,..,0, every
+#           point starts from the last path of the point before.
+#           nwarm>0: every alpha point is an independent chain of nmc
+#           sweeps. Its start is taken from a short warm up run with nwarm
+#           sweeps per point, the up points (and alpha=1) from a run which
+#           is switched on from alpha=0, the down points from a second,
+#           independent run which is switched off from alpha=1. Up and
+#           down still differ by the history of their start, this gives
+#           the hysteresis error up/d.
+#   --workers N  (command line) nwarm>0: run the alpha points in N
+#           processes (par.Pipeline), the results do not depend on N
 #------------------------------------------------------------------------------
 file16 = open('Data/qmswitch/qmswitch.dat', 'w')
 #------------------------------------------------------------------------------
@@ -57,6 +71,8 @@ kp     = re.search(r'kp\s*=\s*(\d+)', contents).group(1)
 w0     = re.search(r'w0\s*=\s*(\d+\.\d+)', contents).group(1)
 nalpha = re.search(r'nalpha\s*=\s*(\d+)', contents).group(1)
 seed   = re.search(r'seed\s*=\s*(\d+)', contents).group(1)
+isweep = re.search(r'isweep\s*=\s*(\d+)', contents).group(1)
+nwarm  = re.search(r'nwarm\s*=\s*(\d+)', contents).group(1)
 
 # convert the values to numbers
 f      = float(f)   #separation of wells f (f=1.4)
@@ -70,13 +86,12 @@ kp     = int(kp)    #write every kth config
 w0     = float(w0)  #unperturbed oscillator frequency (choose w0 ~ 4f)
 nalpha = int(nalpha)#number of steps in adiabatic switching (nswitch ∼ 20)
 seed   = int(seed)  #seed to generate random numbers
-
-
-
+isweep = int(isweep)#site by site/checkerboard sweep (0,1)
+nwarm  = int(nwarm) #warm up sweeps per alpha point (0: one chain)
+nworkers = par.arguments().workers #processes for the alpha points
 #------------------------------------------------------------------------------
 # echo input parameters
 #------------------------------------------------------------------------------
-random.seed(seed)
 w      = w0
 dalpha = 1.0/float(nalpha)
 beta   = n*a
@@ -90,26 +105,12 @@ file16.write(fs.f101.format(f,n,a))
 file16.write(fs.f102.format(nmc,neq))
 file16.write(fs.f104.format(delx,icold))
 file16.write(fs.f105.format(w, nalpha))
+if nwarm > 0:
+    file16.write(fs.f118.format(nwarm, nworkers))
 
 #------------------------------------------------------------------------------
 #     initialize                                                             
 #------------------------------------------------------------------------------
-nacc  = 0
-nhit  = 0    
-nconf = 0
-ncor  = 0
-
-stot        = 0.0  
-stot_sum    = 0.0
-stot2_sum   = 0.0
-vav_sum     = 0.0
-vav2_sum    = 0.0
-valpha_sum  = 0.0
-valpha2_sum = 0.0
-x_sum       = 0.0
-x2_sum      = 0.0
-x4_sum      = 0.0
-x8_sum      = 0.0
 eup_sum     = 0.0
 eup_err     = 0.0
 eup_hal     = 0.0
@@ -117,138 +118,133 @@ edw_sum     = 0.0
 edw_err     = 0.0
 edw_hal     = 0.0
 
-x      = np.zeros(n)
 va_av  = np.zeros(2 * nalpha + 1)
 va_err = np.zeros(2 * nalpha + 1)
+pot    = lat.potential(n, a, f, w=0.5*w**2)
 
 #------------------------------------------------------------------------------
-#   set the start
+#   start of a chain, periodic boundary conditions
 #------------------------------------------------------------------------------
-if icold==0:
-    for i in range(n):
-        x[i]= -f
-else:
-    for i in range(n):
-        x[i] = 2.0 * random.random() * f - f
+def start(rng):
+    x = np.zeros(n)
+    if icold==0:
+        for i in range(n):
+            x[i]= -f
+    else:
+        x[:] = rng.uniform(-f, f, n)
+    x[0] = x[n-1]
+    return np.append(x, x[1])
 
 #------------------------------------------------------------------------------
-#     periodic boundary conditions                                           
+#   coupling constant of the point ialpha: alpha=0..1 for ialpha=0..nalpha,
+#   alpha=1..0 for ialpha=nalpha..2*nalpha
 #------------------------------------------------------------------------------
-x[0] = x[n-1]
-x    = np.append(x, x[1])
+def coupling(ialpha):
+    if ialpha <= nalpha:
+        return ialpha * dalpha
+    return 2.0 - ialpha * dalpha
 
 #------------------------------------------------------------------------------
-#     initial action                                                       
-#------------------------------------------------------------------------------       
-for i in range(n):
-    xp = (x[i+1]-x[i])/a
-    t  = 1.0/4.0*xp**2
-    v0 = 1.0/4.0*w**2*x[i]**2
-    v1 = (x[i]**2-f**2)**2
-    v  = v0
-    s  = a*(t+v)
-    stot += s
-
+#   nsweep sweeps at the point ialpha
 #------------------------------------------------------------------------------
-#     loop over coupling constant alpha                                                  
+#   Input:
+#       x       path, changed in place
+#       ialpha  alpha point
+#       rng     random generator
+#       nsweep  number of sweeps
+#       nskip   sweeps before the first measurement
+#   Output:
+#       act_acc stot, v, v_alpha
+#       xm_acc  x, x^2, x^4
+#       nacc    accepted updates
+#       nhit    tried updates
 #------------------------------------------------------------------------------
-for ialpha in tqdm(range(2 * nalpha + 1)):
-    if ialpha <= nalpha:
-        alpha = ialpha * dalpha
-    else:
-        alpha = 2.0 - ialpha * dalpha
+def switch(x, ialpha, rng, nsweep, nskip):
+    alpha = coupling(ialpha)
+    pot['alpha'] = alpha
+    nacc  = 0
+    nhit  = 0
+
+    #   stot, v, v_alpha; x, x^2, x^4
+    act_acc = fn.Accumulator(3)
+    xm_acc  = fn.Accumulator(3)
 
     #--------------------------------------------------------------------------
     #   monte carlo sweeps                                                     
     #--------------------------------------------------------------------------
-    for i in range(nmc):
-        nconf += 1
-        if i == neq:
-            nconf = 0
-            stot_sum    = 0.0
-            stot2_sum   = 0.0
-            vav_sum     = 0.0
-            vav2_sum    = 0.0 
-            valpha_sum  = 0.0
-            valpha2_sum = 0.0
-            x_sum       = 0.0
-            x2_sum      = 0.0 
-            x4_sum      = 0.0
-            x8_sum      = 0.0
-
-        #--------------------------------------------------------------------------
+    for i in range(nsweep):
+        #----------------------------------------------------------------------
         #   one sweep thorough configuration                                       
-        #--------------------------------------------------------------------------
-        for j in range(1,n):
-            nhit += 1
-            xpm   = (x[j]-x[j-1])/a
-            xpp   = (x[j+1]-x[j])/a
-            t     = 1.0/4.0*(xpm**2+xpp**2)
-            v0    = 1.0/4.0*w**2*x[j]**2
-            v1    = (x[j]**2-f**2)**2
-            v     = alpha*(v1-v0) + v0
-            sold  = a*(t+v)
-            xnew  = x[j] + delx*(2.0*random.random()-1.0)
-            xpm   = (xnew-x[j-1])/a
-            xpp   = (x[j+1]-xnew)/a
-            t     = 1.0/4.0*(xpm**2+xpp**2)
-            v0    = 1.0/4.0*w**2*xnew**2
-            v1    = (xnew**2-f**2)**2
-            v     = alpha*(v1-v0) + v0
-            snew  = a*(t+v)
-            dels  = snew-sold
-            dels  = min(dels,70.0)
-            dels  = max(dels,-70.0)
-            if np.exp(-dels) > random.random():
-                x[j]  = xnew
-                nacc += 1
-            x[n-1] = x[0]
-            x[n]   = x[1]
+        #----------------------------------------------------------------------
+        dacc, dhit = lat.sweep(x, pot, delx, rng, isweep)
+        nacc += dacc
+        nhit += dhit
+
+        if i < nskip:
+            continue
 
         #----------------------------------------------------------------------
         #   calculate action etc.                                                  
         #----------------------------------------------------------------------
-        stot = 0.0
-        ttot = 0.0
-        vtot = 0.0
-        ptot = 0.0
-        for j in range(n):
-            xp = (x[j+1]-x[j])/a
-            t  = 1.0/4.0*xp**2
-            v0 = 1.0/4.0*w**2*x[j]**2
-            v1 = (x[j]**2-f**2)**2
-            v  = alpha*(v1-v0) + v0
-            s  = a*(t+v)
-            ttot += a*t
-            vtot += a*v
-            stot += s
-            ptot += a*(v1-v0)
+        stot, ttot, vtot, tvtot, ptot, xm = fn.observables(x, f, a, alpha,
+                                                           w=0.5*w**2)
         
         #----------------------------------------------------------------------
         #   include in sample                                                     
         #----------------------------------------------------------------------
-        stot_sum    += stot
-        stot2_sum   += stot**2
-        vav_sum     += vtot/beta
-        vav2_sum    += vtot**2/beta
-        valpha_sum  += ptot/beta
-        valpha2_sum += ptot**2/beta
-    
-        for k in range(n):
-            x_sum  += x[k]
-            x2_sum += x[k]**2
-            x4_sum += x[k]**4
-            x8_sum += x[k]**8
+        act_acc.add([stot, vtot/beta, ptot/beta])
+        xm_acc.add(np.stack((x[:n], x[:n]**2, x[:n]**4)), 1)
+
+    return act_acc, xm_acc, nacc, nhit
+
+#------------------------------------------------------------------------------
+#   independent chain at the point ialpha (nwarm>0), stream (1, ialpha)
+#------------------------------------------------------------------------------
+def point(ialpha, x):
+    return switch(x, ialpha, par.stream(seed, 1, ialpha), nmc, neq)
+
+#------------------------------------------------------------------------------
+#     loop over coupling constant alpha                                                  
+#------------------------------------------------------------------------------
+results = [None] * (2 * nalpha + 1)
+
+def store(ialpha, result):
+    results[ialpha] = result
+
+if nwarm == 0:
+    rng = par.stream(seed)
+    x   = start(rng)
+    for ialpha in tqdm(range(2 * nalpha + 1)):
+        store(ialpha, switch(x, ialpha, rng, nmc, neq))
+else:
+    #--------------------------------------------------------------------------
+    #   warm up runs, up (stream (0,0)) and down (stream (0,1)), give the
+    #   start of every point
+    #--------------------------------------------------------------------------
+    xs = [None] * (2 * nalpha + 1)
+    for iwarm, points in enumerate((range(nalpha + 1),
+                                    range(nalpha, 2 * nalpha + 1))):
+        rng = par.stream(seed, 0, iwarm)
+        x   = start(rng)
+        for ialpha in points:
+            switch(x, ialpha, rng, nwarm, nwarm)
+            if xs[ialpha] is None:
+                xs[ialpha] = x.copy()
+
+    pipe = par.Pipeline(point, store, nworkers if nworkers > 1 else 0)
+    for ialpha in tqdm(range(2 * nalpha + 1)):
+        pipe.put(ialpha, ialpha, xs[ialpha])
+    pipe.close()
+
+for ialpha in range(2 * nalpha + 1):
+    alpha = coupling(ialpha)
+    act_acc, xm_acc, nacc, nhit = results[ialpha]
 
     #--------------------------------------------------------------------------
     #   averages                                                               
     #--------------------------------------------------------------------------
-    stot_av, stot_err     = fn.disp(nconf, stot_sum, stot2_sum)
-    v_av, v_err           = fn.disp(nconf, vav_sum, vav2_sum)
-    valpha_av, valpha_err = fn.disp(nconf, valpha_sum, valpha2_sum)
-    x_av, x_err           = fn.disp(nconf*n, x_sum, x2_sum)
-    x2_av,x2_err          = fn.disp(nconf*n, x2_sum, x4_sum)
-    x4_av,x4_err          = fn.disp(nconf*n, x4_sum, x8_sum)
+    (stot_av, v_av, valpha_av), (stot_err, v_err, valpha_err) = act_acc.disp()
+    (x_av, x2_av, x4_av), (x_err, x2_err, x4_err)             = xm_acc.disp()
     
     va_av[ialpha]  = valpha_av
     va_err[ialpha] = valpha_err
@@ -0,0 +1,246 @@
+import format_strings as fs
+import numpy as np
+import re
+import functions as fn
+import lattice as lat
+import topology as top
+import parallel as par
+from tqdm import tqdm
+#------------------------------------------------------------------------------
+#------------------------------------------------------------------------------
+#   Lattice calculation in quantum mechanics, parallel tempering in f
+#------------------------------------------------------------------------------
+#------------------------------------------------------------------------------
+#   Action m/2(\dot x)^2+k(x^2-f^2)^2, units 2m=k=1.
+#------------------------------------------------------------------------------
+#   periodic b.c. x(0)=x(n-1)
+#------------------------------------------------------------------------------
+#   The lattice of qm.py is simulated for a ladder of nf values f_k equally
+#   spaced between fmin and f. Every nswap sweeps the paths of neighbouring
+#   values f_k, f_(k+1) (even pairs and odd pairs in turn) are exchanged
+#   with probability
+#
+#       min(1, exp(-dS)),
+#       dS = S_k(x_(k+1)) + S_(k+1)(x_k) - S_k(x_k) - S_(k+1)(x_(k+1))
+#
+#   At small f the paths tunnel easily, the swaps carry these instanton
+#   configurations up the ladder to the large f values where the local
+#   updates hardly ever cross the barrier. Every f of the ladder is a
+#   correct simulation on its own, one run gives a whole scan in f.
+#------------------------------------------------------------------------------
+#   Input:
+#------------------------------------------------------------------------------
+#   f       minimum of harmonic oxillator: (x^2-f^2)^2, largest f of the ladder
+#   fmin    smallest f of the ladder
+#   nf      number of f values (nf=1: no swaps, same as qm.py)
+#   nswap   number of sweeps between swap attempts
+#   n       number of lattice points in the euclidean time direction (n=800)
+#   a       lattice spacing (a=0.05)
+#   ih      ih=0: cold start, x_i=-f; ih=1: hot start, x_i=random
+#   neq     number of equlibration sweeps before the first measurement(neq=100)
+#   nmc     number of Monte Carlo sweeps (nmc=10^5)
+#   dx      width of Gaussian distribution used for MonteCarlo update:
+#           x_i^(n)-->x_i^(n+1), tuned for every f towards pacc
+#   isweep  isweep=0: site by site sweep; isweep=1: even/odd sweep
+#   nchain  number of independent Markov chains at every f
+#   --workers N  (command line) run N independent replicas in parallel
+#           processes and add up their results, see parallel.py
+#------------------------------------------------------------------------------
+#   Output:
+#------------------------------------------------------------------------------
+#   swap        acceptance rate of the swaps between f_k and f_(k+1)
+#   Stot        average total action per configuration
+#   Vav, Tav    average potential and kinetic energy
+#   <x^n>       expectation value <x^n> (n=1,2,4)
+#   nin         average number of zero crossings (instantons+anti-instantons)
+#------------------------------------------------------------------------------
+file16 = open('Data/qmtemper/qmtemper.dat', 'w')
+file17 = open('Data/qmtemper/fscan.dat', 'w')
+file18 = open('Data/qmtemper/trajectory.dat', 'w')
+#------------------------------------------------------------------------------
+#   Input parameters
+#------------------------------------------------------------------------------
+# open the file for reading
+with open('parameters.txt', 'r') as file:
+    # read the contents of the file
+    contents = file.read()
+
+# search for the values of f and a using regular expressions
+f      = re.search(r'f\s*=\s*(\d+\.\d+)', contents).group(1)
+n      = re.search(r'n\s*=\s*(\d+)', contents).group(1)
+a      = re.search(r'a\s*=\s*(\d+\.\d+)', contents).group(1)
+icold  = re.search(r'icold\s*=\s*(\d+)', contents).group(1)
+neq    = re.search(r'neq\s*=\s*(\d+)', contents).group(1)
+nmc    = re.search(r'nmc\s*=\s*(\d+)', contents).group(1)
+delx   = re.search(r'delx\s*=\s*(\d+\.\d+)', contents).group(1)
+seed   = re.search(r'seed\s*=\s*(\d+)', contents).group(1)
+isweep = re.search(r'isweep\s*=\s*(\d+)', contents).group(1)
+nchain = re.search(r'nchain\s*=\s*(\d+)', contents).group(1)
+pacc   = re.search(r'pacc\s*=\s*(\d+\.\d+)', contents).group(1)
+nf     = re.search(r'nf\s*=\s*(\d+)', contents).group(1)
+fmin   = re.search(r'fmin\s*=\s*(\d+\.\d+)', contents).group(1)
+nswap  = re.search(r'nswap\s*=\s*(\d+)', contents).group(1)
+
+# convert the values to numbers
+f      = float(f)   #separation of wells f (f=1.4)
+n      = int(n)     #grid size n<10000 (n=100)
+a      = float(a)   #grid spacing a (dtau=0.05)
+icold  = int(icold) #cold/hot start (0,1)
+neq    = int(neq)   #equilibration sweeps
+nmc    = int(nmc)   #monte carlo sweeps
+delx   = float(delx)#update x (delx)
+seed   = int(seed)  #seed to generate random numbers
+isweep = int(isweep)#site by site/checkerboard (0,1)
+nchain = int(nchain)#number of independent chains
+pacc   = float(pacc)#target acceptance rate
+nf     = int(nf)    #number of f values
+fmin   = float(fmin)#smallest f
+nswap  = int(nswap) #sweeps between swaps
+nworkers = par.arguments().workers #replicas in parallel (--workers)
+
+#------------------------------------------------------------------------------
+#   f ladder, echo input parameters
+#------------------------------------------------------------------------------
+fl     = np.linspace(fmin, f, nf) if nf > 1 else np.array([f])
+tmax   = n*a
+
+file16.write('lattice qm, parallel tempering 1.0\n')
+file16.write('----------\n')
+file16.write(fs.f101.format(f,n,a))
+file16.write(fs.f102.format(nmc,neq))
+file16.write(fs.f104.format(delx,icold))
+file16.write(fs.f108.format(nchain,nworkers))
+file16.write(fs.f113.format(nf,fmin,nswap))
+
+#------------------------------------------------------------------------------
+#   one replica of the simulation, returns the accumulators, every
+#   accumulator has one entry for each f of the ladder
+#------------------------------------------------------------------------------
+def simulate(ireplica, seed):
+    #--------------------------------------------------------------------------
+    #   initialize
+    #--------------------------------------------------------------------------
+    rng     = par.stream(seed, ireplica)
+    nacc    = np.zeros(nf)
+    nhit    = np.zeros(nf)
+    nswp    = np.zeros(nf)
+    ntry    = np.zeros(nf)
+    delx_mc = np.full(nf, delx)
+    pots    = [lat.potential(n, a, fk) for fk in fl]
+
+    #   stot, vtot, ttot, tvir, nin; x, x^2, x^4
+    act_acc = fn.Blocking((5, nf))
+    xm_acc  = fn.Blocking((3, nf))
+
+    #--------------------------------------------------------------------------
+    #   set the start, x[f, chain, time]
+    #--------------------------------------------------------------------------
+    x = np.zeros((nf, nchain, n+1))
+    for k in range(nf):
+        if icold==0:
+            x[k] = -fl[k]
+        else:
+            x[k,:,:n] = rng.uniform(-fl[k], fl[k], (nchain, n))
+    x[...,0] = x[...,n-1]
+    x[...,n] = x[...,1]
+    fb = fl[:,None,None]
+
+    #--------------------------------------------------------------------------
+    #    monte carlo sweeps
+    #--------------------------------------------------------------------------
+    for i in tqdm(range(nmc), disable=ireplica>0):
+        if i == neq:
+            nacc      = np.zeros(nf)
+            nhit      = np.zeros(nf)
+            nswp      = np.zeros(nf)
+            ntry      = np.zeros(nf)
+
+        #----------------------------------------------------------------------
+        #   one sweep at every f, the widths are tuned separately
+        #----------------------------------------------------------------------
+        for k in range(nf):
+            dacc, dhit = lat.sweep(x[k], pots[k], delx_mc[k], rng, isweep)
+            nacc[k] += dacc
+            nhit[k] += dhit
+            if i < neq:
+                delx_mc[k] = lat.tune(delx_mc[k], dacc, dhit, pacc)
+
+        #----------------------------------------------------------------------
+        #   swap the paths of neighbouring f, all chains at once
+        #----------------------------------------------------------------------
+        if nf > 1 and i % nswap == 0:
+            for k in range((i//nswap) % 2, nf-1, 2):
+                dels = (lat.action(x[k+1], pots[k])
+                        + lat.action(x[k], pots[k+1])
+                        - lat.action(x[k], pots[k])
+                        - lat.action(x[k+1], pots[k+1]))
+                acc  = dels < rng.standard_exponential(nchain)
+                x[k,acc], x[k+1,acc] = x[k+1,acc], x[k,acc]
+                nswp[k] += np.count_nonzero(acc)
+                ntry[k] += nchain
+
+        #----------------------------------------------------------------------
+        #   calculate action and other things, one entry per f and chain
+        #----------------------------------------------------------------------
+        stot, ttot, vtot, tvtot, ptot, xm = fn.observables(x, fb, a)
+        nin   = top.count(x[...,1:n+1])
+
+        if ireplica == 0:
+            file18.write(fs.f443.format(i,stot[-1,0],ttot[-1,0],nin[-1,0]))
+
+        if i < neq:
+            continue
+        act_acc.add(np.stack((stot, vtot, ttot, tvtot, nin)), 2)
+        xs = x[...,:n]
+        xm_acc.add(np.stack((xs, xs**2, xs**4)), (2,3))
+
+    #   tuned step sizes, averaged over the replicas after the run
+    delx_acc = fn.Accumulator(nf)
+    delx_acc.add(delx_mc)
+
+    return delx_acc, nacc, nhit, nswp, ntry, act_acc, xm_acc
+
+#------------------------------------------------------------------------------
+#   run the replicas and merge their accumulators
+#------------------------------------------------------------------------------
+(delx_acc, nacc, nhit, nswp, ntry, act_acc, xm_acc) = par.run(simulate, seed,
+                                                              nworkers)
+act_av, act_err = act_acc.disp()
+xm_av, xm_err   = xm_acc.disp()
+e_av, e_err     = act_acc.jackknife(lambda s: (s[1] + s[3])/tmax)
+
+#------------------------------------------------------------------------------
+#   averages and output for every f
+#------------------------------------------------------------------------------
+file17.write(fs.f911)
+for k in range(nf):
+    stot_av, vtot_av, ttot_av, tvir_av, nin_av      = act_av[:,k]
+    stot_err, vtot_err, ttot_err, tvir_err, nin_err = act_err[:,k]
+    x_av, x2_av, x4_av                              = xm_av[:,k]
+    x_err, x2_err, x4_err                           = xm_err[:,k]
+
+    v_av   = vtot_av/tmax
+    v_err  = vtot_err/tmax
+    t_av   = ttot_av/tmax
+    t_err  = ttot_err/tmax
+    tv_av  = tvir_av/tmax
+    tv_err = tvir_err/tmax
+
+    file16.write('\n')
+    file16.write(fs.f821.format(fl[k], nswp[k]/max(ntry[k], 1)))
+    file16.write(fs.f109.format(delx_acc.mean[k], nacc[k]/nhit[k]))
+    file16.write(fs.f801.format(stot_av, stot_err))
+    file16.write(fs.f802.format(v_av, v_err))
+    file16.write(fs.f803.format(t_av, t_err))
+    file16.write(fs.f804.format(tv_av, tv_err))
+    file16.write(fs.f805.format(e_av[k], e_err[k]))
+    file16.write(fs.f806.format(x_av, x_err))
+    file16.write(fs.f807.format(x2_av, x2_err))
+    file16.write(fs.f808.format(x4_av, x4_err))
+    file16.write(fs.f822.format(nin_av, nin_err))
+    file17.write(fs.f777.format(fl[k], e_av[k], e_err[k], x2_av, x2_err,
+                                nin_av, nin_err))
+
+file16.close()
+file17.close()
+file18.close()
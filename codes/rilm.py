@@ -1,8 +1,9 @@
 import format_strings as fs
 import numpy as np
-import random
 from tqdm import tqdm
 import functions as fn
+import topology as top
+import parallel as par
 import re
 #------------------------------------------------------------------------------
 #------------------------------------------------------------------------------
@@ -23,7 +24,12 @@ import re
 #   n_p      number of points on which the correlation functions are measured: 
 #           <x_i x_(i+1)>,...,<x_i x_(i+np)> (np=20)
 #   nc      number of correlator measurements in a single configuration (nc=5)                               
+#   icor    icor=0: nc random sources per configuration; icor=1: the
+#           correlators are averaged over all sources of the periodic
+#           path at once, computed by FFT (functions.allsource)
 #   kp      number of sweeps between writeout of complete configuration     
+#   --workers N  (command line) run N independent replicas in parallel
+#           processes and add up their results, see parallel.py
 #------------------------------------------------------------------------------
 #   Output:
 #------------------------------------------------------------------------------
@@ -57,6 +63,7 @@ a      = re.search(r'a\s*=\s*(\d+\.\d+)', contents).group(1)
 neq    = re.search(r'neq\s*=\s*(\d+)', contents).group(1)
 nmc    = re.search(r'nmc\s*=\s*(\d+)', contents).group(1)
 nc     = re.search(r'nc\s*=\s*(\d+)', contents).group(1)
+icor   = re.search(r'icor\s*=\s*(\d+)', contents).group(1)
 delx   = re.search(r'delx\s*=\s*(\d+\.\d+)', contents).group(1)
 n_p    = re.search(r'n_p\s*=\s*(\d+)', contents).group(1)
 kp     = re.search(r'kp\s*=\s*(\d+)', contents).group(1)
@@ -73,13 +80,14 @@ delx   = float(delx)#update x (delx)
 n_p    = int(n_p)   #number of points in correlator
 kp     = int(kp)    #number of sweeps between cooling
 nc     = int(nc)    #number of measurements per configuration
+icor   = int(icor)  #random sources/all sources (0,1)
 nin    = int(nin)    #number of instantons
 seed   = int(seed)  #seed to generate random numbers
+nworkers = par.arguments().workers #replicas in parallel (--workers)
 
 #------------------------------------------------------------------------------
 #     echo input parameters                                                  
 #------------------------------------------------------------------------------
-random.seed(seed)
 pi    = np.pi
 tmax  = n*a
 s0    = 4.0/3.0*f**3
@@ -109,153 +117,100 @@ nzhist    = 40
 stzhist   = 4.01/float(nzhist)
 
 #------------------------------------------------------------------------------
-#   inizialize                                                 
+#   one replica of the simulation, returns the accumulators
 #------------------------------------------------------------------------------
-nconf = 0
-ncor  = 0
+def simulate(ireplica, seed):
+    #--------------------------------------------------------------------------
+    #   inizialize                                                 
+    #--------------------------------------------------------------------------
+    rng   = par.stream(seed, ireplica)
 
-stot_sum  = 0.0
-stot2_sum = 0.0
-vtot_sum  = 0.0
-vtot2_sum = 0.0
-ttot_sum  = 0.0
-ttot2_sum = 0.0
-tvir_sum  = 0.0
-tvir2_sum = 0.0
-x_sum     = 0.0
-x2_sum    = 0.0
-x4_sum    = 0.0
-x8_sum    = 0.0
+    #   stot, vtot, ttot, tvir; x, x^2, x^4; x, x^2, x^3 correlators
+    act_acc = fn.Blocking(4)
+    xm_acc  = fn.Blocking(3)
+    cor_acc = fn.Blocking((3, n_p))
 
-ix         = np.zeros(nxhist)
-iz         = np.zeros(nzhist)
-x          =  np.zeros(n+1)
-z          =  np.zeros(nin+1)     
-xcor_av    = np.zeros(n_p)
-xcor_er    = np.zeros(n_p)
-x2cor_av   = np.zeros(n_p)
-x2cor_er   = np.zeros(n_p)
-x3cor_av   = np.zeros(n_p)
-x3cor_er   = np.zeros(n_p)
-x2sub_av   = np.zeros(n_p)
-x2sub_er   = np.zeros(n_p)   
-xcor_sum   = np.zeros(n_p)
-xcor2_sum  = np.zeros(n_p)
-x2cor_sum  = np.zeros(n_p)
-x2cor2_sum = np.zeros(n_p)
-x3cor_sum  = np.zeros(n_p)
-x3cor2_sum = np.zeros(n_p)
+    ix         = fn.Histogram(xhist_min, stxhist, nxhist)
+    iz         = fn.Histogram(0.0, stzhist, nzhist)
+    x          =  np.zeros(n+1)
+    z          =  np.zeros(nin+1)     
 
-#------------------------------------------------------------------------------
-#   loop over configurations                                                            
-#------------------------------------------------------------------------------
-for i in tqdm(range(nmc)):
-    nconf += 1
-    for l in range(nin+1):
-        z[l] = random.random()*tmax
-    z = np.sort(z)
     #--------------------------------------------------------------------------
-    #   new configuration                                                      
+    #   loop over configurations                                                            
     #--------------------------------------------------------------------------
-    for j in range(1,n):
-        xx = a*j
-        x[j] = fn.xsum(nin, z, f, xx)
-    x[0] = x[n-1]
-    x[n] = x[1]
+    for i in tqdm(range(nmc), disable=ireplica>0):
+        z[:nin+1] = rng.random(nin+1)*tmax
+        z = np.sort(z)
+        #----------------------------------------------------------------------
+        #   new configuration                                                      
+        #----------------------------------------------------------------------
+        for j in range(1,n):
+            xx = a*j
+            x[j] = fn.xsum(nin, z, f, xx)
+        x[0] = x[n-1]
+        x[n] = x[1]
     
-    #--------------------------------------------------------------------------
-    #   distribution of instantons                                             
-    #--------------------------------------------------------------------------
-    for ii in range(0, nin, 2):
-        if ii == 0:
-            zm = z[nin] - tmax
-        else:
-            zm = z[ii-1]
-        z0  = z[ii]
-        zp  = z[ii+1]
-        zia = min(zp-z0, z0-zm)
-        fn.histogramarray( zia, 0.0, stzhist, nzhist, iz)
+        #----------------------------------------------------------------------
+        #   distribution of instantons                                             
+        #----------------------------------------------------------------------
+        iz.add(top.separations(z[:nin], tmax))
         
-    #--------------------------------------------------------------------------
-    #   calculate action etc.                                             
-    #--------------------------------------------------------------------------
-    stot  = 0.0
-    ttot  = 0.0
-    tvtot = 0.0
-    vtot  = 0.0
+        #----------------------------------------------------------------------
+        #   calculate action etc.                                             
+        #----------------------------------------------------------------------
+        stot, ttot, vtot, tvtot, ptot, xm = fn.observables(x[1:], f, a)
     
-    for j in range(1, n):
-        xp = (x[j+1]-x[j])/a
-        t  = 1.0/4.0*xp**2
-        v  = (x[j]**2-f**2)**2
-        tv = 2.0*x[j]**2*(x[j]**2-f**2)
-        s  = a*(t+v)
-        ttot  += a*t
-        vtot  += a*v
-        tvtot += a*tv
-        stot  += s
-    
-    file18.write(fs.f555.format(i,stot,ttot,vtot,stot/(nin*s0)))
-    if i % kp == 0:
-        file17.write('configuration: ')
-        file17.write(str(i))
-        file17.write('\n')
-        for i in range(n):
-            file17.write(fs.f222.format(i*a, x[i]))
+        if ireplica == 0:
+            file18.write(fs.f555.format(i,stot,ttot,vtot,stot/(nin*s0)))
+        if i % kp == 0 and ireplica == 0:
+            file17.write('configuration: ')
+            file17.write(str(i))
+            file17.write('\n')
+            for i in range(n):
+                file17.write(fs.f222.format(i*a, x[i]))
             
-    #--------------------------------------------------------------------------
-    #   include in sample                                                   
-    #--------------------------------------------------------------------------
-    stot_sum  += stot
-    stot2_sum += stot**2
-    vtot_sum  += vtot
-    vtot2_sum += vtot**2
-    ttot_sum  += ttot 
-    ttot2_sum += ttot**2
-    tvir_sum  += tvtot
-    tvir2_sum += tvtot**2
+        #----------------------------------------------------------------------
+        #   include in sample                                                   
+        #----------------------------------------------------------------------
+        act_acc.add([stot, vtot, ttot, tvtot])
+
+        ix.add(x[:n])
+        xm_acc.add(np.stack((x[1:n], x[1:n]**2, x[1:n]**4)), 1)
     
-    for k in range(n):
-        fn.histogramarray(x[k],xhist_min,stxhist,nxhist,ix)
-        x_sum  += x[k]
-        x2_sum += x[k]**2
-        x4_sum += x[k]**4
-        x8_sum += x[k]**8
-        
-    #--------------------------------------------------------------------------
-    #   correlation function                                                   
-    #--------------------------------------------------------------------------
-    for ic in range(nc):
-        ncor += 1
-        ip0 = int((n-n_p)*random.random())
-        x0 = x[ip0]
-        for ip in range(n_p):
-            x1    = x[ip0+ip]
-            xcor  = x0*x1
-            x2cor = xcor**2
-            x3cor = xcor**3
-            xcor_sum[ip]   += xcor
-            xcor2_sum[ip]  += xcor**2
-            x2cor_sum[ip]  += x2cor
-            x2cor2_sum[ip] += x2cor**2
-            x3cor_sum[ip]  += x3cor
-            x3cor2_sum[ip] += x3cor**2
-            
+        #----------------------------------------------------------------------
+        #   correlation function                                                   
+        #----------------------------------------------------------------------
+        if icor == 1:
+            xr    = x[1:n]
+            xr    = np.stack((xr, xr**2, xr**3))
+            cor_acc.add(fn.allsource(xr, n_p))
+        else:
+            ip0   = rng.integers(0, n-n_p, nc)
+            x1    = x[ip0[:,None] + np.arange(n_p)]
+            xcor  = x1[:,:1]*x1
+            cor_acc.add(np.stack((xcor, xcor**2, xcor**3)), 1)
+
+    return act_acc, xm_acc, cor_acc, ix, iz
+
+#------------------------------------------------------------------------------
+#   run the replicas and merge their accumulators
+#------------------------------------------------------------------------------
+(act_acc, xm_acc, cor_acc, ix, iz) = par.run(simulate, seed, nworkers)
+
 #------------------------------------------------------------------------------
 #   averages                                                               
 #------------------------------------------------------------------------------
-stot_av,stot_err = fn.disp(  nconf, stot_sum, stot2_sum)
-vtot_av,vtot_err = fn.disp(  nconf, vtot_sum, vtot2_sum)
-ttot_av,ttot_err = fn.disp(  nconf, ttot_sum, ttot2_sum)
-tvir_av,tvir_err = fn.disp(  nconf, tvir_sum, tvir2_sum)
-x_av,x_err       = fn.disp(nconf*n,    x_sum, x2_sum)
-x2_av,x2_err     = fn.disp(nconf*n,   x2_sum, x4_sum)
-x4_av,x4_err     = fn.disp(nconf*n,   x4_sum, x8_sum)
- 
-for ip in range(n_p):
-    xcor_av[ip],  xcor_er[ip]  = fn.disp(ncor, xcor_sum[ip], xcor2_sum[ip])
-    x2cor_av[ip], x2cor_er[ip] = fn.disp(ncor, x2cor_sum[ip], x2cor2_sum[ip])
-    x3cor_av[ip], x3cor_er[ip] = fn.disp(ncor, x3cor_sum[ip], x3cor2_sum[ip])
+
+act_av, act_err = act_acc.disp()
+xm_av, xm_err   = xm_acc.disp()
+cor_av, cor_err = cor_acc.disp()
+
+stot_av, vtot_av, ttot_av, tvir_av     = act_av
+stot_err, vtot_err, ttot_err, tvir_err = act_err
+x_av, x2_av, x4_av                     = xm_av
+x_err, x2_err, x4_err                  = xm_err
+xcor_av, x2cor_av, x3cor_av            = cor_av
+xcor_er, x2cor_er, x3cor_er            = cor_err
 
 v_av  = vtot_av/tmax
 v_err = vtot_err/tmax
@@ -263,8 +218,10 @@ t_av  = ttot_av/tmax
 t_err = ttot_err/tmax
 tv_av = tvir_av/tmax
 tv_err= tvir_err/tmax
-e_av  = v_av+tv_av
-e_err = np.sqrt(v_err**2+tv_err**2)
+e_av, e_err    = act_acc.jackknife(lambda s: (s[1]+s[3])/tmax)
+dl_av, dl_er   = cor_acc.jackknife(lambda c: fn.dlogs(c, a))
+dl1_av, dl1_er = cor_acc.jackknife(
+    lambda c: (c[0,:-1]-c[0,1:])/c[0,1:]/a)
 
 #------------------------------------------------------------------------------
 #     output                                                                 
@@ -289,31 +246,18 @@ file16.write('\n')
 file16.write('# x correlation function\n') 
 file20.write('# tau       x(tau)       dx(tau)     dlog\n')
 for ip in range(1,n_p):
-    dx = (xcor_av[ip-1] - xcor_av[ip]) / xcor_av[ip] / a 
-    dxe2 = (xcor_er[ip] / xcor_av[ip])**2 + \
-        (xcor_er[ip-1] * xcor_av[ip] / xcor_av[ip]**2)**2
-    dxe = np.sqrt(dxe2) / a
-    
+    dx, dxe = dl1_av[ip-1], dl1_er[ip-1]
     file16.write(fs.f555.format(ip*a, xcor_av[ip], xcor_er[ip], dx, dxe)) 
     file20.write(fs.f555.format(ip*a, xcor_av[ip], xcor_er[ip], dx, dxe))     
 
 #------------------------------------------------------------------------------
 #     subtracted x^2 correlation function, log derivative                    
 #------------------------------------------------------------------------------
-xx_sub = x2cor_av[n_p-1]
-xx_er  = x2cor_er[n_p-1]
-for ip in range(n_p):
-    x2sub_av[ip] = x2cor_av[ip]-xx_sub
-    x2sub_er[ip] = np.sqrt(x2cor_er[ip]**2+xx_er**2)
-
 file16.write('# x2 correlation function\n') 
 file21.write('# tau       x2(tau)      dx2(tau)     dlog\n')
              
 for ip in range(n_p-1):
-    dx  = (x2sub_av[ip]-x2sub_av[ip+1])/x2sub_av[ip]/a
-    dxe2= (x2sub_er[ip+1]/x2sub_av[ip])**2
-    +(x2sub_er[ip]*x2sub_av[ip+1]/x2sub_av[ip]**2)**2
-    dxe = np.sqrt(dxe2)/a
+    dx, dxe = dl_av[1,ip], dl_er[1,ip]
     file16.write(fs.f555.format(ip*a, x2cor_av[ip], x2cor_er[ip], dx, dxe)) 
     file21.write(fs.f555.format(ip*a, x2cor_av[ip], x2cor_er[ip], dx, dxe)) 
 
@@ -324,16 +268,11 @@ file16.write('# x^3 correlation function\n')
 file22.write('# tau       x(tau)       dx(tau)     dlog\n')
  
 for ip in range(n_p-1):
-    dx  = (x3cor_av[ip]-x3cor_av[ip+1])/x3cor_av[ip]/a
-    dxe2= (x3cor_er[ip+1]/x3cor_av[ip])**2
-    +(x3cor_er[ip]*x3cor_av[ip+1]/x3cor_av[ip]**2)**2
-    dxe = np.sqrt(dxe2)/a
+    dx, dxe = dl_av[2,ip], dl_er[2,ip]
     file16.write(fs.f555.format(ip*a, x3cor_av[ip], x3cor_er[ip], dx, dxe)) 
     file22.write(fs.f555.format(ip*a, x3cor_av[ip], x3cor_er[ip], dx, dxe)) 
 
-for i in range(nzhist):
-    xx = (i+0.5)*stzhist
-    file30.write(fs.f222.format(xx,iz[i]) )
+iz.write(file30)
 
 #------------------------------------------------------------------------------
 #------------------------------------------------------------------------------
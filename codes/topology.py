@@ -0,0 +1,155 @@
+import numpy as np
+#------------------------------------------------------------------------------
+#   Instantons and anti-instantons of euclidean paths
+#------------------------------------------------------------------------------
+#   Used by qmcool.py (cooled paths), rilm.py, rilm_gauss.py and iilm.py
+#   (instanton ensembles). An instanton is a zero crossing of the path from
+#   x<0 to x>0, an anti-instanton one from x>0 to x<0 (x=0 counts as x<0).
+#   All functions take one path or a batch of paths (chains, configurations,
+#   ...): the last axis is euclidean time, the sites 0..m-1 with spacing a.
+#   For the periodic paths of the lattice codes x(0)=x(n-1) is passed as
+#   x[...,:n], every crossing is found once. qmcool.py takes these n sites
+#   with the period n*a, like the action of fn.observables.
+#------------------------------------------------------------------------------
+
+#------------------------------------------------------------------------------
+#   number of zero crossings (instantons + anti-instantons) of every path
+#------------------------------------------------------------------------------
+#   Input:
+#       x      path(s) x[...,0..m-1]
+#   Output:
+#       nin    number of crossings, shape x.shape[:-1]
+#------------------------------------------------------------------------------
+def count(x):
+    s = x > 0.0
+    return np.count_nonzero(s[..., 1:] != s[..., :-1], axis=-1)
+
+#------------------------------------------------------------------------------
+#   positions of the zero crossings, linear interpolation between the sites
+#------------------------------------------------------------------------------
+#   A crossing between the sites j and j+1 is placed at
+#
+#       tau = a*(j + x_j/(x_j - x_(j+1)))
+#
+#   Input:
+#       x      path(s) x[...,0..m-1]
+#       a      lattice spacing
+#   Output:
+#       conf   index of the path in the batch (flat index over x.shape[:-1])
+#       tau    positions, increasing inside every path
+#       q      +1 instanton, -1 anti-instanton
+#------------------------------------------------------------------------------
+def crossings(x, a):
+    x  = np.asarray(x, dtype=float)
+    xf = x.reshape(-1, x.shape[-1])
+    s  = xf > 0.0
+    conf, j = np.nonzero(s[:, 1:] != s[:, :-1])
+    x0  = xf[conf, j]
+    x1  = xf[conf, j+1]
+    tau = a*(j + x0/(x0 - x1))
+    q   = np.where(s[conf, j+1], 1, -1)
+    return conf, tau, q
+
+#------------------------------------------------------------------------------
+#   instanton and anti-instanton positions of one path
+#------------------------------------------------------------------------------
+#   Output:
+#       zi, za  positions of the instantons and of the anti-instantons
+#------------------------------------------------------------------------------
+def positions(x, a):
+    conf, tau, q = crossings(x, a)
+    return tau[q > 0], tau[q < 0]
+
+#------------------------------------------------------------------------------
+#   nearest neighbour instanton-anti-instanton separations
+#------------------------------------------------------------------------------
+#   The objects of a path alternate between instantons and anti-instantons.
+#   For every second object (the first, third, ... of the path) the distance
+#   to the closer of its two neighbours is returned, the neighbours of the
+#   first and the last object are found across the periodic boundary. This
+#   is the distribution written to zdist.dat.
+#   Input:
+#       z      positions, increasing inside every path: z[...,0..k-1] for a
+#              batch of paths with k objects each, or the ragged output
+#              of crossings() together with conf
+#       tmax   length of the periodic path
+#       conf   index of the path of every position (crossings()), None:
+#              the leading axes of z are the paths
+#   Output:
+#       sep    separations of all paths
+#------------------------------------------------------------------------------
+def separations(z, tmax, conf=None):
+    z = np.asarray(z, dtype=float)
+    if conf is None:
+        conf = np.repeat(np.arange(z.size//max(z.shape[-1], 1)),
+                         z.shape[-1] if z.ndim else 1)
+    z = z.reshape(-1)
+    if len(z) == 0:
+        return z
+    idx   = np.arange(len(z))
+    new   = np.append(True, conf[1:] != conf[:-1])
+    first = np.maximum.accumulate(np.where(new, idx, 0))
+    end   = np.append(new[1:], True)
+    last  = np.minimum.accumulate(np.where(end, idx, len(z))[::-1])[::-1]
+    zm    = np.where(new, z[last] - tmax, np.roll(z, 1))
+    zp    = np.where(end, z[first] + tmax, np.roll(z, -1))
+    sep   = np.minimum(zp - z, z - zm)
+    return sep[(idx - first) % 2 == 0]
+
+#------------------------------------------------------------------------------
+#   moving average of periodic paths
+#------------------------------------------------------------------------------
+#   Input:
+#       x      periodic path(s) x[...,0..m-1], x[...,m] = x[...,0]
+#       nsm    the average is taken over the 2*nsm+1 sites j-nsm..j+nsm
+#   Output:
+#       xsm    smoothed path(s)
+#------------------------------------------------------------------------------
+def smooth(x, nsm):
+    x = np.asarray(x, dtype=float)
+    if nsm == 0:
+        return x
+    m  = x.shape[-1]
+    xp = np.concatenate((x[..., m-nsm:], x, x[..., :nsm]), axis=-1)
+    c  = np.cumsum(xp, axis=-1)
+    c  = np.concatenate((np.zeros(x.shape[:-1] + (1,)), c), axis=-1)
+    return (c[..., 2*nsm+1:] - c[..., :-2*nsm-1])/(2*nsm+1)
+
+#------------------------------------------------------------------------------
+#   number of crossings of periodic paths with hysteresis
+#------------------------------------------------------------------------------
+#   A crossing is counted when the path goes from x<-h to x>h or back, the
+#   sites inside the band |x|<=h keep the side of the last site outside.
+#   Fluctuations smaller than h around x=0 are not counted. The sites in the
+#   band at the start of the path take the side where the path ends, so
+#   also the crossing across the boundary is found.
+#   Input:
+#       x      periodic path(s) x[...,0..m-1]
+#       h      half width of the band
+#   Output:
+#       nin    number of crossings, shape x.shape[:-1]
+#------------------------------------------------------------------------------
+def hysteresis(x, h):
+    m   = x.shape[-1]
+    s   = (x > h).astype(np.int8) - (x < -h)
+    idx = np.maximum.accumulate(np.where(s != 0, np.arange(m), 0), axis=-1)
+    s   = np.take_along_axis(s, idx, axis=-1)
+    s   = np.where(s == 0, s[..., -1:], s)
+    return (np.count_nonzero(s[..., 1:] != s[..., :-1], axis=-1)
+            + (s[..., 0] != s[..., -1]))
+
+#------------------------------------------------------------------------------
+#   number of instantons + anti-instantons of uncooled periodic paths
+#------------------------------------------------------------------------------
+#   Cheap estimate without cooling: the quantum fluctuations are averaged
+#   out over 2*nsm+1 sites, crossings of the smoothed path are counted with
+#   the band |x|<=h. Compare with the cooled counts of qmcool.py.
+#   Input:
+#       x      periodic path(s) x[...,0..m-1]
+#       nsm    half width of the moving average in sites
+#       h      half width of the band
+#   Output:
+#       ntop   estimated number of instantons + anti-instantons
+#------------------------------------------------------------------------------
+def estimate(x, nsm, h):
+    return hysteresis(smooth(x, nsm), h)